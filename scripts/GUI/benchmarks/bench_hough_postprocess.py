@@ -0,0 +1,106 @@
+"""
+Hough 後處理效能比較：舊版逐線段 Python 迴圈 vs 陣列化的 filter_lines / average_slope_intercept
+
+以隨機產生的 (N, 1, 4) 線段（左右車道線 + 雜訊線段，模擬市區大量 Hough 輸出）計時，
+並確認兩者算出的左右線 (斜率, 截距) 一致。
+
+用法：
+    python bench_hough_postprocess.py
+    python bench_hough_postprocess.py --sizes 50 200 1000 --repeat 200
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+sys.path.append(os.path.join(os.path.dirname(current_dir), "driver_risk_alert_system"))
+
+from risk_modules.Land_detection import average_slope_intercept, filter_lines  # noqa: E402
+
+
+def legacy_detect_lines(raw_lines):
+    """舊版 detect_lines 的過濾迴圈（基準）"""
+    filtered = []
+    for line in raw_lines:
+        x1, y1, x2, y2 = line[0]
+        if x2 == x1:
+            continue
+        slope = (y2 - y1) / (x2 - x1)
+        if 0.3 < abs(slope) < 5:
+            filtered.append(line)
+    return filtered
+
+
+def legacy_average_slope_intercept(lines):
+    """舊版 average_slope_intercept（每條線段各呼叫一次 np.polyfit，基準）"""
+    left_lines = []
+    right_lines = []
+    for line in lines:
+        x1, y1, x2, y2 = line[0]
+        parameters = np.polyfit((x1, x2), (y1, y2), 1)
+        slope, intercept = parameters
+        if slope < 0:
+            left_lines.append((slope, intercept))
+        else:
+            right_lines.append((slope, intercept))
+    left_avg = np.average(left_lines, axis=0) if left_lines else None
+    right_avg = np.average(right_lines, axis=0) if right_lines else None
+    return left_avg, right_avg
+
+
+def make_segments(n, width=1280, height=720, seed=0):
+    """約三分之一落在左右車道線附近，其餘為隨機方向的雜訊線段（含水平 / 垂直線）"""
+    rng = np.random.default_rng(seed)
+    lane = n // 3
+    segments = []
+    for (bottom_x, top_x) in ((0.25 * width, 0.45 * width), (0.8 * width, 0.55 * width)):
+        t = rng.uniform(0, 1, (lane, 2))
+        y = height - t * (0.4 * height)
+        x = bottom_x + (top_x - bottom_x) * t + rng.normal(0, 3, (lane, 2))
+        segments.append(np.stack([x[:, 0], y[:, 0], x[:, 1], y[:, 1]], axis=1))
+    noise = n - 2 * lane
+    x = rng.uniform(0, width, (noise, 2))
+    y = rng.uniform(0.55 * height, height, (noise, 2))
+    segments.append(np.stack([x[:, 0], y[:, 0], x[:, 1], y[:, 1]], axis=1))
+    segments = np.concatenate(segments)
+    # 一部分雜訊改成水平 / 垂直線，檢查過濾條件
+    segments[-noise // 4:, 2] = segments[-noise // 4:, 0]
+    return np.rint(segments).astype(np.int32).reshape(-1, 1, 4)
+
+
+def legacy(raw_lines):
+    return legacy_average_slope_intercept(legacy_detect_lines(raw_lines))
+
+
+def vectorized(raw_lines):
+    return average_slope_intercept(filter_lines(raw_lines))
+
+
+def same(a, b):
+    if (a is None) != (b is None):
+        return False
+    return a is None or np.allclose(a, b, rtol=1e-9, atol=1e-6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hough 後處理效能比較")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 200, 500, 2000], help="每幀線段數")
+    parser.add_argument("--repeat", type=int, default=100, help="每個大小重複次數")
+    args = parser.parse_args()
+
+    print(f"{'segments':>9} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8}  match")
+    for n in args.sizes:
+        raw_lines = make_segments(n)
+        expected, result = legacy(raw_lines), vectorized(raw_lines)
+        match = all(same(a, b) for a, b in zip(expected, result))
+        legacy_ms = min(timeit.repeat(lambda: legacy(raw_lines), number=args.repeat, repeat=3)) / args.repeat * 1e3
+        vector_ms = min(timeit.repeat(lambda: vectorized(raw_lines), number=args.repeat, repeat=3)) / args.repeat * 1e3
+        print(f"{n:>9} {legacy_ms:>10.3f} {vector_ms:>10.3f} {legacy_ms / vector_ms:>7.1f}x  {match}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+感知流程效能測試（CPU 即可離線執行，不需要攝影機、影片素材或 best2.pt）
+
+以合成行車畫面（synthetic.py：車道線 + 移動車輛）與替身偵測器量測：
+    process_frame、get_lane_roi_dynamic、get_roi_level_bbox、compute_speed、analyze_risk、
+    LaneTracker.estimate_self_speed、eye_aspect_ratio / mouth_aspect_ratio，
+    以及端到端：逐幀 lane → detect → risk → render（e2e_frame）與無顯示管線跑完整段合成影片（e2e_pipeline）
+
+結果寫成 JSON（含 git commit、版本資訊），可與另一次的結果比較，任一項 p50 變慢超過門檻時回傳非 0。
+
+用法：
+    python bench_perception.py --output results/base.json
+    python bench_perception.py --output results/new.json --compare results/base.json --threshold 0.15
+    python bench_perception.py --cases process_frame e2e_frame --repeat 500
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+gui_dir = os.path.dirname(current_dir)
+sys.path.append(gui_dir)
+sys.path.append(os.path.join(gui_dir, "driver_risk_alert_system"))
+
+from synthetic import StubDetector, SyntheticDashcam  # noqa: E402
+from fatigue_detection.face_metrics import eye_aspect_ratio, mouth_aspect_ratio  # noqa: E402
+from risk_modules.Land_detection import LaneEngine, get_lane_roi_dynamic  # noqa: E402
+from risk_modules.risk_analyzer import RiskEngine, get_center, get_risk_config, get_roi_level_bbox  # noqa: E402
+
+
+def measure(fn, repeat, warmup):
+    """呼叫 fn() warmup + repeat 次，回傳後 repeat 次的耗時統計（毫秒）"""
+    for _ in range(warmup):
+        fn()
+    costs = np.empty(repeat, dtype=np.int64)
+    for i in range(repeat):
+        start = time.perf_counter_ns()
+        fn()
+        costs[i] = time.perf_counter_ns() - start
+    ms = costs / 1e6
+    p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+    return {"n": repeat, "mean_ms": float(ms.mean()), "p50_ms": float(p50), "p95_ms": float(p95),
+            "p99_ms": float(p99), "min_ms": float(ms.min())}
+
+
+def cycle(items):
+    """每次呼叫回傳下一個元素（循環）"""
+    state = {"i": -1}
+
+    def next_item():
+        state["i"] = (state["i"] + 1) % len(items)
+        return items[state["i"]]
+    return next_item
+
+
+def make_tracker(scene, step=1):
+    # 效能測試關閉語音（不會匯入 simpleaudio）、不輸出影片
+    from lane_tracker_module import LaneTracker
+
+    return LaneTracker([False], headless=True, enable_audio=False, output_path=None,
+                       model=StubDetector(scene, step=step))
+
+
+# ---- 各測試項目：回傳 (每次呼叫的函式, 說明) ----
+def case_process_frame(ctx):
+    engine = LaneEngine.from_config(ctx["config"])
+    frames = cycle(ctx["frames"])
+    return lambda: engine.process(frames(), draw=True), "LaneEngine.process（偵測 + 平滑 + ROI + 色塊）"
+
+
+def case_get_lane_roi_dynamic(ctx):
+    scene, shape = ctx["scene"], ctx["frames"][0].shape
+    lanes = cycle([(np.array(left), np.array(right), speed)
+                   for t, speed in zip(range(len(ctx["frames"])), np.linspace(0, 30, len(ctx["frames"])))
+                   for left, right in [scene.lanes(t)]])
+
+    def run():
+        left, right, speed = lanes()
+        return get_lane_roi_dynamic(left, right, shape, speed=speed)
+    return run, "未快取的動態 ROI 建立"
+
+
+def case_get_roi_level_bbox(ctx):
+    scene, shape = ctx["scene"], ctx["frames"][0].shape
+    left, right = (np.array(line) for line in scene.lanes(0))
+    roi_dict, _ = get_lane_roi_dynamic(left, right, shape, speed=10)
+    boxes = cycle([tuple(int(v) for v in box[:4]) for t in range(len(ctx["frames"])) for box in scene.boxes(t)])
+    return lambda: get_roi_level_bbox(boxes(), roi_dict), "單一物件框的 ROI 區域判斷"
+
+
+def case_compute_speed(ctx):
+    engine = RiskEngine(ctx["config"])
+    scene = ctx["scene"]
+    calls = cycle([(int(box[4]), get_center(tuple(int(v) for v in box[:4])))
+                   for t in range(len(ctx["frames"])) for box in scene.boxes(t)])
+
+    def run():
+        track_id, center = calls()
+        return engine.compute_speed(track_id, center, fps=6)
+    return run, "RiskEngine.compute_speed（單一物件）"
+
+
+def case_analyze_risk(ctx):
+    engine = RiskEngine(ctx["config"])
+    levels = ["high", "side_right", "side_left", "mid", "low"]
+    calls = cycle([(i % 8, (300 + i % 50, 250), levels[i % len(levels)], float(i % 40), False, i % 5 - 2)
+                   for i in range(500)])
+    return lambda: engine.analyze(*calls()), "RiskEngine.analyze（單一物件）"
+
+
+def case_estimate_self_speed(ctx):
+    tracker = ctx["tracker"]()
+    grays = [cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in ctx["frames"]]
+    pairs = cycle(list(zip(grays[:-1], grays[1:])))
+    return lambda: tracker.estimate_self_speed(*pairs()), "兩幀灰度圖的 ROI 光流"
+
+
+def case_eye_mouth_aspect_ratio(ctx):
+    rng = np.random.default_rng(ctx["seed"])
+    eye = [tuple(int(v) for v in p) for p in rng.uniform(200, 260, (6, 2))]
+    mouth = {k: tuple(int(v) for v in p) for k, p in zip((12, 13, 14, 16, 18, 19), rng.uniform(280, 340, (6, 2)))}
+
+    def run():
+        eye_aspect_ratio(eye)
+        eye_aspect_ratio(eye)
+        return mouth_aspect_ratio(mouth)
+    return run, "每幀兩眼 EAR + MAR"
+
+
+def case_e2e_frame(ctx):
+    from frame_buffer_pool import FrameBufferPool
+    from frame_pipeline import FramePacket, FramePipeline
+    from latency_governor import LatencyGovernor
+
+    tracker = ctx["tracker"]()
+    tracker.governor = LatencyGovernor.from_config(tracker.governor_config, source_fps=30)
+    tracker.governor.enabled = False
+    tracker.headless = False
+    tracker.buffer_pool = FrameBufferPool(depth=4)
+    # render 階段會讀管線統計（FPS / 瓶頸）；這裡不啟動執行緒，只提供統計物件
+    tracker.pipeline = FramePipeline(report_interval=0)
+    tracker.pipeline.add_stage("sink", lambda packet: None)
+    tracker.reset()
+    frames = cycle(ctx["frames"])
+    state = {"idx": 0}
+
+    def run():
+        state["idx"] += 1
+        packet = FramePacket(state["idx"], frames())
+        packet.knobs = tracker.governor.knobs
+        packet.effective_fps = 6.0
+        if tracker._lane_stage(packet) is None:
+            return None
+        tracker._detect_stage(packet)
+        tracker._risk_stage(packet)
+        return tracker._render_stage(packet)
+    return run, "單執行緒逐幀 lane → detect → risk → render（不含解碼 / 顯示）"
+
+
+def case_e2e_pipeline(ctx):
+    scene = ctx["scene"]
+    n_frames = ctx["video_frames"]
+    path = os.path.join(ctx["tmp_dir"], "synthetic.mp4")
+    scene.write_video(path, n_frames)
+
+    def run():
+        tracker = ctx["tracker"](step=5)
+        tracker.video_path = path
+        tracker.pipeline_config = dict(tracker.pipeline_config, report_interval=0)
+        tracker.start()
+    return run, f"無顯示管線跑完 {n_frames} 幀合成影片（含解碼，每次一整段）"
+
+
+CASES = {
+    "process_frame": case_process_frame,
+    "get_lane_roi_dynamic": case_get_lane_roi_dynamic,
+    "get_roi_level_bbox": case_get_roi_level_bbox,
+    "compute_speed": case_compute_speed,
+    "analyze_risk": case_analyze_risk,
+    "estimate_self_speed": case_estimate_self_speed,
+    "eye_mouth_aspect_ratio": case_eye_mouth_aspect_ratio,
+    "e2e_frame": case_e2e_frame,
+    "e2e_pipeline": case_e2e_pipeline,
+}
+# 每次呼叫耗時很長的項目，重複次數另外設定
+SLOW_CASES = {"e2e_pipeline"}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=current_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """以 p50 比較，回傳變慢超過 threshold（比例）的項目"""
+    regressions = []
+    print(f"\n{'case':<24} {'base p50':>10} {'new p50':>10} {'change':>8}")
+    for name, row in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        change = row["p50_ms"] / base["p50_ms"] - 1.0 if base["p50_ms"] > 0 else 0.0
+        flag = "  REGRESSION" if change > threshold else ""
+        print(f"{name:<24} {base['p50_ms']:>10.3f} {row['p50_ms']:>10.3f} {change:>+7.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="感知流程效能測試（合成畫面 + 替身偵測器）")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES), help="要執行的項目")
+    parser.add_argument("--repeat", type=int, default=200, help="每個項目量測次數")
+    parser.add_argument("--warmup", type=int, default=20, help="量測前先執行幾次（不計時）")
+    parser.add_argument("--slow-repeat", type=int, default=3, help="e2e_pipeline 量測次數")
+    parser.add_argument("--frames", type=int, default=60, help="合成畫面數（循環使用）")
+    parser.add_argument("--video-frames", type=int, default=150, help="e2e_pipeline 合成影片幀數")
+    parser.add_argument("--size", type=int, nargs=2, default=(640, 360), metavar=("W", "H"), help="合成畫面尺寸")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=1, help="cv2.setNumThreads（固定執行緒數讓結果可重現；0 為 OpenCV 預設）")
+    parser.add_argument("--output", help="結果 JSON 路徑")
+    parser.add_argument("--compare", help="要比較的基準結果 JSON")
+    parser.add_argument("--threshold", type=float, default=0.15, help="p50 變慢超過此比例視為退步")
+    args = parser.parse_args()
+
+    if args.threads:
+        cv2.setNumThreads(args.threads)
+    scene = SyntheticDashcam(*args.size, seed=args.seed)
+    tmp_dir = tempfile.mkdtemp(prefix="bench_perception_")
+    ctx = {
+        "config": get_risk_config(),
+        "scene": scene,
+        "frames": list(scene.frames(args.frames)),
+        "seed": args.seed,
+        "video_frames": args.video_frames,
+        "tmp_dir": tmp_dir,
+        "tracker": lambda step=1: make_tracker(SyntheticDashcam(*args.size, seed=args.seed), step=step),
+    }
+
+    results = {}
+    print(f"{'case':<24} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  description")
+    for name in args.cases:
+        fn, description = CASES[name](ctx)
+        slow = name in SLOW_CASES
+        row = measure(fn, args.slow_repeat if slow else args.repeat, 1 if slow else args.warmup)
+        row["description"] = description
+        results[name] = row
+        print(f"{name:<24} {row['mean_ms']:>9.3f} {row['p50_ms']:>9.3f} {row['p95_ms']:>9.3f} {row['p99_ms']:>9.3f}"
+              f"  {description}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "results": results,
+    }
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\n結果已寫入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(f"\n[❌ Regression] p50 變慢超過 {args.threshold:.0%}：{', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\n[✅] 沒有項目變慢超過 {args.threshold:.0%}（基準 commit {baseline['meta'].get('commit')}）")
+
+
+if __name__ == "__main__":
+    main()
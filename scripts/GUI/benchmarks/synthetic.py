@@ -0,0 +1,112 @@
+"""
+效能測試用的合成行車畫面與替身偵測器（不需要攝影機、影片素材或 best2.pt）
+
+- SyntheticDashcam：灰色路面 + 左實線 / 右虛線車道（緩慢左右擺動）+ 數台移動的車輛色塊，
+  同一個 seed 每次產生完全相同的畫面與物件框
+- StubDetector：介面與 detector_backends 的 backend 相同（track_frame / reset），
+  回傳合成場景中物件的追蹤框 (x1, y1, x2, y2, id, conf, cls)，可選擇每次呼叫固定耗時模擬推論延遲
+"""
+import time
+
+import cv2
+import numpy as np
+
+CLASS_NAMES = {0: "car", 1: "truck", 2: "motorcycle"}
+
+
+class SyntheticDashcam:
+    def __init__(self, width=640, height=360, n_objects=4, seed=0):
+        self.width = width
+        self.height = height
+        rng = np.random.default_rng(seed)
+        # 每個物件：起點中心 (x, y)、速度 (vx, vy)（像素 / 幀）、寬高、類別
+        self._centers = np.column_stack([rng.uniform(0.2, 0.8, n_objects) * width,
+                                         rng.uniform(0.62, 0.85, n_objects) * height])
+        self._velocity = rng.uniform(-2.0, 2.0, (n_objects, 2)) * [1.0, 0.3]
+        self._sizes = np.column_stack([rng.uniform(0.08, 0.16, n_objects) * width,
+                                       rng.uniform(0.08, 0.14, n_objects) * height])
+        self._classes = rng.integers(0, len(CLASS_NAMES), n_objects)
+        self._noise = rng.integers(0, 12, (height, width, 1), dtype=np.uint8)
+
+    def lanes(self, t):
+        """第 t 幀的左右車道線（底端 x, 底端 y, 上端 x, 上端 y）"""
+        w, h = self.width, self.height
+        sway = 0.03 * w * np.sin(t / 40.0)
+        top = int(h * 0.6)
+        left = (int(0.18 * w + sway), h, int(0.44 * w + sway), top)
+        right = (int(0.86 * w + sway), h, int(0.58 * w + sway), top)
+        return left, right
+
+    def boxes(self, t):
+        """第 t 幀的物件框 (N, 7)：x1, y1, x2, y2, track_id, conf, cls（碰到邊界反彈）"""
+        span = np.array([self.width, self.height], dtype=np.float64)
+        low = self._sizes / 2
+        high = span - self._sizes / 2
+        raw = self._centers + self._velocity * t - low
+        period = 2 * (high - low)
+        folded = np.mod(raw, period)
+        centers = low + np.where(folded > period / 2, period - folded, folded)
+        half = self._sizes / 2
+        n = len(centers)
+        return np.column_stack([centers - half, centers + half, np.arange(1, n + 1),
+                                np.full(n, 0.9), self._classes]).astype(np.float32)
+
+    def frame(self, t):
+        w, h = self.width, self.height
+        frame = np.empty((h, w, 3), dtype=np.uint8)
+        frame[:int(h * 0.5)] = (200, 170, 140)       # 天空
+        frame[int(h * 0.5):] = (90, 90, 90)          # 路面
+        frame += self._noise                         # 路面紋理（讓光流 / 邊緣偵測有東西可追）
+
+        left, right = self.lanes(t)
+        cv2.line(frame, left[:2], left[2:], (255, 255, 255), 5)
+        # 右線為虛線（每段 8 等分取一半），虛線隨時間往下移動
+        for k in range(8):
+            a, b = (k + (t % 8) / 8) / 8, (k + 0.5 + (t % 8) / 8) / 8
+            if b > 1:
+                continue
+            p1 = (int(right[0] + (right[2] - right[0]) * a), int(right[1] + (right[3] - right[1]) * a))
+            p2 = (int(right[0] + (right[2] - right[0]) * b), int(right[1] + (right[3] - right[1]) * b))
+            cv2.line(frame, p1, p2, (255, 255, 255), 5)
+
+        for x1, y1, x2, y2, track_id, _, _ in self.boxes(t):
+            cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (40, 30 + 40 * int(track_id), 160), -1)
+        return frame
+
+    def frames(self, n, start=0):
+        for t in range(start, start + n):
+            yield self.frame(t)
+
+    def write_video(self, path, n, fps=30):
+        """寫出 n 幀合成影片（端到端測試用）"""
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (self.width, self.height))
+        for frame in self.frames(n):
+            out.write(frame)
+        out.release()
+        return path
+
+
+class StubDetector:
+    """
+    取代 best2.pt 偵測 backend 的替身：每次 track_frame() 回傳場景下一個時間點的物件框
+    - step：每次呼叫前進幾幀（管線每 frame_skip 幀才送一幀給偵測器）
+    - latency_ms：每次呼叫額外等待的時間，模擬推論耗時（0 代表只量測周邊程式）
+    """
+
+    names = CLASS_NAMES
+
+    def __init__(self, scene=None, step=1, latency_ms=0.0):
+        self.scene = scene if scene is not None else SyntheticDashcam()
+        self.step = step
+        self.latency_ms = latency_ms
+        self.t = 0
+
+    def reset(self, frame_rate=None):
+        self.t = 0
+
+    def track_frame(self, frame, imgsz, region=None):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+        boxes = self.scene.boxes(self.t)
+        self.t += self.step
+        return boxes
@@ -0,0 +1,249 @@
+"""
+顯示服務：所有 cv2 視窗（imshow / waitKey / 視窗位置）只在一條顯示執行緒上操作
+
+- HighGUI 不是執行緒安全的，疲勞偵測與車道追蹤原本各自在工作執行緒呼叫 imshow + waitKey(1)，
+  顯示也會卡住處理迴圈；改由 show(name, frame) 把最新一幀放進該視窗的單格信箱就返回
+- 顯示執行緒以 refresh_hz 固定頻率更新（與處理幀率無關），信箱裡沒有新幀時只處理視窗事件
+- 按鍵以回呼傳回（on_key），在顯示執行緒呼叫，回呼內只應設定旗標 / 停止管線
+- 環境沒有 GUI（headless OpenCV）時第一次顯示失敗就關閉顯示，處理流程照常進行
+- 視窗位置由 screen_layout 決定（螢幕尺寸只查一次）：canvas 模式把車道與疲勞畫面合成到同一個視窗，
+  windows 模式則在視窗建立時放好位置一次
+
+用法：
+    from display_service import display
+    handle = display.on_key(lambda key: key == ord('q') and pipeline.stop())
+    display.show("Tracked Video", annotated_frame)
+    display.close_window("Tracked Video")
+    display.remove_key_handler(handle)
+"""
+import atexit
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from screen_layout import ScreenLayout
+from telemetry import telemetry
+
+
+class _Mailbox:
+    """
+    單格信箱（三個輪替緩衝區）：寫入端永遠寫在「不是最新、也不是正在顯示」的那一格，
+    讀取端拿走最新一格；沒被讀到的舊幀直接被新幀取代，不會累積
+    同一個視窗只能有一個寫入端
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = [np.empty(0, dtype=np.uint8) for _ in range(3)]
+        self._latest = None
+        self._reading = None
+        self.posted = 0
+        self.shown = 0
+
+    def put(self, frame):
+        with self._lock:
+            index = next(i for i in range(3) if i != self._latest and i != self._reading)
+        buffer = self._buffers[index]
+        if buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            buffer = self._buffers[index] = np.empty_like(frame)
+        np.copyto(buffer, frame)
+        with self._lock:
+            self._latest = index
+            self.posted += 1
+
+    def take(self):
+        with self._lock:
+            if self._latest is None:
+                return None
+            self._reading, self._latest = self._latest, None
+            self.shown += 1
+            return self._buffers[self._reading]
+
+    def release(self):
+        with self._lock:
+            self._reading = None
+
+
+class DisplayService:
+    def __init__(self, refresh_hz=30, enabled=True):
+        self._lock = threading.Lock()
+        self._mailboxes = {}
+        self._closing = set()
+        self._windows = set()
+        self._geometry = {}      # 顯示執行緒已套用的 ((寬, 高), (x, y))，相同設定不重複呼叫 resize / move
+        self._key_handlers = {}
+        self._next_handle = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self.layout = ScreenLayout()
+        self._layout_config = None
+        self._pending_layout = None
+        self.configure(refresh_hz=refresh_hz, enabled=enabled)
+
+    def configure(self, refresh_hz=30, enabled=True, layout=None):
+        """
+        更新頻率（每秒幾次）；enabled=False 時 show() 直接略過
+        layout：screen_layout 設定（mode / window_name / tiles）；None 代表沿用目前的版面
+        """
+        self.refresh_hz = max(float(refresh_hz), 1.0)
+        self.enabled = enabled
+        if layout is not None and layout != self._layout_config:
+            self._layout_config = dict(layout)
+            with self._lock:
+                self._pending_layout = ScreenLayout.from_config(layout)
+
+    # ---- 呼叫端（任意執行緒）----
+    def show(self, name, frame):
+        """把 frame 複製進 name 視窗的信箱（呼叫端的緩衝區可立即重複使用）"""
+        if not self.enabled:
+            return
+        mailbox = self._mailboxes.get(name)
+        if mailbox is None:
+            with self._lock:
+                mailbox = self._mailboxes.setdefault(name, _Mailbox())
+                self._closing.discard(name)
+        mailbox.put(frame)
+        if self._thread is None:
+            self._start()
+
+    def close_window(self, name):
+        with self._lock:
+            self._mailboxes.pop(name, None)
+            self._closing.add(name)
+
+    def on_key(self, callback):
+        """註冊按鍵回呼 callback(key)（key 為 waitKey 的值 & 0xFF），回傳可用於 remove_key_handler 的代號"""
+        with self._lock:
+            handle = self._next_handle
+            self._next_handle += 1
+            self._key_handlers[handle] = callback
+        return handle
+
+    def remove_key_handler(self, handle):
+        with self._lock:
+            self._key_handlers.pop(handle, None)
+
+    def stats(self):
+        """各視窗 {posted: 送進信箱的幀數, shown: 實際顯示的幀數}"""
+        with self._lock:
+            return {name: {"posted": box.posted, "shown": box.shown} for name, box in self._mailboxes.items()}
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    # ---- 顯示執行緒 ----
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._worker, name="display", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        try:
+            next_tick = time.perf_counter()
+            while not self._stop.is_set():
+                self._refresh()
+                next_tick += 1.0 / self.refresh_hz
+                delay = next_tick - time.perf_counter()
+                if delay > 0:
+                    self._stop.wait(delay)
+                else:
+                    next_tick = time.perf_counter()   # 落後時不補畫
+        except cv2.error as e:
+            # 沒有 GUI 的 OpenCV 建置（或沒有顯示器），之後的 show() 都略過
+            self.enabled = False
+            telemetry.error("display", "[❌ Display disabled] {error}", error=str(e))
+        finally:
+            for name in list(self._windows):
+                self._destroy(name)
+            with self._lock:
+                self._thread = None
+
+    def _refresh(self):
+        with self._lock:
+            mailboxes = list(self._mailboxes.items())
+            closing, self._closing = self._closing, set()
+            handlers = list(self._key_handlers.values())
+            layout, self._pending_layout = self._pending_layout, None
+
+        if layout is not None:
+            # 換版面：關掉舊版面的畫布與視窗，下一次畫面進來時依新版面重建
+            for name in list(self._windows):
+                self._destroy(name)
+            self.layout = layout
+        layout = self.layout
+        for name in closing:
+            self._destroy(name)
+
+        composed = [(name, mailbox) for name, mailbox in mailboxes if layout.composes(name)]
+        canvas_geometry = layout.arrange([name for name, _ in composed])
+        if canvas_geometry is not None:
+            self._open(layout.window_name, canvas_geometry)
+        elif layout.canvas is None:
+            self._destroy(layout.window_name)
+        dirty = False
+        for name, mailbox in composed:
+            frame = mailbox.take()
+            if frame is None:
+                continue
+            try:
+                layout.compose(name, frame)
+                dirty = True
+            finally:
+                mailbox.release()
+        if dirty:
+            cv2.imshow(layout.window_name, layout.canvas)
+
+        for name, mailbox in mailboxes:
+            if layout.composes(name):
+                continue
+            frame = mailbox.take()
+            if frame is None:
+                continue
+            try:
+                if name not in self._windows:
+                    self._open(name, layout.placement(name))
+                cv2.imshow(name, frame)
+            finally:
+                mailbox.release()
+
+        if not self._windows:
+            return
+        key = cv2.waitKey(1)
+        if key == -1:
+            return
+        for callback in handlers:
+            try:
+                callback(key & 0xFF)
+            except Exception as e:
+                telemetry.error("display", "[❌ Key handler error] {error}", error=str(e))
+
+    def _open(self, name, geometry=None):
+        """建立視窗（已存在則只調整），geometry 為 ((寬, 高), (x, y))"""
+        if name not in self._windows:
+            cv2.namedWindow(name, cv2.WINDOW_NORMAL)
+            self._windows.add(name)
+        if geometry is not None and self._geometry.get(name) != geometry:
+            self._geometry[name] = geometry
+            cv2.resizeWindow(name, *geometry[0])
+            cv2.moveWindow(name, *geometry[1])
+
+    def _destroy(self, name):
+        self._geometry.pop(name, None)
+        if name in self._windows:
+            self._windows.discard(name)
+            try:
+                cv2.destroyWindow(name)
+                cv2.waitKey(1)
+            except cv2.error:
+                pass
+
+
+# 行程共用的顯示服務
+display = DisplayService()
+atexit.register(display.stop)
@@ -0,0 +1,154 @@
+"""
+無顯示批次處理：把行車紀錄器影片切成時間段，以多行程平行處理，輸出逐幀風險紀錄
+
+用法：
+    python batch_runner.py videos/*.mp4 --out-dir results --segment-seconds 120 --warmup-seconds 5 --workers 4
+    python batch_runner.py drive.mp4 --format parquet
+
+每一段會往前多讀 warmup 秒（暖機），讓追蹤 ID、車道平滑與自車速度先穩定；
+暖機區間的紀錄不輸出，因此各段紀錄可直接依幀號串接成完整影片的結果。
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+gui_dir = os.path.dirname(current_dir)
+
+
+def plan_segments(video_path, segment_seconds=120, warmup_seconds=5):
+    """依影片長度切段，回傳每段的 (暖機起點, 輸出起點, 終點) 幀號"""
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    if total_frames <= 0:
+        raise ValueError(f"Cannot read frame count from '{video_path}'")
+
+    segment_len = max(int(segment_seconds * fps), 1)
+    warmup_len = int(warmup_seconds * fps)
+    segments = []
+    for index, start in enumerate(range(0, total_frames, segment_len)):
+        segments.append({
+            "video": video_path,
+            "index": index,
+            "warmup_start": max(start - warmup_len, 0),
+            "start_frame": start,
+            "end_frame": min(start + segment_len, total_frames),
+        })
+    return segments
+
+
+def _init_worker(threads_per_worker):
+    # 每個行程只用少量執行緒，避免 N 個行程 × 全核心的過度訂閱
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads_per_worker))
+    cv2.setNumThreads(threads_per_worker)
+    for path in (current_dir, gui_dir):
+        if path not in sys.path:
+            sys.path.append(path)
+
+
+def process_segment(segment, part_path):
+    """在工作行程中處理一段影片，逐幀紀錄寫入 part_path（JSONL），回傳紀錄筆數"""
+    from lane_tracker_module import LaneTracker
+
+    tracker = LaneTracker([False], video_path=segment["video"], headless=True,
+                          enable_audio=False, output_path=None)
+    video_name = os.path.basename(segment["video"])
+    count = 0
+
+    with open(part_path, "w", encoding="utf-8") as f:
+        def on_record(record):
+            nonlocal count
+            # 暖機區間只用來讓狀態穩定，不輸出
+            if record["frame"] <= segment["start_frame"]:
+                return
+            record["video"] = video_name
+            record["segment"] = segment["index"]  # 追蹤 ID 只在同一段內有意義
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+
+        tracker.start(start_frame=segment["warmup_start"], end_frame=segment["end_frame"], on_record=on_record)
+    return count
+
+
+def _merge_parts(part_paths, out_path, fmt):
+    if fmt == "jsonl":
+        with open(out_path, "w", encoding="utf-8") as out:
+            for part in part_paths:
+                with open(part, "r", encoding="utf-8") as f:
+                    out.writelines(f)
+    else:
+        try:
+            import pandas as pd
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pandas and pyarrow: pip install pandas pyarrow") from e
+        records = []
+        for part in part_paths:
+            with open(part, "r", encoding="utf-8") as f:
+                records.extend(json.loads(line) for line in f)
+        pd.DataFrame.from_records(records).to_parquet(out_path, index=False)
+
+    for part in part_paths:
+        os.remove(part)
+
+
+def process_archive(video_paths, out_dir, segment_seconds=120, warmup_seconds=5, workers=None, fmt="jsonl"):
+    """批次處理多支影片，每支影片輸出一個 <影片名>.jsonl / .parquet，回傳輸出檔案路徑清單"""
+    if fmt not in ("jsonl", "parquet"):
+        raise ValueError(f"Unknown output format: {fmt}")
+    os.makedirs(out_dir, exist_ok=True)
+    workers = workers or max((os.cpu_count() or 2) // 2, 1)
+    threads_per_worker = max((os.cpu_count() or 1) // workers, 1)
+
+    jobs = []
+    for video_path in video_paths:
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        for segment in plan_segments(video_path, segment_seconds, warmup_seconds):
+            part_path = os.path.join(out_dir, f"{stem}.part{segment['index']:04d}.jsonl")
+            jobs.append((stem, segment, part_path))
+
+    print(f"[📦 Batch] {len(video_paths)} videos → {len(jobs)} segments, {workers} workers")
+
+    # spawn：每個工作行程各自載入模型，不與主行程共享 torch / OpenCV 的執行緒狀態
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(threads_per_worker,)) as pool:
+        futures = [(stem, part_path, pool.submit(process_segment, segment, part_path))
+                   for stem, segment, part_path in jobs]
+        parts_by_video = {}
+        for stem, part_path, future in futures:
+            count = future.result()
+            print(f"[📦 Batch] {os.path.basename(part_path)}: {count} records")
+            parts_by_video.setdefault(stem, []).append(part_path)
+
+    outputs = []
+    for stem, part_paths in parts_by_video.items():
+        out_path = os.path.join(out_dir, f"{stem}.{fmt}")
+        _merge_parts(part_paths, out_path, fmt)
+        outputs.append(out_path)
+        print(f"[✅ Batch] {out_path}")
+    return outputs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless batch risk analysis for dashcam videos")
+    parser.add_argument("videos", nargs="+", help="input video files")
+    parser.add_argument("--out-dir", default="batch_results", help="output directory")
+    parser.add_argument("--segment-seconds", type=float, default=120, help="segment length per worker task")
+    parser.add_argument("--warmup-seconds", type=float, default=5, help="overlap read before each segment")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    parser.add_argument("--format", choices=("jsonl", "parquet"), default="jsonl", help="output format")
+    args = parser.parse_args(argv)
+
+    process_archive(args.videos, args.out_dir, args.segment_seconds, args.warmup_seconds,
+                    args.workers, args.format)
+
+
+if __name__ == "__main__":
+    main()
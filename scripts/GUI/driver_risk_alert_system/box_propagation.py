@@ -0,0 +1,161 @@
+"""
+偵測器每 N 幀才跑一次，中間的幀以輕量方法把上一次的追蹤框往前推
+
+- velocity：每個 ID 以最近兩次偵測結果估計等速度（像素 / 幀），box = 上次偵測框 + 速度 × 經過幀數
+- flow：框內取少量格點做稀疏 LK 光流，取位移中位數平移框；點追丟時退回等速度
+推出來的框沿用偵測時的 ID / conf / cls，風險分析的滯留計數與速度換算不受影響。
+"""
+import cv2
+import numpy as np
+
+
+class BoxPropagator:
+    """
+    單一路影像的框傳遞狀態（多路影像各自一個）
+    - observe(tracks, frame)：偵測 + 追蹤完成的幀
+    - propagate(frame)：沒有跑偵測的幀，回傳推算後的 (N, 7) [x1, y1, x2, y2, id, conf, cls]
+    """
+
+    def __init__(self, method="flow", grid=3, shrink=0.2, min_points=3, lk_win=15, lk_levels=2):
+        """
+        - grid：flow 模式每個框取 grid × grid 個點
+        - shrink：取點前框往內縮的比例（避開框邊的背景）
+        - min_points：追到的點少於此數時改用等速度
+        """
+        if method not in ("velocity", "flow"):
+            raise ValueError(f"Unsupported propagation method: {method}")
+        self.method = method
+        self.grid = grid
+        self.shrink = shrink
+        self.min_points = min_points
+        self.lk_params = dict(winSize=(lk_win, lk_win), maxLevel=lk_levels,
+                              criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03))
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(method=config.get('method', 'flow'),
+                   grid=config.get('grid', 3),
+                   shrink=config.get('shrink', 0.2),
+                   min_points=config.get('min_points', 3))
+
+    def reset(self):
+        self._tracks = np.empty((0, 7), dtype=np.float32)   # 目前（含推算）的框
+        self._velocity = np.zeros((0, 4), dtype=np.float32)  # 每個框四個座標的速度（像素 / 幀）
+        self._anchors = {}                                   # id → (上次偵測框, 幀號)
+        self._prev_gray = None
+        self._frame = 0
+
+    def _gray(self, frame):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if self.method == "flow" else None
+
+    def observe(self, tracks, frame):
+        """記錄偵測結果，並以同一 ID 前一次偵測框估計速度"""
+        self._frame += 1
+        tracks = np.asarray(tracks, dtype=np.float32)
+        velocity = np.zeros((len(tracks), 4), dtype=np.float32)
+        anchors = {}
+        if tracks.ndim == 2 and tracks.shape[1] >= 7:
+            for i, track in enumerate(tracks):
+                track_id = int(track[4])
+                previous = self._anchors.get(track_id)
+                if previous is not None:
+                    box, frame_no = previous
+                    velocity[i] = (track[:4] - box) / max(self._frame - frame_no, 1)
+                anchors[track_id] = (track[:4].copy(), self._frame)
+            self._tracks = tracks.copy()
+        else:
+            # 沒有追蹤 ID 的結果（6 欄）無法跨幀對應，不做傳遞
+            self._tracks = np.empty((0, 7), dtype=np.float32)
+            velocity = np.zeros((0, 4), dtype=np.float32)
+        self._velocity = velocity
+        self._anchors = anchors
+        self._prev_gray = self._gray(frame)
+
+    def propagate(self, frame):
+        self._frame += 1
+        gray = self._gray(frame)
+        if len(self._tracks) == 0:
+            self._prev_gray = gray
+            return self._tracks.copy()
+
+        shift = self._velocity
+        if self.method == "flow" and self._prev_gray is not None and self._prev_gray.shape == gray.shape:
+            shift = self._flow_shift(self._prev_gray, gray)
+        tracks = self._tracks.copy()
+        tracks[:, :4] += shift
+
+        height, width = frame.shape[:2]
+        tracks[:, [0, 2]] = tracks[:, [0, 2]].clip(0, width - 1)
+        tracks[:, [1, 3]] = tracks[:, [1, 3]].clip(0, height - 1)
+        # 推出畫面（寬或高縮成 0）的框不再保留
+        visible = (tracks[:, 2] - tracks[:, 0] > 1) & (tracks[:, 3] - tracks[:, 1] > 1)
+        self._tracks = tracks[visible]
+        self._velocity = self._velocity[visible]
+        self._prev_gray = gray
+        return self._tracks.copy()
+
+    def _flow_shift(self, prev_gray, gray):
+        """每個框內 grid × grid 點的 LK 光流位移中位數（平移四個座標）；點不足的框用等速度"""
+        boxes = self._tracks[:, :4]
+        n, g = len(boxes), self.grid
+        t = (np.arange(g) + 0.5) / g
+        t = self.shrink + (1 - 2 * self.shrink) * t
+        xs = boxes[:, 0:1] + (boxes[:, 2:3] - boxes[:, 0:1]) * t                  # (n, g)
+        ys = boxes[:, 1:2] + (boxes[:, 3:4] - boxes[:, 1:2]) * t
+        points = np.stack(np.broadcast_arrays(xs[:, None, :], ys[:, :, None]), axis=-1)  # (n, g, g, 2)
+        points = points.reshape(-1, 1, 2).astype(np.float32)
+
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **self.lk_params)
+        delta = (moved - points).reshape(n, g * g, 2)
+        ok = status.reshape(n, g * g).astype(bool)
+
+        shift = self._velocity.copy()
+        for i in range(n):
+            if ok[i].sum() >= self.min_points:
+                dx, dy = np.median(delta[i][ok[i]], axis=0)
+                shift[i] = (dx, dy, dx, dy)
+        return shift
+
+
+class SparseDetector:
+    """
+    包裝偵測 backend：每 detect_every 幀跑一次 track_frame()，其餘幀以 BoxPropagator 推算
+    介面與 backend 相同（track_frame / reset / names），LaneTracker 不需要知道是否有降頻
+    """
+
+    def __init__(self, backend, detect_every=3, propagator=None):
+        self.backend = backend
+        self.detect_every = max(int(detect_every), 1)
+        self.propagator = propagator if propagator is not None else BoxPropagator()
+        self.detections = 0   # 實際跑偵測器的次數（統計用）
+        self.updates = 0
+
+    @classmethod
+    def from_config(cls, config, backend):
+        return cls(backend, detect_every=config.get('detect_every', 3), propagator=BoxPropagator.from_config(config))
+
+    @property
+    def names(self):
+        return self.backend.names
+
+    @property
+    def tracker_cfg(self):
+        return self.backend.tracker_cfg
+
+    def reset(self, frame_rate=None):
+        # 追蹤器只看到有偵測的幀，幀率依降頻比例換算（追丟後保留的時間不變）
+        self.backend.reset(frame_rate=frame_rate / self.detect_every if frame_rate else None)
+        self.propagator.reset()
+        self.detections = 0
+        self.updates = 0
+
+    def track_frame(self, frame, imgsz, region=None):
+        run_detection = self.updates % self.detect_every == 0
+        self.updates += 1
+        if not run_detection:
+            return self.propagator.propagate(frame)
+        tracks = self.backend.track_frame(frame, imgsz, region)
+        self.propagator.observe(tracks, frame)
+        self.detections += 1
+        return tracks
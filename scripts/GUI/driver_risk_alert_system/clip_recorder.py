@@ -0,0 +1,205 @@
+"""
+事件觸發的片段錄影：平時只把最近 pre_roll_seconds 秒的畫面留在記憶體環狀緩衝區，
+發生紅色警報（red_risk）、側邊提醒（side_alert）或疲勞警示（drowsiness）時才寫出
+「事發前 pre_roll + 事件期間 + 最後一次事件後 post_roll」的片段，旁邊附上同名 JSON（觸發事件與逐幀風險紀錄）。
+
+- 環狀緩衝區預設存 JPEG（buffer_format: jpeg，約為原圖的 1/10~1/20），raw 則存未壓縮的影像
+- 壓縮、寫檔都在背景執行緒（AsyncFrameSink），sink 階段只複製一次影像
+- 片段錄影中又發生事件時延長 post_roll；片段超過 max_clip_seconds 則先收尾，下一幀若仍有事件再開新片段
+
+輸出：
+    recordings/lane_event_20240101-120000_000_red_risk.mp4
+    recordings/lane_event_20240101-120000_000_red_risk.json
+"""
+import json
+import os
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from telemetry import telemetry
+from video_sink import AsyncFrameSink, SegmentedVideoWriter, segment_path
+
+EVENT_TYPES = ("red_risk", "side_alert", "drowsiness")
+BUFFER_FORMATS = ("jpeg", "raw")
+
+
+class EventClipRecorder(AsyncFrameSink):
+    name = "clip-recorder"
+
+    def __init__(self, path, fps, codec="mp4v", resolution=None, pre_roll_seconds=10, post_roll_seconds=5,
+                 max_clip_seconds=120, buffer_format="jpeg", jpeg_quality=85, triggers=EVENT_TYPES,
+                 queue_size=32, drop_policy="oldest", source_fps=None):
+        """
+        - path：輸出路徑樣板，片段檔名為 <主檔名>_event_<開始時間>_<序號>_<觸發事件><副檔名>
+        - triggers：會觸發錄影的事件（EVENT_TYPES 的子集）
+        """
+        if buffer_format not in BUFFER_FORMATS:
+            raise ValueError(f"Unsupported buffer format: {buffer_format}")
+        unknown = set(triggers) - set(EVENT_TYPES)
+        if unknown:
+            raise ValueError(f"Unsupported clip triggers: {sorted(unknown)}")
+        fps = max(float(fps), 1.0)
+        self.path = path
+        self.fourcc = cv2.VideoWriter_fourcc(*codec)
+        self.post_roll_frames = int(post_roll_seconds * fps)
+        self.max_clip_frames = int(max_clip_seconds * fps) if max_clip_seconds else None
+        self.buffer_format = buffer_format
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+        self.triggers = frozenset(triggers)
+        self.clips = []    # 已寫出的片段路徑
+        # 環狀緩衝區：(影像 或 JPEG bytes, 風險紀錄)，滿了自動擠掉最舊的一筆
+        self._ring = deque(maxlen=max(int(pre_roll_seconds * fps), 1))
+        self._clip = None
+        self._opened = 0       # 已開過的片段數（檔名序號，同一秒內開多個片段時不重名）
+        self._failed = False   # 開檔失敗後不再重試，之後的幀直接略過
+        super().__init__(fps, resolution=resolution, queue_size=queue_size, drop_policy=drop_policy,
+                         source_fps=source_fps)
+
+    @classmethod
+    def from_config(cls, config, path, fps, source_fps=None):
+        events = config.get('events', {})
+        return cls(path, fps,
+                   codec=config.get('codec', 'mp4v'),
+                   resolution=config.get('resolution'),
+                   pre_roll_seconds=events.get('pre_roll_seconds', 10),
+                   post_roll_seconds=events.get('post_roll_seconds', 5),
+                   max_clip_seconds=events.get('max_clip_seconds', 120),
+                   buffer_format=events.get('buffer_format', 'jpeg'),
+                   jpeg_quality=events.get('jpeg_quality', 85),
+                   triggers=events.get('triggers', EVENT_TYPES),
+                   queue_size=config.get('queue_size', 32),
+                   drop_policy=config.get('drop_policy', 'oldest'),
+                   source_fps=source_fps)
+
+    def write(self, frame, record=None, events=(), source_frame=None):
+        """record：本幀風險紀錄（寫進 JSON）；events：本幀發生的事件名稱；source_frame 見 AsyncFrameSink.write"""
+        return super().write(frame, (record, tuple(events)), source_frame=source_frame)
+
+    def close(self):
+        super().close()
+        telemetry.info("recording", "[🎞️ Recording] {clips} event clip(s), {dropped} frames dropped",
+                       clips=len(self.clips), dropped=self.dropped, path=self.path)
+
+    def stats(self):
+        return dict(super().stats(), clips=list(self.clips), buffered=len(self._ring))
+
+    # ---- 背景執行緒 ----
+    def _consume(self, frame, meta, repeat):
+        if self._failed:
+            return
+        record, events = meta
+        events = [event for event in events if event in self.triggers]
+        clip = self._clip
+        if clip is None:
+            if not events:
+                self._buffer(frame, record, repeat)
+                return
+            clip = self._open(frame, events)
+        elif self.max_clip_frames and clip["frames"] >= self.max_clip_frames:
+            self._finish()
+            if events:
+                clip = self._open(frame, events)
+            else:
+                self._buffer(frame, record, repeat)
+                return
+
+        for _ in range(repeat):
+            clip["writer"].write(frame)
+        clip["frames"] += repeat
+        clip["records"].append(record)
+        self.written += repeat
+        if events:
+            frame_no = record.get("frame") if record else None
+            clip["events"].extend({"frame": frame_no, "event": event} for event in events)
+            clip["remaining"] = self.post_roll_frames
+        else:
+            clip["remaining"] -= repeat
+            if clip["remaining"] <= 0:
+                self._finish()
+
+    def _buffer(self, frame, record, repeat):
+        """放進環狀緩衝區；重複的幀共用同一份影像，風險紀錄只記在第一格"""
+        item = self._pack(frame)
+        self._ring.append((item, record))
+        for _ in range(min(repeat, self._ring.maxlen) - 1):
+            self._ring.append((item, None))
+
+    def _pack(self, frame):
+        if self.buffer_format == "raw":
+            return frame.copy()
+        ok, encoded = cv2.imencode(".jpg", frame, self.jpeg_params)
+        return encoded if ok else None
+
+    def _unpack(self, item):
+        if self.buffer_format == "raw" or item is None:
+            return item
+        return cv2.imdecode(item, cv2.IMREAD_COLOR)
+
+    def _open(self, frame, events):
+        """開新片段，先把環狀緩衝區（事發前的畫面）寫進去"""
+        path = segment_path(self.path, f"event_{time.strftime('%Y%m%d-%H%M%S')}_{self._opened:03d}_{events[0]}")
+        writer = cv2.VideoWriter(path, self.fourcc, self.fps, (frame.shape[1], frame.shape[0]))
+        if not writer.isOpened():
+            self._ring.clear()
+            self._failed = True
+            raise OSError(f"Cannot open video writer: {path}")
+        self._opened += 1
+        clip = {"path": path, "writer": writer, "frames": 0, "records": [], "events": [],
+                "remaining": self.post_roll_frames, "started": time.time()}
+        for item, record in self._ring:
+            image = self._unpack(item)
+            if image is None or image.shape != frame.shape:
+                continue
+            writer.write(image)
+            clip["frames"] += 1
+            clip["records"].append(record)
+            self.written += 1
+        clip["pre_roll_frames"] = clip["frames"]
+        self._ring.clear()
+        self._clip = clip
+        telemetry.info("recording", "[🎞️ Recording] event clip {path}", path=path, events=events)
+        return clip
+
+    def _finish(self):
+        clip, self._clip = self._clip, None
+        if clip is None:
+            return
+        clip["writer"].release()
+        frames = [record["frame"] for record in clip["records"] if record and "frame" in record]
+        sidecar = {
+            "clip": clip["path"],
+            "fps": self.fps,
+            "started": clip["started"],
+            "frames": clip["frames"],
+            "pre_roll_frames": clip["pre_roll_frames"],
+            "first_frame": frames[0] if frames else None,
+            "last_frame": frames[-1] if frames else None,
+            "events": clip["events"],
+            "records": [record for record in clip["records"] if record is not None],
+        }
+        with open(os.path.splitext(clip["path"])[0] + ".json", "w", encoding="utf-8") as f:
+            json.dump(sidecar, f, ensure_ascii=False, default=_json_default)
+        self.clips.append(clip["path"])
+
+
+def _json_default(value):
+    # 風險紀錄中的 NumPy 純量
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def open_recorder(config, path, fps, source_fps=None):
+    """
+    依 recording.mode 建立連續錄影（continuous）或事件片段錄影（events）；兩者都接受 write(frame, record, events, source_frame)
+    source_fps：來源影片幀率，搭配 write() 的 source_frame 讓輸出幀率不隨執行期的 frame_skip 改變
+    """
+    mode = config.get('mode', 'events')
+    if mode == "continuous":
+        return SegmentedVideoWriter.from_config(config, path, fps, source_fps=source_fps)
+    if mode == "events":
+        return EventClipRecorder.from_config(config, path, fps, source_fps=source_fps)
+    raise ValueError(f"Unsupported recording mode: {mode}")
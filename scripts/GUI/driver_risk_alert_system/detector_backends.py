@@ -0,0 +1,278 @@
+"""
+物件偵測 backend：ultralytics（PyTorch）/ ONNX Runtime / OpenVINO，三者介面相同
+
+- detect(frame, imgsz, region=None)：回傳 (N, 6) [x1, y1, x2, y2, conf, cls]（原圖座標）
+- detect_batch(frames, imgsz, regions=None)：多路影像一次推論
+- track_frame(frame, imgsz, region=None)：偵測 + 本 backend 自己的追蹤器，回傳 (N, 7) [x1, y1, x2, y2, id, conf, cls]
+region 為 (x1, y1, x2, y2) 時只對該區域推論（imgsz 依裁切比例縮小，像素密度與整張相同），框再換回原圖座標。
+追蹤一律由 object_tracking 建立的 BoT-SORT / ByteTrack 處理，換 backend 不影響追蹤與 ID 行為。
+
+模型轉檔（含 INT8 量化）見 export_detector.py；backend 在 risk_params.yaml 的 detector 區段選擇。
+"""
+import ast
+import os
+
+import cv2
+import numpy as np
+import yaml
+
+from object_tracking import make_tracker, track_detections
+
+# 與 ultralytics 的 letterbox 相同：灰色補邊、輸入邊長為 32 的倍數
+PAD_VALUE = 114
+STRIDE = 32
+
+
+def letterbox(frame, imgsz, auto=True):
+    """
+    等比例縮放到長邊 imgsz 並補邊，回傳 (影像, 縮放比例, (左補邊, 上補邊))
+    auto=True 時只補到 STRIDE 的倍數（動態輸入模型，較小的輸入）；False 時補成 imgsz × imgsz（固定輸入模型）
+    """
+    height, width = frame.shape[:2]
+    ratio = min(imgsz / height, imgsz / width)
+    new_w, new_h = int(round(width * ratio)), int(round(height * ratio))
+    if auto:
+        out_w, out_h = -(-new_w // STRIDE) * STRIDE, -(-new_h // STRIDE) * STRIDE
+    else:
+        out_w = out_h = imgsz
+    left, top = (out_w - new_w) // 2, (out_h - new_h) // 2
+    resized = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_LINEAR) if (new_w, new_h) != (width, height) else frame
+    padded = cv2.copyMakeBorder(resized, top, out_h - new_h - top, left, out_w - new_w - left,
+                                cv2.BORDER_CONSTANT, value=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+    return padded, ratio, (left, top)
+
+
+def to_blob(images):
+    """BGR uint8 影像（同尺寸）→ (N, 3, H, W) float32 RGB / 255"""
+    return cv2.dnn.blobFromImages(images, scalefactor=1 / 255.0, swapRB=True)
+
+
+def decode_yolo(output, conf=0.25, iou=0.7, max_det=300):
+    """
+    YOLOv8 偵測頭輸出 (4 + 類別數, anchors)（中心 xywh + 各類別分數）→ (N, 6) [x1, y1, x2, y2, conf, cls]，
+    依類別做 NMS（模型輸入座標）
+    """
+    scores = output[4:]
+    cls = scores.argmax(axis=0)
+    best = scores[cls, np.arange(scores.shape[1])]
+    keep = best >= conf
+    if not keep.any():
+        return np.empty((0, 6), dtype=np.float32)
+    xywh, best, cls = output[:4, keep].T, best[keep], cls[keep]
+    xyxy = np.concatenate([xywh[:, :2] - xywh[:, 2:] / 2, xywh[:, :2] + xywh[:, 2:] / 2], axis=1)
+    # NMSBoxesBatched 吃左上角 + 寬高
+    rects = np.concatenate([xyxy[:, :2], xywh[:, 2:]], axis=1)
+    index = cv2.dnn.NMSBoxesBatched(rects.tolist(), best.tolist(), cls.tolist(), conf, iou)
+    index = np.asarray(index, dtype=int).reshape(-1)[:max_det]
+    return np.column_stack([xyxy[index], best[index], cls[index]]).astype(np.float32)
+
+
+def roi_crop_region(roi_dict, frame_shape, margin=0.05, top_margin=0.15, max_area_ratio=0.8):
+    """
+    風險區塊（high / mid / low / side_left / side_right）聯集的外接矩形，左右下各加 margin、上方加 top_margin
+    （畫面比例；車輛底部在區塊內時車頂會超出區塊）。沒有區塊或裁切後仍超過 max_area_ratio 時回傳 None（整張推論）
+    """
+    polygons = [np.asarray(polygon).reshape(-1, 2) for polygon in roi_dict.values() if polygon is not None]
+    if not polygons:
+        return None
+    points = np.concatenate(polygons)
+    height, width = frame_shape[:2]
+    x1, y1 = points.min(axis=0)
+    x2, y2 = points.max(axis=0)
+    x1 = int(max(x1 - margin * width, 0))
+    x2 = int(min(x2 + margin * width, width))
+    y1 = int(max(y1 - top_margin * height, 0))
+    y2 = int(min(y2 + margin * height, height))
+    if x2 - x1 < STRIDE or y2 - y1 < STRIDE or (x2 - x1) * (y2 - y1) > max_area_ratio * width * height:
+        return None
+    return x1, y1, x2, y2
+
+
+def crop_imgsz(imgsz, region, frame_shape):
+    """裁切區域的推論尺寸：與整張用 imgsz 推論時的縮放比例相同（取 STRIDE 倍數）"""
+    x1, y1, x2, y2 = region
+    scale = max(x2 - x1, y2 - y1) / max(frame_shape[:2])
+    return max(-(-int(imgsz * scale) // STRIDE) * STRIDE, STRIDE * 2)
+
+
+def scale_boxes(detections, ratio, pad, frame_shape):
+    """模型輸入座標 → 原圖座標"""
+    if len(detections):
+        detections[:, [0, 2]] = (detections[:, [0, 2]] - pad[0]) / ratio
+        detections[:, [1, 3]] = (detections[:, [1, 3]] - pad[1]) / ratio
+        detections[:, [0, 2]] = detections[:, [0, 2]].clip(0, frame_shape[1])
+        detections[:, [1, 3]] = detections[:, [1, 3]].clip(0, frame_shape[0])
+    return detections
+
+
+class DetectorBackend:
+    """
+    各 backend 的共同部分：追蹤器、裁切推論與 track_frame()
+    子類別實作 _detect_batch()；多路影像共用一個 backend 時，各路以 make_tracker + track_detections 自行追蹤
+    """
+
+    names = None
+
+    def __init__(self, conf=0.1, iou=0.7, max_det=300, tracker_cfg="botsort.yaml"):
+        # conf=0.1 與 YOLO.track() 的預設相同，低分框交給追蹤器做第二階段關聯
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        self.tracker_cfg = tracker_cfg
+        self.frame_rate = 30
+        self._tracker = None
+
+    def reset(self, frame_rate=None):
+        """換影片 / 分段處理時重建追蹤器，ID 重新從頭編號"""
+        if frame_rate:
+            self.frame_rate = int(frame_rate)
+        self._tracker = None
+
+    def detect(self, frame, imgsz, region=None):
+        return self.detect_batch([frame], imgsz, None if region is None else [region])[0]
+
+    def detect_batch(self, frames, imgsz, regions=None):
+        if regions is None or all(region is None for region in regions):
+            return self._detect_batch(frames, imgsz)
+        crops, sizes = [], []
+        for frame, region in zip(frames, regions):
+            if region is None:
+                crops.append(frame)
+                sizes.append(imgsz)
+            else:
+                x1, y1, x2, y2 = region
+                crops.append(frame[y1:y2, x1:x2])
+                sizes.append(crop_imgsz(imgsz, region, frame.shape))
+        # 同一批次共用一個推論尺寸（取最大，不會比整張推論的像素密度低）
+        detections = self._detect_batch(crops, max(sizes))
+        for dets, region in zip(detections, regions):
+            if region is not None and len(dets):
+                dets[:, [0, 2]] += region[0]
+                dets[:, [1, 3]] += region[1]
+        return detections
+
+    def _detect_batch(self, frames, imgsz):
+        raise NotImplementedError
+
+    def track_frame(self, frame, imgsz, region=None):
+        if self._tracker is None:
+            self._tracker = make_tracker(self.tracker_cfg, frame_rate=self.frame_rate)
+        # 追蹤器（含相機運動補償）看的是整張原圖，框已換回原圖座標
+        return track_detections(self.detect(frame, imgsz, region), self._tracker, frame)
+
+
+class UltralyticsBackend(DetectorBackend):
+    """ultralytics YOLO（PyTorch，CPU）"""
+
+    def __init__(self, weights=None, model=None, **kwargs):
+        super().__init__(**kwargs)
+        if model is None:
+            from ultralytics import YOLO
+
+            model = YOLO(weights)
+        self.model = model
+        self.names = getattr(model, 'names', None)
+
+    def _detect_batch(self, frames, imgsz):
+        results = self.model.predict(frames, imgsz=imgsz, conf=self.conf, iou=self.iou, max_det=self.max_det,
+                                     verbose=False)
+        return [result.boxes.data.cpu().numpy() for result in results]
+
+
+class _ExportedBackend(DetectorBackend):
+    """ONNX Runtime / OpenVINO 共用的前處理（letterbox）與後處理（解碼 + NMS + 座標還原）"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.fixed_size = None   # 固定輸入尺寸的模型（INT8 / 非 dynamic 匯出）忽略 imgsz
+
+    def _infer(self, blob):
+        raise NotImplementedError
+
+    def _detect_batch(self, frames, imgsz):
+        # 固定輸入尺寸的模型會把裁切區域補邊成同樣大小，裁切推論省不到時間
+        size = self.fixed_size or imgsz
+        boxed = [letterbox(frame, size, auto=self.fixed_size is None) for frame in frames]
+        shapes = {image.shape for image, _, _ in boxed}
+        if len(shapes) == 1:
+            outputs = self._infer(to_blob([image for image, _, _ in boxed]))
+        else:
+            # 各路長寬比不同時逐張推論
+            outputs = np.concatenate([self._infer(to_blob([image])) for image, _, _ in boxed])
+        return [scale_boxes(decode_yolo(output, self.conf, self.iou, self.max_det), ratio, pad, frame.shape)
+                for output, frame, (_, ratio, pad) in zip(outputs, frames, boxed)]
+
+
+class OnnxRuntimeBackend(_ExportedBackend):
+    def __init__(self, model_path, threads=None, **kwargs):
+        import onnxruntime as ort
+
+        super().__init__(**kwargs)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        height, width = model_input.shape[2:]
+        if isinstance(height, int) and isinstance(width, int):
+            self.fixed_size = height
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        self.names = ast.literal_eval(metadata['names']) if 'names' in metadata else None
+
+    def _infer(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(_ExportedBackend):
+    def __init__(self, model_path, threads=None, **kwargs):
+        import openvino as ov
+
+        super().__init__(**kwargs)
+        if os.path.isdir(model_path):
+            model_dir = model_path
+            model_path = next(os.path.join(model_dir, f) for f in sorted(os.listdir(model_dir)) if f.endswith(".xml"))
+        else:
+            model_dir = os.path.dirname(model_path)
+        core = ov.Core()
+        model = core.read_model(model_path)
+        if not model.input(0).get_partial_shape().is_dynamic:
+            self.fixed_size = model.input(0).get_shape()[2]
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.names = None
+        metadata_path = os.path.join(model_dir, "metadata.yaml")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r', encoding='utf-8') as file:
+                self.names = yaml.safe_load(file).get('names')
+
+    def _infer(self, blob):
+        return self.compiled(blob)[0]
+
+
+BACKENDS = {
+    "ultralytics": UltralyticsBackend,
+    "onnxruntime": OnnxRuntimeBackend,
+    "openvino": OpenVinoBackend,
+}
+
+
+def load_detector(config, base_dir="."):
+    """依 risk_params 的 detector 區段建立 backend；相對路徑以 base_dir 為準"""
+    backend = config.get('backend', 'ultralytics')
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported detector backend: {backend}")
+    weights = os.path.join(base_dir, config.get('weights', os.path.join("weight", "best2.pt")))
+    common = dict(conf=config.get('conf', 0.1), iou=config.get('iou', 0.7), max_det=config.get('max_det', 300),
+                  tracker_cfg=config.get('tracker', "botsort.yaml"))
+    if backend == "ultralytics":
+        return UltralyticsBackend(weights=weights, **common)
+    return BACKENDS[backend](weights, threads=config.get('threads'), **common)
+
+
+def as_detector(model):
+    """已是 backend（有 track_frame）就直接使用；ultralytics YOLO 物件包成 UltralyticsBackend"""
+    return model if hasattr(model, "track_frame") else UltralyticsBackend(model=model)
@@ -0,0 +1,176 @@
+"""
+把 weight/best2.pt 轉成 CPU 推論用的 ONNX / OpenVINO 模型，可選 INT8 靜態量化（以 BDD10K 驗證集圖片校正）
+
+輸出（預設放在權重旁）：
+    onnx：     best2.onnx、best2_int8.onnx
+    openvino： best2_openvino_model/、best2_int8_openvino_model/
+轉好後在 risk_params.yaml 的 detector 區段設定 backend 與 weights 即可，追蹤器設定不變。
+
+用法：
+    python export_detector.py --format onnx
+    python export_detector.py --format onnx --int8 --calib-dir /data/bdd100k/images/10k/val
+    python export_detector.py --format openvino --int8 --calib-dir /data/bdd100k/images/10k/val --calib-size 300
+    python export_detector.py --format onnx --int8 --calib-dir ... --compare   # 轉完比較各模型的偵測耗時
+"""
+import argparse
+import glob
+import os
+import shutil
+import sys
+import time
+
+import cv2
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+
+from detector_backends import OnnxRuntimeBackend, OpenVinoBackend, UltralyticsBackend, letterbox, to_blob  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+# 管線送進偵測器的幀寬（lane_tracker_module 的處理尺寸），校正圖片先縮到同樣大小
+PROCESS_WIDTH = 640
+
+
+def load_calibration_images(calib_dir, count, seed=0):
+    """從資料夾隨機取 count 張圖片（固定 seed，結果可重現），縮放到管線的處理尺寸"""
+    paths = sorted(p for p in glob.glob(os.path.join(calib_dir, "**", "*"), recursive=True)
+                   if p.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        raise FileNotFoundError(f"No images found in {calib_dir}")
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(paths), size=min(count, len(paths)), replace=False)
+    images = []
+    for index in sorted(chosen):
+        image = cv2.imread(paths[index])
+        if image is None:
+            continue
+        height, width = image.shape[:2]
+        images.append(cv2.resize(image, (PROCESS_WIDTH, int(height * PROCESS_WIDTH / width)),
+                                 interpolation=cv2.INTER_AREA))
+    print(f"[📷 Calibration] {len(images)} images from {calib_dir}")
+    return images
+
+
+def calibration_blob(image, imgsz):
+    # 與 _ExportedBackend 推論時相同的前處理
+    return to_blob([letterbox(image, imgsz)[0]])
+
+
+def export_onnx(model, imgsz, int8=False, images=None, exclude_prefix=None):
+    fp32_path = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+    outputs = [fp32_path]
+    if int8:
+        import onnx
+        from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        class _Reader(CalibrationDataReader):
+            def __init__(self, input_name):
+                self._feeds = iter([{input_name: calibration_blob(image, imgsz)} for image in images])
+
+            def get_next(self):
+                return next(self._feeds, None)
+
+        base = os.path.splitext(fp32_path)[0]
+        prep_path = f"{base}_prep.onnx"
+        int8_path = f"{base}_int8.onnx"
+        quant_pre_process(fp32_path, prep_path)
+        fp32_model = onnx.load(fp32_path)
+        # 偵測頭（座標解碼 / 類別分數）維持浮點數，量化誤差對框位置影響最大
+        excluded = [node.name for node in fp32_model.graph.node
+                    if exclude_prefix and node.name.startswith(exclude_prefix)]
+        quantize_static(prep_path, int8_path, _Reader(fp32_model.graph.input[0].name),
+                        quant_format=QuantFormat.QDQ, per_channel=True,
+                        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                        nodes_to_exclude=excluded)
+        os.remove(prep_path)
+        # 類別名稱等 metadata 沿用原模型
+        int8_model = onnx.load(int8_path)
+        del int8_model.metadata_props[:]
+        int8_model.metadata_props.extend(fp32_model.metadata_props)
+        onnx.save(int8_model, int8_path)
+        print(f"[🔧 INT8] {int8_path}（{len(excluded)} nodes kept in float）")
+        outputs.append(int8_path)
+    return outputs
+
+
+def export_openvino(model, imgsz, int8=False, images=None):
+    fp32_dir = model.export(format="openvino", imgsz=imgsz, dynamic=True)
+    outputs = [fp32_dir]
+    if int8:
+        import nncf
+        import openvino as ov
+
+        xml_path = next(os.path.join(fp32_dir, f) for f in os.listdir(fp32_dir) if f.endswith(".xml"))
+        base = os.path.splitext(os.path.basename(xml_path))[0]
+        int8_dir = os.path.join(os.path.dirname(fp32_dir), f"{base}_int8_openvino_model")
+        os.makedirs(int8_dir, exist_ok=True)
+        dataset = nncf.Dataset(images, lambda image: calibration_blob(image, imgsz))
+        quantized = nncf.quantize(ov.Core().read_model(xml_path), dataset, subset_size=len(images),
+                                  preset=nncf.QuantizationPreset.MIXED,
+                                  ignored_scope=nncf.IgnoredScope(types=["Sigmoid"]))
+        ov.save_model(quantized, os.path.join(int8_dir, f"{base}_int8.xml"))
+        metadata_path = os.path.join(fp32_dir, "metadata.yaml")
+        if os.path.exists(metadata_path):
+            shutil.copy(metadata_path, int8_dir)
+        print(f"[🔧 INT8] {int8_dir}")
+        outputs.append(int8_dir)
+    return outputs
+
+
+def compare(weights, outputs, fmt, images, imgsz, repeat=3):
+    """以相同圖片比較各模型單張偵測耗時（中位數）與偵測框數"""
+    backends = {"pytorch": lambda: UltralyticsBackend(weights=weights)}
+    for path in outputs:
+        backend_cls = OnnxRuntimeBackend if fmt == "onnx" else OpenVinoBackend
+        backends[os.path.basename(path)] = lambda path=path, backend_cls=backend_cls: backend_cls(path)
+
+    print(f"\n{'model':<32} {'p50 ms':>8} {'boxes/img':>10}")
+    baseline = None
+    for name, build in backends.items():
+        backend = build()
+        backend.detect(images[0], imgsz)   # 暖機
+        costs, boxes = [], 0
+        for _ in range(repeat):
+            for image in images:
+                start = time.perf_counter()
+                boxes += len(backend.detect(image, imgsz))
+                costs.append(time.perf_counter() - start)
+        p50 = 1000.0 * float(np.median(costs))
+        baseline = baseline or p50
+        print(f"{name:<32} {p50:>8.2f} {boxes / (repeat * len(images)):>10.1f}  ({baseline / p50:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="best2.pt → ONNX / OpenVINO（可選 INT8 量化）")
+    parser.add_argument("--weights", default=os.path.join(current_dir, "weight", "best2.pt"))
+    parser.add_argument("--format", choices=["onnx", "openvino"], default="onnx")
+    parser.add_argument("--imgsz", type=int, default=320, help="校正與比較用的輸入尺寸（模型為動態輸入）")
+    parser.add_argument("--int8", action="store_true", help="另外輸出 INT8 靜態量化模型")
+    parser.add_argument("--calib-dir", help="校正圖片資料夾（例如 bdd100k/images/10k/val）")
+    parser.add_argument("--calib-size", type=int, default=300, help="校正圖片張數")
+    parser.add_argument("--exclude-prefix", default="/model.22/", help="ONNX 量化時保持浮點數的節點名稱前綴（偵測頭）")
+    parser.add_argument("--compare", action="store_true", help="轉完比較 PyTorch 與輸出模型的偵測耗時")
+    args = parser.parse_args()
+
+    if (args.int8 or args.compare) and not args.calib_dir:
+        parser.error("--int8 / --compare 需要 --calib-dir")
+
+    from ultralytics import YOLO
+
+    model = YOLO(args.weights)
+    images = load_calibration_images(args.calib_dir, args.calib_size) if args.calib_dir else None
+    if args.format == "onnx":
+        outputs = export_onnx(model, args.imgsz, args.int8, images, args.exclude_prefix)
+    else:
+        outputs = export_openvino(model, args.imgsz, args.int8, images)
+    for path in outputs:
+        print(f"[✅ Export] {path}")
+
+    if args.compare:
+        compare(args.weights, outputs, args.format, images[:50], args.imgsz)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import threading
+import numpy as np
+
+
+class FrameBufferPool:
+    """
+    預先配置、依解析度分組的影像緩衝池，讓熱路徑穩定後不再配置整張影像
+
+    - get(name, shape)：環狀輪替的緩衝區，給「會跟著幀在管線中流動」的影像使用
+      （例如縮放後的幀、車道色塊圖），depth 需 ≥ 管線中同時存活的幀數，才不會覆蓋到還在使用的幀
+    - scratch(name, shape)：單一暫存區，只在同一個函式 / 同一條執行緒內用完即丟的中間結果
+    - 以 (name, shape, dtype) 為 key，解析度改變時自動建立新一組緩衝區
+    """
+
+    def __init__(self, depth=8):
+        self.depth = depth
+        self._rings = {}
+        self._cursors = {}
+        self._scratch = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, shape, dtype=np.uint8):
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is None:
+                ring = [np.empty(shape, dtype=dtype) for _ in range(self.depth)]
+                self._rings[key] = ring
+                self._cursors[key] = 0
+            i = self._cursors[key]
+            self._cursors[key] = (i + 1) % self.depth
+            return ring[i]
+
+    def scratch(self, name, shape, dtype=np.uint8):
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        with self._lock:
+            buf = self._scratch.get(key)
+            if buf is None:
+                buf = np.empty(shape, dtype=dtype)
+                self._scratch[key] = buf
+            return buf
+
+    def clear(self):
+        with self._lock:
+            self._rings.clear()
+            self._cursors.clear()
+            self._scratch.clear()
+
+    def nbytes(self):
+        """目前緩衝池佔用的總位元組數"""
+        with self._lock:
+            total = sum(buf.nbytes for ring in self._rings.values() for buf in ring)
+            return total + sum(buf.nbytes for buf in self._scratch.values())
@@ -0,0 +1,305 @@
+import threading
+import time
+from collections import deque
+
+from telemetry import telemetry
+
+
+class PipelineClosed(Exception):
+    """佇列已關閉且清空，代表上游不會再送入任何幀"""
+
+
+class FrameQueue:
+    """
+    有界幀佇列（執行緒安全）
+
+    - drop_oldest=True：佇列滿時丟掉最舊的一幀（即時顯示用，永遠處理最新畫面）
+    - drop_oldest=False：佇列滿時阻塞等待（離線批次用，不可掉幀）
+    - producers：上游生產者數量，全部 close() 後才算真正關閉
+    """
+
+    def __init__(self, maxsize=2, drop_oldest=True, producers=1):
+        self.maxsize = maxsize
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+        self._items = deque()
+        self._open_producers = producers
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            if self.drop_oldest:
+                if len(self._items) >= self.maxsize:
+                    self._items.popleft()
+                    self.dropped += 1
+            else:
+                while len(self._items) >= self.maxsize and self._open_producers > 0:
+                    self._cond.wait(0.1)
+            self._items.append(item)
+            self._cond.notify_all()
+
+    def get(self, timeout=0.1):
+        """取出一幀；逾時回傳 None，已關閉且清空時拋出 PipelineClosed"""
+        with self._cond:
+            if not self._items:
+                if self._open_producers <= 0:
+                    raise PipelineClosed()
+                self._cond.wait(timeout)
+                if not self._items:
+                    if self._open_producers <= 0:
+                        raise PipelineClosed()
+                    return None
+            item = self._items.popleft()
+            self._cond.notify_all()
+            return item
+
+    def close(self):
+        with self._cond:
+            self._open_producers -= 1
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class FramePacket:
+    """
+    在各階段之間傳遞的單幀資料
+
+    - idx: 幀序號（join 時用來對齊同一幀）
+    - frame: 處理尺寸下的 BGR 影像（各階段只讀，不可原地修改）
+    - t_capture: 擷取時間（perf_counter），用於計算端到端延遲
+    - 其餘欄位由各階段自行掛上（lane / detect / risk / render 的結果）
+    """
+
+    def __init__(self, idx, frame, t_capture=None):
+        self.idx = idx
+        self.frame = frame
+        self.t_capture = time.perf_counter() if t_capture is None else t_capture
+
+
+class Handoff:
+    """
+    一幀某階段的結果交給下一幀的另一個平行階段（例如 lane 階段算出的裁切範圍給下一幀的 detect 階段）
+    擷取時串好前後幀，結果只經由 packet 傳遞，不讀寫跨執行緒的共用屬性
+    """
+
+    __slots__ = ("value", "_ready")
+
+    def __init__(self):
+        self.value = None
+        self._ready = threading.Event()
+
+    def set(self, value):
+        self.value = value
+        self._ready.set()
+
+    def ready(self):
+        return self._ready.is_set()
+
+    def wait(self, stop_event, timeout=0.1):
+        """等到 set() 為止（管線停止時放棄），回傳是否已有結果"""
+        while not self._ready.wait(timeout):
+            if stop_event.is_set():
+                return False
+        return True
+
+
+class StageStats:
+    """單一階段的吞吐統計（處理幀數、平均耗時、近期 FPS、輸入端掉幀數）"""
+
+    def __init__(self, name, window=30):
+        self.name = name
+        self.processed = 0
+        self.busy_time = 0.0
+        self._done_times = deque(maxlen=window)
+        self._costs = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, cost):
+        now = time.perf_counter()
+        with self._lock:
+            self.processed += 1
+            self.busy_time += cost
+            self._done_times.append(now)
+            self._costs.append(cost)
+
+    @property
+    def fps(self):
+        with self._lock:
+            if len(self._done_times) < 2:
+                return 0.0
+            span = self._done_times[-1] - self._done_times[0]
+            return (len(self._done_times) - 1) / span if span > 0 else 0.0
+
+    @property
+    def avg_ms(self):
+        with self._lock:
+            if not self._costs:
+                return 0.0
+            return 1000.0 * sum(self._costs) / len(self._costs)
+
+
+class _Stage(threading.Thread):
+    def __init__(self, name, fn, in_queue, join, stop_event):
+        super().__init__(name=f"stage-{name}", daemon=True)
+        self.fn = fn
+        self.in_queue = in_queue
+        self.join_count = join
+        self.out_queues = []
+        self.stats = StageStats(name)
+        self.stop_event = stop_event
+        self._pending = {}
+
+    def _joined(self, packet):
+        """多個上游匯流時，同一幀要等所有分支都到齊才往下處理"""
+        if self.join_count <= 1:
+            return True
+        arrivals = self._pending.get(packet.idx, 0) + 1
+        if arrivals < self.join_count:
+            self._pending[packet.idx] = arrivals
+            return False
+        self._pending.pop(packet.idx, None)
+        # 各分支皆依序處理，比這幀舊卻還沒到齊的，代表已被其中一個分支丟棄
+        for stale_idx in [i for i in self._pending if i < packet.idx]:
+            del self._pending[stale_idx]
+        return True
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    packet = self.in_queue.get()
+                except PipelineClosed:
+                    break
+                if packet is None or not self._joined(packet):
+                    continue
+
+                start = time.perf_counter()
+                try:
+                    result = self.fn(packet)
+                except Exception as e:
+                    telemetry.error("pipeline", "[❌ Pipeline stage '{stage}' error] {error}",
+                                    stage=self.stats.name, error=str(e), frame=getattr(packet, "idx", None))
+                    result = None
+                self.stats.record(time.perf_counter() - start)
+
+                if result is None:
+                    continue
+                for q in self.out_queues:
+                    q.put(result)
+        finally:
+            for q in self.out_queues:
+                q.close()
+
+
+class FramePipeline:
+    """
+    多階段幀處理管線：每個階段一條執行緒，階段之間以有界佇列串接
+
+    用法：
+        pipe = FramePipeline(queue_size=2)
+        pipe.set_source(frame_generator)                # 產生 FramePacket 的 generator
+        pipe.add_stage("lane", lane_fn)                 # 預設接在 source 後面
+        pipe.add_stage("detect", detect_fn)             # 與 lane 並行處理同一幀
+        pipe.add_stage("risk", risk_fn, after=("lane", "detect"))  # 兩個分支都完成才執行
+        pipe.run()
+
+    階段函式回傳 packet 代表往下游傳遞，回傳 None 代表丟棄該幀。
+    持續 FPS 由最慢的階段決定，而不是所有階段耗時的總和。
+    """
+
+    SOURCE = "source"
+
+    def __init__(self, queue_size=2, drop_oldest=True, report_interval=5.0):
+        self.queue_size = queue_size
+        self.drop_oldest = drop_oldest
+        self.report_interval = report_interval
+        self.stop_event = threading.Event()
+        self._source_fn = None
+        self._source_outs = []
+        self._stages = {}
+        self.source_stats = StageStats(self.SOURCE)
+
+    def set_source(self, source_fn):
+        self._source_fn = source_fn
+
+    def add_stage(self, name, fn, after=SOURCE):
+        upstream = (after,) if isinstance(after, str) else tuple(after)
+        in_queue = FrameQueue(self.queue_size, self.drop_oldest, producers=len(upstream))
+        stage = _Stage(name, fn, in_queue, len(upstream), self.stop_event)
+        for up in upstream:
+            if up == self.SOURCE:
+                self._source_outs.append(in_queue)
+            else:
+                self._stages[up].out_queues.append(in_queue)
+        self._stages[name] = stage
+        return stage
+
+    def stop(self):
+        self.stop_event.set()
+
+    def capacity(self):
+        """同一時間最多可能同時存活於管線中的幀數（佇列容量 + 每個階段手上各一幀 + 匯流緩衝）"""
+        return len(self._stages) * (self.queue_size + 1) + 2
+
+    def _run_source(self):
+        last = time.perf_counter()
+        try:
+            for packet in self._source_fn():
+                if self.stop_event.is_set():
+                    break
+                now = time.perf_counter()
+                self.source_stats.record(now - last)
+                last = now
+                for q in self._source_outs:
+                    q.put(packet)
+        except Exception as e:
+            telemetry.error("pipeline", "[❌ Pipeline source error] {error}", error=str(e))
+        finally:
+            for q in self._source_outs:
+                q.close()
+
+    def run(self):
+        """啟動所有階段並阻塞直到 source 結束或呼叫 stop()"""
+        for stage in self._stages.values():
+            stage.start()
+        source = threading.Thread(target=self._run_source, name="stage-source", daemon=True)
+        source.start()
+
+        last_report = time.perf_counter()
+        try:
+            for stage in self._stages.values():
+                while stage.is_alive():
+                    stage.join(timeout=0.2)
+                    if self.report_interval and time.perf_counter() - last_report >= self.report_interval:
+                        telemetry.info("pipeline", "[📊 Pipeline] {summary}",
+                                       summary=self.format_stats(), stages=self.stats())
+                        last_report = time.perf_counter()
+        finally:
+            self.stop_event.set()
+            source.join(timeout=1.0)
+
+    def stats(self):
+        """回傳各階段統計：fps、平均耗時 (ms)、輸入佇列掉幀數"""
+        rows = [{"stage": self.SOURCE, "fps": self.source_stats.fps,
+                 "avg_ms": self.source_stats.avg_ms, "dropped": 0}]
+        for name, stage in self._stages.items():
+            rows.append({"stage": name, "fps": stage.stats.fps,
+                         "avg_ms": stage.stats.avg_ms, "dropped": stage.in_queue.dropped})
+        return rows
+
+    def stage_stats(self, name):
+        if name == self.SOURCE:
+            return self.source_stats
+        return self._stages[name].stats
+
+    def bottleneck(self):
+        """目前平均耗時最高的階段（決定整體持續 FPS）"""
+        rows = [r for r in self.stats() if r["stage"] != self.SOURCE]
+        return max(rows, key=lambda r: r["avg_ms"]) if rows else None
+
+    def format_stats(self):
+        return " | ".join(f"{r['stage']} {r['fps']:.1f}fps {r['avg_ms']:.1f}ms drop={r['dropped']}"
+                          for r in self.stats())
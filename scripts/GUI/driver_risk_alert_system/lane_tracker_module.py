@@ -1,75 +1,494 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
 import os
 import sys
 import time
-from collections import defaultdict, deque
+from collections import deque
 import gc # 導入 gc 模組，用於垃圾回收
 
 # 為了支援 risk_modules 導入
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
+# 為了支援 speech_alert_system / telemetry 導入（直接執行本檔時）
+sys.path.append(os.path.dirname(current_dir))
 
 from risk_modules.risk_analyzer import *
 from risk_modules.Land_detection import *
 from risk_modules.warning_controller import *
+from risk_modules.ego_motion import EgoMotionEstimator
+from risk_modules.zone_classifier import ZoneClassifier
+from risk_modules.overlay_compositor import OverlayCompositor
+from risk_modules.annotation_renderer import AnnotationRenderer
+from frame_pipeline import FramePacket, FramePipeline, Handoff
+from latency_governor import LatencyGovernor
+from frame_buffer_pool import FrameBufferPool
+from detector_backends import as_detector, load_detector, roi_crop_region
+from box_propagation import SparseDetector
+from clip_recorder import open_recorder
 import yaml
-
-# 導入語音輸出模組
-from speech_alert_system import generate_and_play_audio
+from telemetry import telemetry
+from stage_timer import StageTimer
+from display_service import display
 
 
 class LaneTracker:
-    def __init__(self, shared_alert):
+    def __init__(self, shared_alert, video_path=None, headless=False, enable_audio=True,
+                 output_path=os.path.join("recordings", "lane.mp4"),
+                 model=None, stream_name=None):
+        """
+        - video_path：輸入影片（預設 assets/videoplayback.mp4）
+        - headless：無顯示模式（批次處理用）：不開視窗、不畫圖、不掉幀、不動態降載
+        - enable_audio：是否播放語音提醒
+        - output_path：輸出標註影片路徑（相對路徑以本資料夾為準，依 recording 設定分段輪替）；None 代表不輸出
+        - model：共用的偵測器（detector_backends 的 backend 或 ultralytics YOLO 物件，多路影像共用時傳入）；
+          None 則依 risk_params.yaml 的 detector 區段載入（ultralytics / onnxruntime / openvino）
+        - stream_name：多路影像時的串流名稱，用來區隔各路的追蹤 ID 狀態
+        """
         self.shared_alert = shared_alert
-        # 歷史數據隊列長度保持不變，因為它們通常佔用記憶體較少
-        self.object_history = defaultdict(lambda: deque(maxlen=5))
-        self.risk_score_history = defaultdict(lambda: deque(maxlen=10))
-
+        self.stream_name = stream_name
+        self.headless = headless
+        self.enable_audio = enable_audio
+        self._speak = None
+        if enable_audio:
+            # 語音模組（simpleaudio）只在需要播放時才匯入，關閉語音的批次處理 / 效能測試不需要安裝
+            from speech_alert_system import generate_and_play_audio
+            self._speak = generate_and_play_audio
         self.current_dir = os.path.dirname(os.path.abspath(__file__))
+        self.output_path = os.path.join(self.current_dir, output_path) if output_path else None
         self.yaml_path = os.path.join(self.current_dir, 'risk_modules', 'risk_params.yaml')
 
         with open(self.yaml_path, 'r', encoding='utf-8') as file:
             self.risk_config = yaml.safe_load(file)['risk_params']
 
-        self.flow_roi_top = self.risk_config['optical_flow']['roi_top_ratio']
-        self.flow_roi_bottom = self.risk_config['optical_flow']['roi_bottom_ratio']
-
-        model_path = os.path.join(self.current_dir, "weight", "best2.pt")
-        # 初始化 YOLO 模型，考慮在需要時調整推斷設備 (device)
-        self.model = YOLO(model_path) 
-            
-        # 可以考慮將模型加載到 GPU 如果有並且記憶體足夠：
-        # self.model = YOLO(model_path).to('cuda') 
-
-        self.video_path = os.path.join(self.current_dir, "assets", "videoplayback.mp4")
+        # 結構化紀錄（背景執行緒寫 JSONL，熱路徑只排入環狀緩衝區）；相對路徑以本資料夾為準
+        # configure() 只更新 yaml 有寫的欄位，多個 LaneTracker（多路攝影機）或 GUI 先設定過的其他欄位不會被重設
+        telemetry_config = dict(self.risk_config.get('telemetry', {}))
+        if telemetry_config.get('path'):
+            telemetry_config['path'] = os.path.join(self.current_dir, telemetry_config['path'])
+        telemetry.configure(**telemetry_config)
+        # 各階段耗時 p50 / p95 / p99（decode、resize、lane、flow、detect、risk、render、write、display）
+        self.timing_config = dict(self.risk_config.get('timing', {}))
+        for key in ('csv_path', 'prom_path'):
+            if self.timing_config.get(key):
+                self.timing_config[key] = os.path.join(self.current_dir, self.timing_config[key])
+        self.stage_timer = StageTimer.from_config(self.timing_config)
+        self._timing_exported_at = time.monotonic()
+        # 視窗由顯示服務的執行緒統一更新（refresh_hz 與處理幀率無關），sink 階段只把最新幀放進信箱
+        self.display_config = self.risk_config.get('display', {})
+        # 標註影片輸出：背景執行緒編碼、有界佇列；mode: events 只寫事件前後的片段，continuous 依長度 / 大小分段
+        # （enabled: false 完全不錄）
+        self.recording_config = self.risk_config.get('recording', {})
+
+        # 自車速度估計器（ROI 帶狀區域 + 縮小 + 幀對快取，可選 farneback / lk）
+        self.ego_motion = EgoMotionEstimator.from_config(self.risk_config['optical_flow'])
+        # 本路影像自己的車道 / 風險 / 提醒狀態，不使用模組全域狀態，多個 LaneTracker 可在同一行程平行執行
+        # 車道：ROI 帶狀偵測器 + Kalman 追蹤（lane_tracking）+ 左右線平滑歷史 + 色塊合成圖層快取
+        self.lane_engine = LaneEngine.from_config(self.risk_config)
+        # 風險：追蹤物件的跨幀狀態（中心點 / 分數歷史、滯留、靜止、提醒），過期 ID 自動淘汰
+        self.risk_engine = RiskEngine(self.risk_config)
+        self.warning_engine = WarningEngine(self.risk_config, self.risk_engine.store)
+        self.track_store = self.risk_engine.store
+        self.zone_classifier = ZoneClassifier()  # 整幀追蹤框一次判斷 ROI 區域（區域幾何依 ROI 快取）
+        self.pipeline_config = self.risk_config['pipeline']
+        self.governor_config = self.risk_config['governor']
+
+        if model is None:
+            model = load_detector(self.risk_config.get('detector', {}), self.current_dir)
+        # 偵測 + 追蹤（不論哪個 backend，追蹤器都是 object_tracking 的 BoT-SORT / ByteTrack）
+        self.detector = as_detector(model)
+        # 偵測降頻：每 detect_every 幀跑一次偵測器，中間的幀以光流 / 等速度推算追蹤框
+        propagation = self.risk_config.get('detector', {}).get('propagation', {})
+        if propagation.get('enabled', False):
+            self.detector = SparseDetector.from_config(propagation, self.detector)
+        # 裁切推論：detect 階段與 lane 階段並行，第 N 幀使用第 N-1 幀 lane 階段算出的風險區塊範圍（None 為整張）
+        # 範圍經由 packet 上的 Handoff 傳遞；detect_region 只由 lane 階段寫入，擷取時讀一次當作即時模式的備用值
+        self.roi_crop_config = self.risk_config.get('detector', {}).get('roi_crop', {})
+        self.detect_region = None
+        self._crop_handoff = None
+        # 偵測框 / 風險框繪製（full：除錯展示；minimal：車內小螢幕）
+        self.renderer = AnnotationRenderer.from_config(self.risk_config.get('render', {}),
+                                                       class_names=self.detector.names)
+
+        self.video_path = video_path or os.path.join(self.current_dir, "assets", "videoplayback.mp4")
 
         # 此變數與記憶體無直接關係，保留
         self.red_alert_active = False
 
+        self.target_size = None
+        self.source_fps = 30
+        self.pipeline = None
+        # 預配置影像緩衝池（依解析度分組），熱路徑穩定後不再配置整張影像
+        self.buffer_pool = None
+        # 延遲預算調節器：frame_skip / imgsz / lane_every / draw_overlays 皆由它在執行期調整
+        self.governor = None
+
+        # 車道偵測降頻時沿用上一次的結果（只在 lane 階段的單一執行緒中讀寫）
+        self.lane_counter = 0
+        self.last_lane = None
+
+    @property
+    def window_name(self):
+        return f"Tracked Video - {self.stream_name}" if self.stream_name else "Tracked Video"
+
+    def _on_key(self, key):
+        # 顯示執行緒呼叫：按 q 結束管線
+        if key == ord('q') and self.pipeline is not None:
+            self.pipeline.stop()
+
+    def reset(self):
+        """清除所有跨幀狀態（物件歷史、車道平滑、風險滯留計數、自車速度），讓新的一段影片從頭開始"""
+        self.risk_engine.reset()
+        self.red_alert_active = False
+        self.lane_counter = 0
+        self.last_lane = None
+        self.detect_region = None
+        self._crop_handoff = None
+        self.ego_motion.reset()
+        self.lane_engine.reset()
+        self.warning_engine.reset()
+        self.detector.reset(frame_rate=self.source_fps)
+
+    def _play_audio(self, text, alert_type, cooldown_seconds):
+        if self._speak is not None:
+            self._speak(text, alert_type, cooldown_seconds=cooldown_seconds)
+
     def estimate_self_speed(self, prev_gray, curr_gray):
-        h, w = curr_gray.shape
-        top = int(h * self.flow_roi_top)
-        bottom = int(h * self.flow_roi_bottom)
-        # 注意：此處創建的 flow 和 mag 陣列，如果非常大，也可能佔用記憶體
-        # 但通常光流計算的 ROI 較小，影響有限
-        flow = cv2.calcOpticalFlowFarneback(prev_gray[top:bottom], curr_gray[top:bottom],
-                                            None, 0.5, 3, 15, 3, 5, 1.2, 0)
-        mag = np.linalg.norm(flow, axis=2)
-        
-        # 顯式刪除不再需要的局部變數
-        del flow
-        return np.mean(mag)
-
-    def start(self):
+        """兩張灰度圖之間的平均光流位移（ROI 帶狀區域，依設定的 backend 計算）"""
+        return self.ego_motion.flow_between(prev_gray, curr_gray)
+
+    # ------------------------------------------------------------------
+    # 管線各階段：capture → (lane+flow ∥ detect) → risk → render → sink
+    # ------------------------------------------------------------------
+    def _capture_frames(self, cap, start_frame=0, end_frame=None):
+        """
+        讀取影片並縮放到處理尺寸，每 frame_skip 幀送出一幀
+        frame_idx 為影片中的絕對幀號（從 1 開始），分段處理時跳幀的相位與整段處理一致
+        """
+        frame_idx = start_frame
+        frame_shape = (self.target_size[1], self.target_size[0], 3)
+        decoded = None
+        while cap.isOpened() and not self.pipeline.stop_event.is_set():
+            if end_frame is not None and frame_idx >= end_frame:
+                break
+            knobs = self.governor.knobs
+            frame_skip = knobs['frame_skip']
+            frame_idx += 1
+
+            if frame_idx % frame_skip != 0:
+                # 跳過的幀只 grab() 不 retrieve()，省下解碼與色彩轉換
+                ok = cap.grab() if self.governor.use_grab else cap.read()[0]
+                if not ok:
+                    break
+                continue
+
+            # 解碼直接寫回同一塊記憶體（只在 capture 執行緒內使用，縮放後即可覆寫）
+            with self.stage_timer.stage("decode"):
+                ret, decoded = cap.read(decoded)
+            if not ret:
+                break
+
+            # 將讀取的原始幀縮小到目標尺寸，寫入輪替緩衝區（幀會在管線中流動一段時間）
+            with self.stage_timer.stage("resize"):
+                processed_frame = cv2.resize(decoded, self.target_size,
+                                             dst=self.buffer_pool.get("frame", frame_shape),
+                                             interpolation=cv2.INTER_AREA)
+            packet = FramePacket(frame_idx, processed_frame)
+            packet.knobs = knobs
+            # 實際處理的幀率（每 frame_skip 幀處理一幀），用於物件速度換算
+            packet.effective_fps = max(self.source_fps / frame_skip, 1.0)
+            self._chain_crop(packet)
+            yield packet
+
+    def _detect_lanes(self, packet):
+        """
+        依 lane_every 決定本幀要重新偵測車道，或沿用上一次的車道線
+        這裡不畫色塊：車道 / 切入區色塊在 render 階段與風險區塊一起一次合成
+        回傳 (場景是否有效, 左線, 右線, 車道 LaneRoi)；LaneRoi 由快取取得，車道沒變時與上一幀是同一個物件
+        """
+        run_detection = self.last_lane is None or self.lane_counter % packet.knobs['lane_every'] == 0
+        self.lane_counter += 1
+
+        if run_detection:
+            _, _, scene_valid, left_line, right_line = self.lane_engine.process(packet.frame, draw=False)
+            lane_roi = self.lane_engine.roi(left_line, right_line, packet.frame.shape)
+            self.last_lane = (scene_valid, left_line, right_line, lane_roi)
+        return self.last_lane
+
+    def _chain_crop(self, packet):
+        """擷取時把上一幀的裁切範圍 Handoff 掛到本幀（crop_source），並建立本幀要交給下一幀的 Handoff（crop_result）"""
+        packet.detect_region = self.detect_region
+        packet.crop_source = packet.crop_result = None
+        if self.roi_crop_config.get('enabled', False):
+            packet.crop_source = self._crop_handoff
+            packet.crop_result = self._crop_handoff = Handoff()
+
+    def packet_region(self, packet):
+        """
+        本幀偵測使用的裁切範圍：上一幀 lane 階段的結果
+        無顯示模式一定等上一幀算完（逐幀紀錄可重現）；即時模式不等，來不及時沿用擷取當下最近一次的範圍
+        """
+        # 不經過 _capture_frames 建立的 packet（效能測試逐幀呼叫各階段）沒有 Handoff，一律整張推論
+        source = getattr(packet, "crop_source", None)
+        if source is not None and (source.ready() or (self.headless and source.wait(self.pipeline.stop_event))):
+            packet.detect_region = source.value
+        return getattr(packet, "detect_region", None)
+
+    def _lane_stage(self, packet):
+        """車道偵測 + 場景過濾 + 光流自車速度 + 動態 ROI；不論結果如何都把裁切範圍交給下一幀"""
+        try:
+            return self._analyze_lane(packet)
+        finally:
+            result = getattr(packet, "crop_result", None)
+            if result is not None:
+                result.set(self.detect_region)
+
+    def _analyze_lane(self, packet):
+        try:
+            with self.stage_timer.stage("lane"):
+                scene_valid, left_line, right_line, lane_roi = self._detect_lanes(packet)
+            packet.scene_valid = scene_valid
+            if not scene_valid:
+                # 無顯示模式仍保留這一幀，讓逐幀紀錄完整（風險階段會輸出空的物件清單）
+                self.detect_region = None
+                return packet if self.headless else None
+
+            # 自車速度（只在 lane 階段的單一執行緒中更新估計器狀態）
+            with self.stage_timer.stage("flow"):
+                speed = self.ego_motion.update(packet.frame)
+            # 依車速縮放的 ROI（量化後由快取取得，車道與車速穩定時直接沿用上一幀的幾何與衍生結果）
+            roi = self.lane_engine.roi(left_line, right_line, packet.frame.shape, speed=speed)
+        except Exception as e:
+            telemetry.error("lane", "[❌ Speed block error] {error}", error=str(e), stream=self.stream_name)
+            return None
+
+        if self.roi_crop_config.get('enabled', False):
+            # 下一次偵測只看風險區塊範圍（依 ROI 快取，幾何不變時不重算）
+            self.detect_region = roi.artifact("crop", lambda: self._crop_region(roi.roi_dict, packet.frame.shape))
+
+        packet.lanes = (left_line, right_line, lane_roi)
+        packet.speed = speed
+        packet.roi = roi
+        packet.roi_dict = roi.roi_dict
+        packet.scale = roi.scale
+        return packet
+
+    def _detect_stage(self, packet):
+        """物件偵測 + 追蹤，與 lane 階段同時處理同一幀（兩者皆不修改 packet.frame）"""
+        # (N, 7) [x1, y1, x2, y2, id, conf, cls]
+        packet.boxes = self.detector.track_frame(packet.frame, packet.knobs['imgsz'], self.packet_region(packet))
+        return packet
+
+    def _crop_region(self, roi_dict, frame_shape):
+        config = self.roi_crop_config
+        return roi_crop_region(roi_dict, frame_shape, margin=config.get('margin', 0.05),
+                               top_margin=config.get('top_margin', 0.15),
+                               max_area_ratio=config.get('max_area_ratio', 0.8))
+
+    def _risk_stage(self, packet):
+        """逐一分析追蹤物件的風險等級，並觸發語音提醒"""
+        if not packet.scene_valid:
+            packet.risky_objects = []
+            packet.record = self._make_record(packet)
+            return packet
+
+        risky_objects = []
+        seen_ids = set()
+        engine = self.risk_engine
+        engine.tick(packet.idx)
+
+        is_any_red_risk_active = False
+
+        # 整幀的框一次判斷所在 ROI 區域（沒有追蹤 ID 的結果只有 6 欄，下面會整批略過）
+        boxes = packet.boxes
+        if boxes.ndim == 2 and boxes.shape[1] >= 7:
+            geometry = packet.roi.artifact("zones", lambda: self.zone_classifier.prepare(packet.roi_dict))
+            roi_levels = self.zone_classifier.classify(boxes[:, :4].astype(int), packet.roi_dict, geometry=geometry)
+        else:
+            roi_levels = [None] * len(boxes)
+
+        # 遍歷結果：更新各物件的移動 / 滯留狀態，收集本幀分數
+        scored = []
+        for r, roi_level in zip(boxes, roi_levels):
+            if len(r) < 7:
+                continue
+
+            track_id = int(r[6])
+            if track_id in seen_ids:
+                continue
+            seen_ids.add(track_id)
+
+            # 多路影像各自追蹤，ID 會重複，風險狀態以 (串流名稱, ID) 區隔
+            state_key = (self.stream_name, track_id) if self.stream_name else track_id
+
+            x1, y1, x2, y2 = map(int, r[:4])
+            center = get_center((x1, y1, x2, y2))
+            speed, is_jump, smoothed_center, vx = engine.compute_speed(state_key, center, fps=packet.effective_fps)
+
+            if roi_level is None:
+                continue
+
+            score, level, stay, slot = engine.analyze(state_key, smoothed_center, roi_level, speed, is_jump, vx)
+            scored.append((slot, score, (x1, y1, x2, y2, track_id)))
+
+        # 整幀一次寫入分數歷史並取平滑分數，再依門檻分級
+        if scored:
+            slots, scores, objects = zip(*scored)
+            smoothed_scores, levels = engine.smooth(slots, scores)
+        else:
+            objects, smoothed_scores, levels = (), (), ()
+
+        for (x1, y1, x2, y2, track_id), smoothed_score, level in zip(objects, smoothed_scores, levels):
+            level = str(level)
+            smoothed_score = float(smoothed_score)
+            risky_objects.append((x1, y1, x2, y2, track_id, smoothed_score, level))
+
+            if level == "mid":
+                telemetry.info("risk.alert", "⚠️ 提醒觸發！ID={track_id}, Level={level}, Score={score:.2f}",
+                               track_id=track_id, level=level, score=smoothed_score, frame=packet.idx,
+                               stream=self.stream_name)
+                self._play_audio("距離有點近了，建議您放慢速度", "risk_side_alert", cooldown_seconds=5)
+
+            if level == "high":
+                is_any_red_risk_active = True
+
+        # 在所有物件處理完畢後，根據 is_any_red_risk_active 來控制紅色警報的語音
+        if is_any_red_risk_active:
+            self._play_audio("已進入危險範圍，請立即減速", "risk_high_alert", cooldown_seconds=1.5)
+            self.red_alert_active = True
+        else:
+            self.red_alert_active = False
+
+        packet.risky_objects = risky_objects
+        packet.record = self._make_record(packet)
+        return packet
+
+    def _make_record(self, packet):
+        """單幀風險紀錄（批次模式輸出成 JSONL / Parquet）"""
+        objects = [{"track_id": track_id, "bbox": [x1, y1, x2, y2], "score": round(float(score), 3), "level": level}
+                   for (x1, y1, x2, y2, track_id, score, level) in packet.risky_objects]
+        return {
+            "frame": packet.idx,
+            "time_s": round(packet.idx / self.source_fps, 3) if self.source_fps else None,
+            "scene_valid": bool(packet.scene_valid),
+            "ego_speed": round(float(packet.speed), 3) if packet.scene_valid else None,
+            "roi_scale": round(float(packet.scale), 3) if packet.scene_valid else None,
+            "red_alert": self.red_alert_active,
+            "objects": objects,
+        }
+
+    def _lane_overlay(self, packet):
+        """車道紅橙綠、車道切入區與風險切入區色塊，只在色塊外接矩形內一次合成（結果寫入輪替緩衝區）"""
+        layer, too_close = None, False
+        if packet.knobs['draw_overlays']:
+            _, _, lane_roi = packet.lanes
+            # 合成圖層只由兩組 ROI 決定，存在本幀 ROI 的衍生結果中，幾何穩定時不需重建也不需比對頂點
+            layer, too_close = packet.roi.artifact(
+                ("overlay", lane_roi.key), lambda: self._build_overlay(packet.frame.shape, lane_roi, packet.roi_dict))
+        lane_frame = OverlayCompositor.apply(packet.frame, layer, dst=self.buffer_pool.get("lane", packet.frame.shape))
+        if too_close:
+            draw_too_close(lane_frame)
+        return lane_frame
+
+    def _build_overlay(self, frame_shape, lane_roi, roi_dict):
+        """車道紅橙綠 + 車道切入區 + 風險切入區的合成圖層，回傳 (圖層, 是否太近)"""
+        steps, too_close = lane_overlay_steps(frame_shape, lane_roi.left_line, lane_roi.right_line,
+                                              side_roi=lane_roi.roi_dict)
+        steps += risk_zone_steps(roi_dict)
+        return self.lane_engine.compositor.layer(frame_shape, steps), too_close
+
+    def _render_stage(self, packet):
+        """把車道色塊、偵測框與風險資訊畫到影像上"""
+        # 偵測框直接從 boxes.data 畫在合成好色塊的車道圖上（不經過 results[0].plot() 的整張複製）
+        annotated_frame = self.renderer.render(self._lane_overlay(packet), packet.boxes, packet.risky_objects)
+
+        if self.shared_alert[0]:
+            cv2.putText(annotated_frame, "DROWSINESS ALERT!", (15, 140), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
+            self._play_audio("偵測到你疲勞了，請保持清醒或稍作休息", "drowsiness_alert", cooldown_seconds=5)
+
+        if self.renderer.minimal:
+            # 車內小螢幕只顯示色塊、風險框與疲勞警示
+            packet.annotated_frame = annotated_frame
+            return packet
+
+        cv2.putText(annotated_frame, f"ROI Scale: {packet.scale:.3f}", (15, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+        cv2.putText(annotated_frame, f"Speed: {packet.speed:.2f}", (15, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+
+        # 管線的持續 FPS 由最慢階段決定，這裡顯示 sink 實際輸出速度與瓶頸階段
+        bottleneck = self.pipeline.bottleneck()
+        fps = self.pipeline.stage_stats("sink").fps
+        cv2.putText(annotated_frame, f"FPS: {fps:.2f}", (15, 105), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+        if bottleneck is not None:
+            cv2.putText(annotated_frame, f"Bottleneck: {bottleneck['stage']} {bottleneck['avg_ms']:.0f}ms",
+                        (15, 175), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 2)
+        if self.timing_config.get('overlay'):
+            self.stage_timer.draw(annotated_frame, origin=(15, 210))
+
+        packet.annotated_frame = annotated_frame
+        return packet
+
+    def _make_sink_stage(self, out, on_record=None):
+        def sink_stage(packet):
+            if on_record is not None:
+                on_record(packet.record)
+            self._export_timing(periodic=True)
+            if self.headless:
+                return None
+
+            # 回報端到端延遲與瓶頸階段耗時，讓調節器決定是否降載 / 回升
+            latency_ms = 1000.0 * (time.perf_counter() - packet.t_capture)
+            bottleneck = self.pipeline.bottleneck()
+            self.governor.observe(latency_ms, bottleneck['avg_ms'] if bottleneck else 0.0)
+
+            if out is not None:
+                with self.stage_timer.stage("write"):
+                    out.write(packet.annotated_frame, packet.record, self.frame_events(packet),
+                              source_frame=packet.idx)
+            with self.stage_timer.stage("display"):
+                display.show(self.window_name, packet.annotated_frame)
+            return None
+        return sink_stage
+
+    def frame_events(self, packet):
+        """本幀觸發片段錄影的事件：紅色警報、側邊提醒（mid）、疲勞警示"""
+        events = []
+        if packet.record.get("red_alert"):
+            events.append("red_risk")
+        if any(obj[6] == "mid" for obj in packet.risky_objects):
+            events.append("side_alert")
+        if self.shared_alert[0]:
+            events.append("drowsiness")
+        return events
+
+    def _export_timing(self, periodic=False):
+        """把各階段耗時統計寫到 CSV / Prometheus 文字檔（periodic=True 時每 export_interval 秒最多一次）"""
+        if periodic:
+            interval = self.timing_config.get('export_interval', 0)
+            now = time.monotonic()
+            if not interval or now - self._timing_exported_at < interval:
+                return
+            self._timing_exported_at = now
+        labels = {"stream": self.stream_name} if self.stream_name else None
+        try:
+            self.stage_timer.export(csv_path=self.timing_config.get('csv_path'),
+                                    prom_path=self.timing_config.get('prom_path'), labels=labels)
+        except OSError as e:
+            telemetry.error("timing", "[❌ Timing export error] {error}", error=str(e), stream=self.stream_name)
+
+    def start(self, start_frame=0, end_frame=None, on_record=None):
+        """
+        執行追蹤管線
+        - start_frame / end_frame：只處理影片中 (start_frame, end_frame] 這段幀（分段批次處理用）
+        - on_record：每一幀風險紀錄的回呼函式（dict）
+        """
         cap = cv2.VideoCapture(self.video_path)
         fps = cap.get(cv2.CAP_PROP_FPS)
-        
+        if start_frame:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
         # 獲取原始幀的寬高
         original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        
+
         # 定義處理幀的目標尺寸，顯著降低記憶體消耗
         # YOLOv8 模型 imgsz=320，所以輸入給模型的圖像會被縮放到 320x320。
         # 但如果原始幀很大，縮放過程也可能耗費記憶體。
@@ -77,181 +496,68 @@ class LaneTracker:
         # 保持長寬比，例如將寬度固定為 640 或 480，並計算相應的高度。
         target_width = 640 # 可以嘗試 480, 320 等更小的值
         target_height = int(original_height * (target_width / original_width))
-        
-        print(f"Original Frame Size: {original_width}x{original_height}")
-        print(f"Processing Frame Size: {target_width}x{target_height}")
-
-        frame_skip = 5
-        frame_idx = 0
-        prev_smoothed_speed = 0
-        gray_history = deque(maxlen=3) # 歷史灰度幀，保持少量
-        speed_fail_count = 0
-        MAX_FAIL_COUNT = 3
-
-        # 調整 VideoWriter 的輸出尺寸為處理後的尺寸
-        out = cv2.VideoWriter("demo.mp4",
-                              cv2.VideoWriter_fourcc(*"mp4v"),
-                              int(fps // frame_skip),
-                              (target_width, target_height)) # 輸出尺寸與處理尺寸一致
+        self.target_size = (target_width, target_height)
+
+        telemetry.info("pipeline", "Original Frame Size: {width}x{height} → Processing Frame Size: {target}",
+                       width=original_width, height=original_height, target=f"{target_width}x{target_height}",
+                       stream=self.stream_name)
+
+        self.source_fps = fps
+        self.governor = LatencyGovernor.from_config(self.governor_config, source_fps=fps)
+        if self.headless:
+            # 批次處理要求結果可重現，固定使用最高畫質等級
+            self.governor.enabled = False
+        frame_skip = self.governor.knobs['frame_skip']
+        self.reset()
+
+        # 輸出尺寸預設與處理尺寸一致（recording.resolution 可另外指定），編碼在背景執行緒進行
+        # 輸出幀率固定為起始等級的處理幀率（至少 1）；調節器之後改變 frame_skip 時依來源幀號重複 / 略過幀，播放速度不變
+        out = None
+        if self.output_path and not self.headless and self.recording_config.get('enabled', True):
+            out = open_recorder(self.recording_config, self.output_path, fps=max(fps / frame_skip, 1.0),
+                                source_fps=fps)
+
+        # 各階段以有界佇列串接，佇列滿時丟掉最舊的幀，確保顯示的永遠是最新畫面
+        # 無顯示模式改為佇列滿時阻塞，每一幀都會被處理
+        self.pipeline = FramePipeline(queue_size=self.pipeline_config['queue_size'],
+                                      drop_oldest=not self.headless,
+                                      report_interval=self.pipeline_config['report_interval'])
+        self.pipeline.set_source(lambda: self._capture_frames(cap, start_frame, end_frame))
+        self.pipeline.add_stage("lane", self._lane_stage)
+        self.pipeline.add_stage("detect", self.stage_timer.wrap("detect", self._detect_stage))
+        self.pipeline.add_stage("risk", self.stage_timer.wrap("risk", self._risk_stage), after=("lane", "detect"))
+        if self.headless:
+            self.pipeline.add_stage("sink", self._make_sink_stage(out, on_record), after="risk")
+        else:
+            self.pipeline.add_stage("render", self.stage_timer.wrap("render", self._render_stage), after="risk")
+            self.pipeline.add_stage("sink", self._make_sink_stage(out, on_record), after="render")
+
+        # 輪替深度 ≥ 管線中同時存活的幀數，確保緩衝區被覆寫前該幀已離開管線
+        self.buffer_pool = FrameBufferPool(depth=self.pipeline.capacity())
+        key_handler = None
+        if not self.headless:
+            display.configure(**self.display_config)
+            key_handler = display.on_key(self._on_key)
 
         try:
-            while cap.isOpened():
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame_start_time = time.time()
-                frame_idx += 1
-                if frame_idx % frame_skip != 0:
-                    # 在跳過幀時，顯式釋放當前幀的記憶體
-                    del frame 
-                    continue
-
-                # 將讀取的原始幀縮小到目標尺寸
-                processed_frame = cv2.resize(frame, (target_width, target_height), interpolation=cv2.INTER_AREA)
-                del frame # 釋放原始大幀的記憶體
-
-                try:
-                    # process_frame 可能會創建新的圖像，注意其記憶體使用
-                    # 如果 process_frame 內部也處理了縮放，這裡可以調整
-                    result = process_frame(processed_frame) # 使用縮小後的幀
-                    # process_frame 返回的 result 中可能包含新的圖像數據
-                    processed_frame, _, scene_valid, left_line, right_line = result 
-                    # 假設 result[0] 是處理後的幀，如果它複製了數據，考慮減少複製
-                    # 在這裡，processed_frame 變成了結果幀，所以原始 processed_frame 的引用會被替換，舊數據會被GC
-                    
-                    if not scene_valid:
-                        # 在跳過時確保釋放處理過的幀
-                        del processed_frame
-                        continue
-
-                    curr_gray = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2GRAY)
-                    gray_history.append(curr_gray) # curr_gray 也是縮小後的尺寸
-
-                    if len(gray_history) >= 2:
-                        speeds = []
-                        for i in range(len(gray_history) - 1):
-                            try:
-                                s = self.estimate_self_speed(gray_history[i], gray_history[i + 1])
-                                speeds.append(s)
-                            except:
-                                pass
-                        raw_speed = np.mean(speeds) if speeds else prev_smoothed_speed
-                        speed_fail_count = 0 if speeds else speed_fail_count + 1
-                    else:
-                        raw_speed = prev_smoothed_speed
-                        speed_fail_count += 1
-
-                    alpha = 0.3
-                    speed = alpha * raw_speed + (1 - alpha) * prev_smoothed_speed
-
-                    if speed < 0.05:
-                        speed = prev_smoothed_speed
-                    if speed_fail_count >= MAX_FAIL_COUNT:
-                        speed *= 0.5
-
-                    prev_smoothed_speed = speed
-                    # roi_dict 和 scale 都是計算結果，通常記憶體佔用不大
-                    roi_dict, scale = get_lane_roi_dynamic(left_line, right_line, processed_frame.shape, speed=speed)
-
-                except Exception as e:
-                    print(f"[❌ Speed block error] {e}")
-                    # 在錯誤發生時也嘗試釋放可能的記憶體
-                    if 'processed_frame' in locals() and processed_frame is not None:
-                        del processed_frame
-                    continue
-
-                # YOLO 模型推斷，輸入尺寸 imgsz=320 是比較小的，有助於控制記憶體
-                # 但是 results[0].boxes.data.cpu().numpy() 會將結果複製到 CPU 記憶體
-                results = self.model.track(source=processed_frame, imgsz=320, persist=True, show=False, stream=False)
-                
-                # 顯式刪除 processed_frame，因為 YOLO 推斷通常會內部複製
-                # 或者在處理完 results 後再刪除，取決於 draw_risk_overlay 是否需要 processed_frame
-                # 這裡，draw_risk_overlay 接收 annotated_frame，所以 processed_frame 可以在此處刪除
-                del processed_frame 
-
-
-                risky_objects = []
-                seen_ids = set()
-                
-                is_any_red_risk_active = False 
-
-                # 遍歷結果並處理風險物件
-                for r in results[0].boxes.data.cpu().numpy():
-                    if len(r) < 7:
-                        continue
-
-                    track_id = int(r[6])
-                    if track_id in seen_ids:
-                        continue
-                    seen_ids.add(track_id)
-
-                    x1, y1, x2, y2 = map(int, r[:4])
-                    center = get_center((x1, y1, x2, y2))
-                    self.object_history[track_id].append(center)
-                    speed, is_jump, smoothed_center, vx = compute_speed(track_id, center, self.object_history, fps=fps)
-
-                    roi_level = get_roi_level_bbox((x1, y1, x2, y2), roi_dict)
-                    if roi_level is None:
-                        continue
-
-                    score, level, stay = analyze_risk(track_id, smoothed_center, roi_level, speed, is_jump, vx)
-                    self.risk_score_history[track_id].append(score)
-                    smoothed_score = np.mean(self.risk_score_history[track_id])
-
-                    if smoothed_score > self.risk_config['score_threshold']['high']:
-                        level = "high"
-                    elif smoothed_score > self.risk_config['score_threshold']['mid']:
-                        level = "mid"
-                    else:
-                        level = "low"
-
-                    risky_objects.append((x1, y1, x2, y2, track_id, smoothed_score, level))
-
-                    if level == "mid": 
-                        print(f"⚠️ 提醒觸發！ID={track_id}, Level={level}, Score={smoothed_score:.2f}")
-                        generate_and_play_audio("距離有點近了，建議您放慢速度", "risk_side_alert", cooldown_seconds=5)
-                        
-                    if level == "high":
-                        is_any_red_risk_active = True 
-
-                # 在所有物件處理完畢後，根據 is_any_red_risk_active 來控制紅色警報的語音
-                if is_any_red_risk_active:
-                    generate_and_play_audio("已進入危險範圍，請立即減速", "risk_high_alert", cooldown_seconds=1.5) 
-                    self.red_alert_active = True 
-                else:
-                    self.red_alert_active = False 
-
-                annotated_frame = results[0].plot() # YOLO 的 plot() 會返回一個新的圖像
-                del results # 處理完 results 後顯式刪除，釋放記憶體
-
-                draw_risk_overlay(annotated_frame, risky_objects, roi_dict) 
-
-                cv2.putText(annotated_frame, f"ROI Scale: {scale:.3f}", (15, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
-                cv2.putText(annotated_frame, f"Speed: {speed:.2f}", (15, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
-
-                if self.shared_alert[0]:
-                    cv2.putText(annotated_frame, "DROWSINESS ALERT!", (15, 140), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
-                    generate_and_play_audio("偵測到你疲勞了，請保持清醒或稍作休息", "drowsiness_alert", cooldown_seconds=5)
-
-                frame_time = time.time() - frame_start_time
-                fps = 1.0 / frame_time
-                cv2.putText(annotated_frame, f"FPS: {fps:.2f}", (15, 105), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
-
-                out.write(annotated_frame)
-                cv2.imshow("Tracked Video", annotated_frame)
-                if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
-                
-                # 每次循環結束時，嘗試強制垃圾回收
-                del annotated_frame # 釋放顯示和寫入後的幀
-                gc.collect() # 嘗試強制垃圾回收
+            self.pipeline.run()
 
         except KeyboardInterrupt:
-            print("\n[🛑 使用者中斷 Ctrl+C]")
+            telemetry.warning("pipeline", "[🛑 使用者中斷 Ctrl+C]", stream=self.stream_name)
 
         finally:
+            self.pipeline.stop()
+            telemetry.info("pipeline", "[📊 Pipeline] {summary}", summary=self.pipeline.format_stats(),
+                           stages=self.pipeline.stats(), stream=self.stream_name)
+            telemetry.info("governor", "[⚙️ Governor] final level {level}: {knobs}",
+                           level=self.governor.level, knobs=self.governor.knobs, stream=self.stream_name)
+            telemetry.info("timing", "[⏱️ Stages] {summary}", summary=self.stage_timer.format(),
+                           stages=self.stage_timer.summary(), stream=self.stream_name)
+            self._export_timing()
             cap.release()
-            out.release()
-            cv2.destroyAllWindows()
-            gc.collect() # 程式結束前再次進行垃圾回收
\ No newline at end of file
+            if out is not None:
+                out.close()
+            if key_handler is not None:
+                display.remove_key_handler(key_handler)
+                display.close_window(self.window_name)
+            gc.collect() # 程式結束前再次進行垃圾回收
@@ -0,0 +1,90 @@
+import threading
+
+from telemetry import telemetry
+
+
+class LatencyGovernor:
+    """
+    延遲預算調節器：依實測的每幀成本，在執行期間調整畫質 / 處理量旋鈕
+
+    - levels：由高畫質到低負載排列的旋鈕組合（frame_skip / imgsz / lane_every / draw_overlays）
+    - target_fps：目標處理幀率；None 代表以「跟上影片即時速度」為目標（來源 fps / frame_skip）
+    - target_latency_ms：目標端到端延遲（擷取 → 輸出）；None 代表不限制
+    - 超出預算 (1 + hysteresis) 就往下一級降載，低於預算 (1 - 2 * hysteresis) 才回升一級，避免來回震盪
+    """
+
+    def __init__(self, levels, target_fps=None, target_latency_ms=None, adjust_interval=15,
+                 hysteresis=0.15, use_grab=True, enabled=True, ema_alpha=0.2, source_fps=30):
+        self.levels = [dict(level) for level in levels]
+        self.target_fps = target_fps
+        self.target_latency_ms = target_latency_ms
+        self.adjust_interval = adjust_interval
+        self.hysteresis = hysteresis
+        self.use_grab = use_grab
+        self.enabled = enabled
+        self.ema_alpha = ema_alpha
+        self.source_fps = source_fps
+
+        self.level = 0
+        self.knobs = self.levels[0]
+        self.latency_ms = None
+        self.cost_ms = None
+        self._observed = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, source_fps=30):
+        return cls(levels=config['levels'],
+                   target_fps=config.get('target_fps'),
+                   target_latency_ms=config.get('target_latency_ms'),
+                   adjust_interval=config.get('adjust_interval', 15),
+                   hysteresis=config.get('hysteresis', 0.15),
+                   use_grab=config.get('use_grab', True),
+                   enabled=config.get('enabled', True),
+                   source_fps=source_fps)
+
+    def budget_ms(self):
+        """每幀可用的處理時間（由目標 FPS 或影片即時速度決定）"""
+        if self.target_fps:
+            return 1000.0 / self.target_fps
+        return 1000.0 * self.knobs['frame_skip'] / max(self.source_fps, 1e-6)
+
+    def pressure(self):
+        """目前負載相對預算的比例，> 1 代表跟不上"""
+        ratios = []
+        if self.cost_ms is not None:
+            ratios.append(self.cost_ms / self.budget_ms())
+        if self.target_latency_ms and self.latency_ms is not None:
+            ratios.append(self.latency_ms / self.target_latency_ms)
+        return max(ratios) if ratios else 0.0
+
+    def observe(self, latency_ms, cost_ms):
+        """
+        回報一幀的實測結果
+        - latency_ms：該幀從擷取到輸出的端到端延遲
+        - cost_ms：目前最慢階段的平均單幀耗時（決定持續吞吐）
+        """
+        with self._lock:
+            a = self.ema_alpha
+            self.latency_ms = latency_ms if self.latency_ms is None else a * latency_ms + (1 - a) * self.latency_ms
+            self.cost_ms = cost_ms if self.cost_ms is None else a * cost_ms + (1 - a) * self.cost_ms
+
+            self._observed += 1
+            if not self.enabled or self._observed < self.adjust_interval:
+                return
+            self._observed = 0
+
+            pressure = self.pressure()
+            if pressure > 1 + self.hysteresis and self.level < len(self.levels) - 1:
+                self._set_level(self.level + 1, pressure)
+            elif pressure < 1 - 2 * self.hysteresis and self.level > 0:
+                self._set_level(self.level - 1, pressure)
+
+    def _set_level(self, level, pressure):
+        telemetry.info("governor", "[⚙️ Governor] level {previous} → {level} (pressure={pressure:.2f}, "
+                       "cost={cost_ms:.1f}ms, latency={latency_ms:.1f}ms) {knobs}",
+                       previous=self.level, level=level, pressure=float(pressure), cost_ms=float(self.cost_ms),
+                       latency_ms=float(self.latency_ms), knobs=self.levels[level])
+        self.level = level
+        # 整個 dict 一次替換，其他階段讀到的永遠是完整的一組旋鈕
+        self.knobs = self.levels[level]
@@ -0,0 +1,222 @@
+"""
+多路攝影機追蹤：前方 + 左右盲點等 N 路影像共用一個偵測模型
+
+每一輪從每一路各取一幀，偵測以一次批次推論完成（比 N 次單張推論省 CPU），
+追蹤器、車道平滑、自車速度與風險滯留狀態則每一路各自獨立。
+
+用法：
+    python multi_stream_tracker.py front=assets/videoplayback.mp4 left=1 right=2
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(current_dir)
+# 為了支援 speech_alert_system 導入（直接執行本檔時）
+sys.path.append(os.path.dirname(current_dir))
+
+from frame_buffer_pool import FrameBufferPool
+from frame_pipeline import FramePacket, FramePipeline
+from lane_tracker_module import LaneTracker
+from latency_governor import LatencyGovernor
+from box_propagation import BoxPropagator
+from detector_backends import as_detector, load_detector
+from clip_recorder import open_recorder
+from display_service import display
+from object_tracking import make_tracker, track_detections
+from risk_modules.risk_analyzer import get_risk_config
+from telemetry import telemetry
+
+
+class MultiStreamTracker:
+    def __init__(self, sources, shared_alert=None, model=None, output_dir=None, tracker_cfg=None):
+        """
+        - sources：{串流名稱: 影片路徑或攝影機編號}，例如 {"front": "front.mp4", "left": 1, "right": 2}
+        - shared_alert：與疲勞偵測共用的警示旗標
+        - model：共用的偵測器（backend 或 ultralytics YOLO 物件）；None 則依 risk_params.yaml 的 detector 區段載入
+        - output_dir：每一路輸出 <名稱>_....mp4 的資料夾（依 recording 設定輸出事件片段或分段影片）；None 代表不輸出
+        - tracker_cfg：追蹤器設定；None 則與偵測器設定相同
+        """
+        if model is None:
+            model = load_detector(get_risk_config().get('detector', {}), current_dir)
+        self.detector = as_detector(model)
+        self.shared_alert = shared_alert if shared_alert is not None else [False]
+        self.sources = dict(sources)
+        self.output_dir = output_dir
+        self.tracker_cfg = tracker_cfg or self.detector.tracker_cfg
+
+        # 每一路一個 LaneTracker（共用模型），負責該路的車道 / 光流 / 風險 / 繪圖狀態
+        self.streams = {
+            name: LaneTracker(self.shared_alert, video_path=source, model=self.detector, stream_name=name,
+                              output_path=None)
+            for name, source in self.sources.items()
+        }
+        self.risk_config = next(iter(self.streams.values())).risk_config
+        self.trackers = {}
+        # 偵測降頻：每 detect_every 輪做一次批次推論，其餘輪各路以自己的 BoxPropagator 推算追蹤框
+        propagation = self.risk_config.get('detector', {}).get('propagation', {})
+        self.detect_every = propagation.get('detect_every', 1) if propagation.get('enabled', False) else 1
+        self.propagators = {name: BoxPropagator.from_config(propagation) for name in self.sources} \
+            if self.detect_every > 1 else {}
+        self.pipeline = None
+        self.governor = None
+        self._lane_pool = ThreadPoolExecutor(max_workers=len(self.streams), thread_name_prefix="lane")
+
+    # ------------------------------------------------------------------
+    # 管線各階段：每個 packet 代表同一輪的 N 路影像（packet.streams = {名稱: 單路 FramePacket}）
+    # ------------------------------------------------------------------
+    def _capture_rounds(self, caps):
+        generators = {name: self.streams[name]._capture_frames(cap) for name, cap in caps.items()}
+        round_idx = 0
+        while not self.pipeline.stop_event.is_set():
+            packets = {}
+            for name, generator in generators.items():
+                packet = next(generator, None)
+                if packet is None:
+                    # 任一路結束（影片播完 / 攝影機斷線）就停止
+                    return
+                packets[name] = packet
+            round_idx += 1
+            multi = FramePacket(round_idx, None)
+            multi.streams = packets
+            multi.knobs = self.governor.knobs
+            yield multi
+
+    def _lane_stage(self, multi):
+        """各路車道偵測 + 光流平行處理（OpenCV 會釋放 GIL）"""
+        futures = {name: self._lane_pool.submit(self.streams[name]._lane_stage, packet)
+                   for name, packet in multi.streams.items()}
+        multi.lane_ok = {name: future.result() is not None for name, future in futures.items()}
+        return multi
+
+    def _detect_stage(self, multi):
+        """N 路影像一次批次推論，再交給各路自己的追蹤器（降頻時其餘輪只推算追蹤框）"""
+        names = list(multi.streams)
+        frames = [multi.streams[name].frame for name in names]
+        if (multi.idx - 1) % self.detect_every:
+            for name, frame in zip(names, frames):
+                multi.streams[name].boxes = self.propagators[name].propagate(frame)
+            return multi
+
+        # 各路只對自己上一輪的風險區塊範圍推論（由 packet 帶入；未開啟裁切時一律為 None）
+        regions = [self.streams[name].packet_region(multi.streams[name]) for name in names]
+        detections = self.detector.detect_batch(frames, multi.knobs['imgsz'], regions)
+        for name, frame, dets in zip(names, frames, detections):
+            tracks = track_detections(dets, self.trackers[name], frame)
+            if self.propagators:
+                self.propagators[name].observe(tracks, frame)
+            multi.streams[name].boxes = tracks
+        return multi
+
+    def _risk_stage(self, multi):
+        for name, packet in multi.streams.items():
+            if multi.lane_ok[name]:
+                self.streams[name]._risk_stage(packet)
+        return multi
+
+    def _render_stage(self, multi):
+        for name, packet in multi.streams.items():
+            if multi.lane_ok[name]:
+                self.streams[name]._render_stage(packet)
+        return multi
+
+    def _make_sink_stage(self, writers):
+        def sink_stage(multi):
+            latency_ms = 1000.0 * (time.perf_counter() - multi.t_capture)
+            bottleneck = self.pipeline.bottleneck()
+            self.governor.observe(latency_ms, bottleneck['avg_ms'] if bottleneck else 0.0)
+
+            for name, packet in multi.streams.items():
+                if not multi.lane_ok[name]:
+                    continue
+                if name in writers:
+                    writers[name].write(packet.annotated_frame, packet.record,
+                                        self.streams[name].frame_events(packet), source_frame=packet.idx)
+                display.show(self.streams[name].window_name, packet.annotated_frame)
+            return None
+        return sink_stage
+
+    def start(self):
+        caps = {name: cv2.VideoCapture(source) for name, source in self.sources.items()}
+        writers = {}
+        source_fps = 30
+
+        for name, cap in caps.items():
+            tracker = self.streams[name]
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            tracker.target_size = (640, int(height * (640 / width)))
+            tracker.source_fps = fps
+            tracker.reset()
+            source_fps = min(source_fps, fps)
+            # 每一路各自一個追蹤器，ID 與軌跡互不干擾（只看到有偵測的輪，幀率依降頻比例換算）
+            self.trackers[name] = make_tracker(self.tracker_cfg, frame_rate=int(fps / self.detect_every))
+            if name in self.propagators:
+                self.propagators[name].reset()
+            telemetry.info("pipeline", "[🎥 {stream}] {width}x{height} @ {fps:.1f}fps → {target}", stream=name,
+                           width=width, height=height, fps=float(fps),
+                           target=f"{tracker.target_size[0]}x{tracker.target_size[1]}")
+
+        self.governor = LatencyGovernor.from_config(self.risk_config['governor'], source_fps=source_fps)
+        recording_config = self.risk_config.get('recording', {})
+        if self.output_dir and recording_config.get('enabled', True):
+            # 與 LaneTracker 相同：輸出幀率固定（至少 1），執行期 frame_skip 改變時依來源幀號重複 / 略過幀
+            frame_skip = self.governor.knobs['frame_skip']
+            for name, tracker in self.streams.items():
+                writers[name] = open_recorder(recording_config, os.path.join(self.output_dir, f"{name}.mp4"),
+                                              fps=max(tracker.source_fps / frame_skip, 1.0),
+                                              source_fps=tracker.source_fps)
+
+        pipeline_config = self.risk_config['pipeline']
+        self.pipeline = FramePipeline(queue_size=pipeline_config['queue_size'],
+                                      report_interval=pipeline_config['report_interval'])
+        self.pipeline.set_source(lambda: self._capture_rounds(caps))
+        self.pipeline.add_stage("lane", self._lane_stage)
+        self.pipeline.add_stage("detect", self._detect_stage)
+        self.pipeline.add_stage("risk", self._risk_stage, after=("lane", "detect"))
+        self.pipeline.add_stage("render", self._render_stage, after="risk")
+        self.pipeline.add_stage("sink", self._make_sink_stage(writers), after="render")
+
+        display.configure(**self.risk_config.get('display', {}))
+        key_handler = display.on_key(lambda key: key == ord('q') and self.pipeline.stop())
+
+        # 各路共用管線、調節器與緩衝池（緩衝池深度需涵蓋 N 路同時在管線中的幀）
+        buffer_pool = FrameBufferPool(depth=self.pipeline.capacity() * len(self.streams))
+        for tracker in self.streams.values():
+            tracker.pipeline = self.pipeline
+            tracker.governor = self.governor
+            tracker.buffer_pool = buffer_pool
+
+        try:
+            self.pipeline.run()
+        except KeyboardInterrupt:
+            telemetry.warning("pipeline", "[🛑 使用者中斷 Ctrl+C]")
+        finally:
+            self.pipeline.stop()
+            telemetry.info("pipeline", "[📊 Pipeline] {summary}", summary=self.pipeline.format_stats(),
+                           stages=self.pipeline.stats())
+            for cap in caps.values():
+                cap.release()
+            for writer in writers.values():
+                writer.close()
+            self._lane_pool.shutdown(wait=False)
+            display.remove_key_handler(key_handler)
+            for tracker in self.streams.values():
+                display.close_window(tracker.window_name)
+
+
+def _parse_sources(args):
+    sources = {}
+    for arg in args:
+        name, _, source = arg.partition("=")
+        sources[name] = int(source) if source.isdigit() else source
+    return sources
+
+
+if __name__ == "__main__":
+    MultiStreamTracker(_parse_sources(sys.argv[1:])).start()
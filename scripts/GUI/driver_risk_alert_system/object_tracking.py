@@ -0,0 +1,66 @@
+import numpy as np
+import yaml
+
+
+def make_tracker(tracker_cfg="botsort.yaml", frame_rate=30):
+    """
+    建立一個獨立的多目標追蹤器（與 YOLO.track() 內部使用的設定與類別相同）
+
+    YOLO.track(persist=True) 在同一個模型上只會維護一個追蹤器；
+    多路影像共用一個模型做批次推論時，改用這裡建立的追蹤器，每一路各自一個，互不干擾。
+    """
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    with open(check_yaml(tracker_cfg), 'r', encoding='utf-8') as file:
+        cfg = IterableSimpleNamespace(**yaml.safe_load(file))
+    if cfg.tracker_type not in TRACKER_MAP:
+        raise ValueError(f"Unsupported tracker type: {cfg.tracker_type}")
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=frame_rate)
+
+
+class _TrackerInput:
+    """
+    NumPy 偵測結果 (N, 6) [x1, y1, x2, y2, conf, cls] 包成追蹤器需要的介面（與 ultralytics Boxes 相同的屬性）
+    讓任何 backend（PyTorch / ONNX Runtime / OpenVINO）的偵測結果都走同一個追蹤器
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return _TrackerInput(self.data[index])
+
+    @property
+    def xyxy(self):
+        return self.data[:, :4]
+
+    @property
+    def xywh(self):
+        xyxy = self.data[:, :4]
+        return np.concatenate([(xyxy[:, :2] + xyxy[:, 2:]) / 2, xyxy[:, 2:] - xyxy[:, :2]], axis=1)
+
+    @property
+    def conf(self):
+        return self.data[:, 4]
+
+    @property
+    def cls(self):
+        return self.data[:, 5]
+
+
+def track_detections(detections, tracker, frame):
+    """
+    用指定的追蹤器更新一張圖的偵測結果（不依賴 torch / Results）
+    回傳 (M, 7) [x1, y1, x2, y2, id, conf, cls]；沒有追蹤到物件時回傳 (0, 7)
+    """
+    if len(detections) == 0:
+        return np.empty((0, 7), dtype=np.float32)
+    tracks = tracker.update(_TrackerInput(np.asarray(detections, dtype=np.float32)), frame)
+    if len(tracks) == 0:
+        return np.empty((0, 7), dtype=np.float32)
+    return np.asarray(tracks, dtype=np.float32)[:, :7]
@@ -1,11 +1,14 @@
 import cv2
 import numpy as np
 import sys
-from collections import deque
+from collections import OrderedDict, deque
 
-# 儲存左右線歷史資料（最多 5 幀）
-left_line_history = deque(maxlen=5)
-right_line_history = deque(maxlen=5)
+from risk_modules.overlay_compositor import OverlayCompositor
+from risk_modules.risk_log import log
+
+def reset_lane_state():
+    """清空模組共用引擎的左右線平滑歷史與追蹤窗口（切換影片 / 分段處理時使用）"""
+    default_lane_engine.reset()
 
 def smooth_line(history, new_line):
     """
@@ -37,33 +40,64 @@ def region_of_interest(img):
     masked = cv2.bitwise_and(img, mask)
     return masked
 
-def detect_lines(edges):
+def hough_segments(edges):
+    """HoughLinesP 線段，統一成 (N, 1, 4)（新版 OpenCV 可能回傳 (N, 4)）；沒有線段回傳 None"""
     raw_lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=50, minLineLength=80, maxLineGap=60)
     if raw_lines is None:
-        return []
-    filtered = []
-    for line in raw_lines:
-        x1, y1, x2, y2 = line[0]
-        if x2 == x1:
-            continue
-        slope = (y2 - y1) / (x2 - x1)
-        if 0.3 < abs(slope) < 5:
-            filtered.append(line)
-    return filtered
-
-def average_slope_intercept(lines):
-    left_lines = []
-    right_lines = []
-    for line in lines:
-        x1, y1, x2, y2 = line[0]
-        parameters = np.polyfit((x1,x2), (y1,y2), 1)
-        slope, intercept = parameters
-        if slope < 0:
-            left_lines.append((slope, intercept))
-        else:
-            right_lines.append((slope, intercept))
-    left_avg = np.average(left_lines, axis=0) if left_lines else None
-    right_avg = np.average(right_lines, axis=0) if right_lines else None
+        return None
+    return raw_lines.reshape(-1, 1, 4)
+
+def detect_lines(edges):
+    raw_lines = hough_segments(edges)
+    if raw_lines is None:
+        return np.empty((0, 1, 4), dtype=np.int32)
+    return filter_lines(raw_lines)
+
+def filter_lines(raw_lines):
+    """依斜率過濾 Hough 線段（排除垂直線與太平 / 太陡的線），整批以陣列運算，回傳 (M, 1, 4)"""
+    raw_lines = np.asarray(raw_lines).reshape(-1, 1, 4)
+    x1, y1, x2, y2 = raw_lines.reshape(-1, 4).T.astype(np.float64)
+    dx = x2 - x1
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.abs((y2 - y1) / dx)
+    keep = (dx != 0) & (slope > 0.3) & (slope < 5)
+    return raw_lines[keep]
+
+def _side_average(slopes, intercepts, weights, outlier_mad):
+    """單側線段的 (斜率, 截距) 平均；outlier_mad 不為 None 時先排除斜率偏離中位數超過 outlier_mad 倍 MAD 的線段"""
+    if len(slopes) == 0:
+        return None
+    if outlier_mad is not None and len(slopes) >= 3:
+        deviation = np.abs(slopes - np.median(slopes))
+        mad = np.median(deviation)
+        if mad > 0:
+            keep = deviation <= outlier_mad * mad
+            slopes, intercepts = slopes[keep], intercepts[keep]
+            weights = weights[keep] if weights is not None else None
+    return np.array([np.average(slopes, weights=weights), np.average(intercepts, weights=weights)])
+
+def average_slope_intercept(lines, length_weighted=False, outlier_mad=None):
+    """
+    把所有線段依斜率正負分成左右兩組，各自平均成一條 (斜率, 截距)；沒有線段的一側回傳 None
+    斜率 / 截距直接由兩端點算出（與逐段 np.polyfit 相同），整批以陣列運算
+    - length_weighted：依線段長度加權平均（長線段通常是真正的車道線）
+    - outlier_mad：排除斜率離群的線段（None 表示不排除）
+    """
+    segments = np.asarray(lines, dtype=np.float64).reshape(-1, 4)
+    x1, y1, x2, y2 = segments.T
+    dx = x2 - x1
+    valid = dx != 0
+    x1, y1, x2, y2, dx = x1[valid], y1[valid], x2[valid], y2[valid], dx[valid]
+    slopes = (y2 - y1) / dx
+    intercepts = y1 - slopes * x1
+    weights = np.hypot(dx, y2 - y1) if length_weighted else None
+
+    left = slopes < 0
+    right = ~left
+    left_avg = _side_average(slopes[left], intercepts[left],
+                             weights[left] if weights is not None else None, outlier_mad)
+    right_avg = _side_average(slopes[right], intercepts[right],
+                              weights[right] if weights is not None else None, outlier_mad)
     return left_avg, right_avg
 
 def make_coordinates(frame, line_params):
@@ -77,95 +111,269 @@ def make_coordinates(frame, line_params):
     x2 = int((y2 - intercept)/slope)
     return np.array([x1, y1, x2, y2])
 
-def draw_multicolor_lane(frame, left_line, right_line):
+class LaneDetector:
+    """
+    車道線偵測（取代 detect_edges → region_of_interest → detect_lines 的整張圖流程）
+
+    - ROI 梯形遮罩依解析度預先建立並快取，不再每幀配置新遮罩 + fillPoly
+    - 只裁出 ROI 所在的下方帶狀區域（roi_top_ratio 以下，多留幾列給模糊 / Sobel 的邊界）再做灰度、模糊、Canny、Hough
+    - 連續 stable_frames 幀左右線都有偵測到且移動不大時，Hough 只在上一幀車道線附近的窗口內搜尋；
+      任一側遺失就立即回到完整 ROI
+    - 每一路影像各自一個實例（窗口依賴上一幀的結果）
+    """
+
+    # 高斯模糊 5x5 + Sobel 3x3 需要的上方邊界列數，讓 ROI 頂端的邊緣結果與整張圖處理一致
+    BORDER = 3
+
+    def __init__(self, roi_top_ratio=0.55, window_margin=0.06, stable_frames=5, max_shift=0.05,
+                 length_weighted=False, outlier_mad=None):
+        """
+        - window_margin：追蹤窗口半寬（畫面寬度比例）
+        - max_shift：相鄰兩幀車道線端點位移上限（畫面寬度比例），超過視為不穩定
+        - length_weighted / outlier_mad：左右線平均方式（見 average_slope_intercept）
+        """
+        self.roi_top_ratio = roi_top_ratio
+        self.length_weighted = length_weighted
+        self.outlier_mad = outlier_mad
+        self.window_margin = window_margin
+        self.stable_frames = stable_frames
+        self.max_shift = max_shift
+        self._geometry = {}
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(roi_top_ratio=config.get('roi_top_ratio', 0.55),
+                   window_margin=config.get('window_margin', 0.06),
+                   stable_frames=config.get('stable_frames', 5),
+                   max_shift=config.get('max_shift', 0.05),
+                   length_weighted=config.get('length_weighted', False),
+                   outlier_mad=config.get('outlier_mad'))
+
+    def reset(self):
+        self._prev_lines = None
+        self._stable = 0
+
+    def __getstate__(self):
+        # 遮罩 / 緩衝區只是快取，不跟著序列化
+        state = self.__dict__.copy()
+        state['_geometry'] = {}
+        return state
+
+    @property
+    def tracking(self):
+        return self._prev_lines is not None and self._stable >= self.stable_frames
+
+    def _roi(self, shape):
+        """依解析度快取：帶狀區域起點、ROI 遮罩與各階段的輸出緩衝區"""
+        key = tuple(shape[:2])
+        geometry = self._geometry.get(key)
+        if geometry is None:
+            height, width = key
+            roi_top = int(height * self.roi_top_ratio)
+            crop_top = max(roi_top - self.BORDER, 0)
+            band = (height - crop_top, width)
+            mask = np.zeros(band, dtype=np.uint8)
+            polygon = np.array([[
+                (0, height),
+                (int(width * 0.4), roi_top),
+                (int(width * 0.6), roi_top),
+                (width, height)
+            ]])
+            cv2.fillPoly(mask, polygon, 255, offset=(0, -crop_top))
+            geometry = {
+                "crop_top": crop_top,
+                "mask": mask,
+                "gray": np.empty(band, dtype=np.uint8),
+                "blur": np.empty(band, dtype=np.uint8),
+                "edges": np.empty(band, dtype=np.uint8),
+                "window": np.empty(band, dtype=np.uint8),
+            }
+            self._geometry[key] = geometry
+        return geometry
+
+    def _window(self, geometry, width):
+        """上一幀左右線附近的搜尋窗口（與 ROI 遮罩取交集）"""
+        window = geometry["window"]
+        window.fill(0)
+        crop_top = geometry["crop_top"]
+        bottom = crop_top + window.shape[0]
+        thickness = max(int(2 * self.window_margin * width), 1)
+        for x1, y1, x2, y2 in self._prev_lines:
+            if y2 == y1:
+                continue
+            # 延伸到帶狀區域上下緣，座標換成帶狀區域內的座標
+            slope_inv = (x2 - x1) / (y2 - y1)
+            top_x = int(x1 + (crop_top - y1) * slope_inv)
+            bottom_x = int(x1 + (bottom - y1) * slope_inv)
+            cv2.line(window, (top_x, 0), (bottom_x, window.shape[0]), 255, thickness)
+        cv2.bitwise_and(window, geometry["mask"], dst=window)
+        return window
+
+    def edges(self, frame):
+        """帶狀區域的 ROI 邊緣圖，回傳 (edges, crop_top)"""
+        geometry = self._roi(frame.shape)
+        crop_top = geometry["crop_top"]
+        band = frame[crop_top:]
+        cv2.cvtColor(band, cv2.COLOR_BGR2GRAY, dst=geometry["gray"])
+        cv2.GaussianBlur(geometry["gray"], (5, 5), 0, dst=geometry["blur"])
+        edges = cv2.Canny(geometry["blur"], 50, 150, edges=geometry["edges"])
+        mask = self._window(geometry, frame.shape[1]) if self.tracking else geometry["mask"]
+        cv2.bitwise_and(edges, mask, dst=edges)
+        return edges, crop_top
+
+    def detect_lines(self, frame):
+        """回傳依斜率過濾後的 Hough 線段（整張圖座標）"""
+        edges, crop_top = self.edges(frame)
+        raw_lines = hough_segments(edges)
+        if raw_lines is None:
+            return np.empty((0, 1, 4), dtype=np.int32)
+        raw_lines[..., 1] += crop_top
+        raw_lines[..., 3] += crop_top
+        return filter_lines(raw_lines)
+
+    def fit(self, lines):
+        """線段 → 左右線 (斜率, 截距)"""
+        return average_slope_intercept(lines, self.length_weighted, self.outlier_mad)
+
+    def observe(self, left_line, right_line, width):
+        """以本幀偵測到的（未平滑）左右線更新追蹤狀態"""
+        if left_line is None or right_line is None:
+            self.reset()
+            return
+        lines = (tuple(left_line), tuple(right_line))
+        if self._prev_lines is not None:
+            shift = np.max(np.abs(np.subtract(lines, self._prev_lines)))
+            self._stable = self._stable + 1 if shift <= self.max_shift * width else 1
+        else:
+            self._stable = 1
+        self._prev_lines = lines
+
+
+def lane_zones(frame_shape, left_line, right_line):
+    """
+    紅橙綠三段車道區域多邊形
+    回傳 ([(多邊形, 顏色), ...] 依 綠→橙→紅 的填色順序, 是否太近)；缺少車道線時回傳 ([], False)
+    """
+    if left_line is None or right_line is None:
+        return [], False
+
+    lane_width = abs(left_line[0] - right_line[0])
+    height, width = frame_shape[:2]
+    y_bottom = height
+
+    red_height = int(200)
+    orange_height = 70
+    green_height = 200
+
+    red_y_top = y_bottom - red_height
+    orange_y_top = red_y_top - orange_height
+    left_y_min = min(left_line[1], left_line[3])
+    right_y_min = min(right_line[1], right_line[3])
+    max_top_y = max(left_y_min, right_y_min)
+    green_y_top = max(orange_y_top - green_height, max_top_y)
+
+    def interp_x(line, y):
+        x1, y1, x2, y2 = line
+        if y2 == y1:
+            return x1
+        return int(x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+
+    left_x_red_bot = interp_x(left_line, y_bottom)
+    left_x_red_top = interp_x(left_line, red_y_top)
+    right_x_red_bot = interp_x(right_line, y_bottom)
+    right_x_red_top = interp_x(right_line, red_y_top)
+    left_x_orange_top = interp_x(left_line, orange_y_top)
+    right_x_orange_top = interp_x(right_line, orange_y_top)
+    left_x_green_top = interp_x(left_line, green_y_top)
+    right_x_green_top = interp_x(right_line, green_y_top)
+
+    red_zone = np.array([[left_x_red_bot, y_bottom], [left_x_red_top, red_y_top],
+                         [right_x_red_top, red_y_top], [right_x_red_bot, y_bottom]])
+    orange_zone = np.array([[left_x_red_top, red_y_top], [left_x_orange_top, orange_y_top],
+                            [right_x_orange_top, orange_y_top], [right_x_red_top, red_y_top]])
+    green_zone = np.array([[left_x_orange_top, orange_y_top], [left_x_green_top, green_y_top],
+                           [right_x_green_top, green_y_top], [right_x_orange_top, orange_y_top]])
+
+    red_width = abs(left_x_red_bot - right_x_red_bot)
+    too_close = red_width < lane_width * 0.4
+    return [(green_zone, (0, 255, 0)), (orange_zone, (0, 165, 255)), (red_zone, (0, 0, 255))], too_close
+
+def lane_overlay_steps(frame_shape, left_line, right_line, side_roi=None):
+    """
+    車道色塊的合成步驟（給 OverlayCompositor）：紅橙綠三段疊加 0.4，再混入左右切入區（橘色 alpha 0.4）
+    side_roi：含 side_left / side_right 的 ROI 字典；None 則不畫切入區
+    回傳 (steps, 是否太近)
+    """
+    zones, too_close = lane_zones(frame_shape, left_line, right_line)
+    steps = [("add", zones, 0.4)] if zones else []
+    if side_roi:
+        sides = [(side_roi[name], (0, 140, 255)) for name in ("side_left", "side_right") if name in side_roi]  # BGR 橘
+        if sides:
+            steps.append(("blend", sides, 0.4))
+    return steps, too_close
+
+def draw_too_close(frame):
+    cv2.putText(frame, "WARNING: TOO CLOSE", (50, 50),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
+
+def draw_multicolor_lane(frame, left_line, right_line, dst=None, compositor=None):
     """
     畫出紅橙綠三段風險區域，並保證回傳合法影像
+    - dst：結果寫入的預配置影像（None 則新配置）
+    - compositor：色塊合成器（None 則使用模組共用的 lane_compositor）
     """
     if frame is None:
-        print("[❌ draw_multicolor_lane] 警告：輸入 frame 為 None")
+        log.error("lane.draw", "[❌ draw_multicolor_lane] 警告：輸入 frame 為 None")
         return np.zeros((720, 1280, 3), dtype=np.uint8)  # 根據預設解析度調整
 
-    frame_copy = frame.copy()
+    compositor = lane_compositor if compositor is None else compositor
 
     if left_line is None or right_line is None:
-        print("[⚠️ draw_multicolor_lane] 警告：缺少車道線，僅回傳原圖")
-        return frame_copy
+        log.debug("lane.draw", "[⚠️ draw_multicolor_lane] 警告：缺少車道線，僅回傳原圖")
+        return compositor.compose(frame, [], dst=dst)
 
     try:
-        lane_width = abs(left_line[0] - right_line[0])
-        height, width = frame.shape[:2]
-        y_bottom = height
-
-        red_height = int(200)
-        orange_height = 70
-        green_height = 200
-
-        red_y_top = y_bottom - red_height
-        orange_y_top = red_y_top - orange_height
-        left_y_min = min(left_line[1], left_line[3])
-        right_y_min = min(right_line[1], right_line[3])
-        max_top_y = max(left_y_min, right_y_min)
-        green_y_top = max(orange_y_top - green_height, max_top_y)
-
-        def interp_x(line, y):
-            x1, y1, x2, y2 = line
-            if y2 == y1:
-                return x1
-            return int(x1 + (y - y1) * (x2 - x1) / (y2 - y1))
-
-        left_x_red_bot = interp_x(left_line, y_bottom)
-        left_x_red_top = interp_x(left_line, red_y_top)
-        right_x_red_bot = interp_x(right_line, y_bottom)
-        right_x_red_top = interp_x(right_line, red_y_top)
-        left_x_orange_top = interp_x(left_line, orange_y_top)
-        right_x_orange_top = interp_x(right_line, orange_y_top)
-        left_x_green_top = interp_x(left_line, green_y_top)
-        right_x_green_top = interp_x(right_line, green_y_top)
-
-        red_zone = np.array([[left_x_red_bot, y_bottom], [left_x_red_top, red_y_top],
-                             [right_x_red_top, red_y_top], [right_x_red_bot, y_bottom]])
-        orange_zone = np.array([[left_x_red_top, red_y_top], [left_x_orange_top, orange_y_top],
-                                [right_x_orange_top, orange_y_top], [right_x_red_top, red_y_top]])
-        green_zone = np.array([[left_x_orange_top, orange_y_top], [left_x_green_top, green_y_top],
-                               [right_x_green_top, green_y_top], [right_x_orange_top, orange_y_top]])
-
-        overlay = np.zeros_like(frame_copy)
-        cv2.fillPoly(overlay, [green_zone], (0, 255, 0))
-        cv2.fillPoly(overlay, [orange_zone], (0, 165, 255))
-        cv2.fillPoly(overlay, [red_zone], (0, 0, 255))
-
-        red_width = abs(left_x_red_bot - right_x_red_bot)
-        if red_width < lane_width * 0.4:
-            cv2.putText(frame_copy, "WARNING: TOO CLOSE", (50, 50),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 3)
-
-        return cv2.addWeighted(frame_copy, 1, overlay, 0.4, 1)
+        steps, too_close = lane_overlay_steps(frame.shape, left_line, right_line)
+        frame_copy = compositor.compose(frame, steps, dst=dst)
+        if too_close:
+            draw_too_close(frame_copy)
+        return frame_copy
 
     except Exception as e:
-        print("[❌ draw_multicolor_lane 畫圖失敗]", e)
-        return frame_copy
+        log.error("lane.draw", "[❌ draw_multicolor_lane 畫圖失敗] {error}", error=str(e))
+        return frame.copy() if dst is None else dst
 
 
 def get_lane_roi_dynamic(left_line, right_line, frame_shape, speed=0, scale_factor=1.0):
     """
     使用左線、右線建立動態 ROI（高、中、低 + 左右側切入區），允許根據車速動態調整長度
+    回傳 (ROI 字典, 縮放比例)；缺少車道線時回傳 ({}, 0.0)
     """
     if left_line is None or right_line is None:
-        return {}
+        return {}, 0.0
+    scale = lane_roi_scale(left_line, right_line, speed, scale_factor)
+    return build_lane_roi(left_line, right_line, frame_shape, scale), scale
 
+
+def lane_roi_scale(left_line, right_line, speed=0, scale_factor=1.0):
+    """依車道寬度與車速決定 ROI 長度縮放比例"""
+    lane_width = abs(right_line[0] - left_line[0])
+    base_scale = min(max(lane_width / 400, 0.5), 0.6)
+    return min(base_scale + speed * 0.005 * scale_factor, 1.0)
+
+
+def build_lane_roi(left_line, right_line, frame_shape, scale):
+    """以指定的縮放比例建立 ROI 字典（五個四邊形）"""
     height = frame_shape[0]
     width = frame_shape[1]
     y_bottom = height
 
-    # 車道寬度與縮放
+    # 車道寬度
     left_x_bot = left_line[0]
     right_x_bot = right_line[0]
     lane_width = abs(right_x_bot - left_x_bot)
 
-    base_scale = min(max(lane_width / 400, 0.5), 0.6)
-    dynamic_scale = min(base_scale + speed * 0.005 * scale_factor, 1.0)
-    scale = dynamic_scale
-
     red_height = int(150 * scale)
     orange_height = int(70 * scale)
     green_height = int(180 * scale)
@@ -241,7 +449,90 @@ def get_lane_roi_dynamic(left_line, right_line, frame_shape, speed=0, scale_fact
         ])
     }
 
-    return roi_dict, scale
+    return roi_dict
+
+
+class LaneRoi:
+    """
+    一組快取的車道 ROI：量化後的左右線、ROI 字典、縮放比例，以及由它衍生的結果（artifacts）
+    ROI 字典與 artifacts 會被多幀共用，呼叫端不可修改
+    """
+
+    __slots__ = ("key", "left_line", "right_line", "roi_dict", "scale", "artifacts")
+
+    def __init__(self, key, left_line, right_line, roi_dict, scale):
+        self.key = key
+        self.left_line = left_line
+        self.right_line = right_line
+        self.roi_dict = roi_dict
+        self.scale = scale
+        self.artifacts = {}
+
+    def artifact(self, name, build):
+        """取得衍生結果（例如區域判斷幾何、色塊合成圖層），第一次用到時呼叫 build() 建立（build() 回傳 None 也會快取）"""
+        if name not in self.artifacts:
+            self.artifacts[name] = build()
+        return self.artifacts[name]
+
+
+class LaneRoiCache:
+    """
+    get_lane_roi_dynamic 的 LRU 快取
+
+    平滑後的車道線與車速縮放在相鄰幀間幾乎不變：左右線端點 x 以 quantum 像素、縮放比例以 scale_step 量化後當作 key，
+    ROI 直接以量化後的值建立（結果只由 key 決定），幾何穩定時整組 ROI 與其衍生結果都直接沿用
+    """
+
+    def __init__(self, size=16, quantum=4, scale_step=0.01):
+        self.size = size
+        self.quantum = quantum
+        self.scale_step = scale_step
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(size=config.get('size', 16),
+                   quantum=config.get('quantum', 4),
+                   scale_step=config.get('scale_step', 0.01))
+
+    def __getstate__(self):
+        # 快取內容可隨時重建，不跟著序列化
+        state = self.__dict__.copy()
+        state['_cache'] = OrderedDict()
+        return state
+
+    def clear(self):
+        self._cache.clear()
+
+    def _quantize(self, line):
+        line = np.array(line, dtype=np.int64)
+        line[[0, 2]] = np.rint(line[[0, 2]] / self.quantum).astype(np.int64) * self.quantum
+        return line
+
+    def get(self, left_line, right_line, frame_shape, speed=0, scale_factor=1.0):
+        """回傳 LaneRoi；缺少車道線時回傳 None"""
+        if left_line is None or right_line is None:
+            return None
+        left_line = self._quantize(left_line)
+        right_line = self._quantize(right_line)
+        scale_bucket = int(round(lane_roi_scale(left_line, right_line, speed, scale_factor) / self.scale_step))
+        key = (tuple(frame_shape[:2]), tuple(left_line), tuple(right_line), scale_bucket)
+
+        entry = self._cache.get(key)
+        if entry is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        scale = scale_bucket * self.scale_step
+        entry = LaneRoi(key, left_line, right_line, build_lane_roi(left_line, right_line, frame_shape, scale), scale)
+        self._cache[key] = entry
+        if len(self._cache) > self.size:
+            self._cache.popitem(last=False)
+        return entry
 
 
 def is_valid_lane_scene(left_line, right_line, frame_shape):
@@ -274,55 +565,117 @@ def is_valid_lane_scene(left_line, right_line, frame_shape):
 
     return True
 
-def process_frame(frame):
-    global left_line_history, right_line_history
+def process_frame(frame, draw=True, dst=None, history=None, compositor=None, detector=None, lane_filter=None,
+                  roi_cache=None):
+    """
+    車道偵測主流程：回傳 (畫好色塊的影像, ROI 字典, 場景是否有效, 左線, 右線)
+    draw=False 時不畫車道色塊，直接回傳原圖（降載模式 / 由呼叫端自行合成色塊時使用）
+    dst：與 frame 同尺寸的預配置影像，避免每幀配置新影像
+    history：(左線歷史, 右線歷史)，多路影像各自平滑時傳入；None 則使用模組共用的歷史
+    compositor：色塊合成器（None 則使用模組共用的 lane_compositor）
+    detector：LaneDetector（None 則使用模組共用的 lane_detector）
+    多路影像 / 多執行緒請改用各自的 LaneEngine，不要共用這些模組預設狀態
+    lane_filter：LaneKalmanTracker；傳入時改由它追蹤左右線（稀疏完整偵測 + Kalman 預測），不使用 detector / history
+    roi_cache：LaneRoiCache；傳入時 ROI 由快取取得（幾何不變時直接沿用）
+    """
+    left_history, right_history = history if history is not None else (left_line_history, right_line_history)
+    detector = lane_detector if detector is None else detector
 
     try:
-        # 邊緣偵測 + Hough 轉換
-        edges = detect_edges(frame)
-        roi = region_of_interest(edges)
-        lines = detect_lines(roi)
-        left_params, right_params = average_slope_intercept(lines)
-
-        # 平滑處理線條
-        raw_left = make_coordinates(frame, left_params)
-        raw_right = make_coordinates(frame, right_params)
-        left_line = smooth_line(left_line_history, raw_left)
-        right_line = smooth_line(right_line_history, raw_right)
+        if lane_filter is not None:
+            left_line, right_line = lane_filter.update(frame)
+        else:
+            # 邊緣偵測 + Hough 轉換（只處理 ROI 帶狀區域，穩定時只搜尋上一幀車道線附近）
+            lines = detector.detect_lines(frame)
+            left_params, right_params = detector.fit(lines)
 
-        # 畫主車道區域與 lane 線條（紅橙綠）
-        frame_with_colors = draw_multicolor_lane(frame, left_line, right_line)
+            # 平滑處理線條
+            raw_left = make_coordinates(frame, left_params)
+            raw_right = make_coordinates(frame, right_params)
+            detector.observe(raw_left, raw_right, frame.shape[1])
+            left_line = smooth_line(left_history, raw_left)
+            right_line = smooth_line(right_history, raw_right)
 
         # 建立 ROI 字典（含 side_left/right）
-        roi_dict, scale = get_lane_roi_dynamic(left_line, right_line, frame.shape)
+        if roi_cache is not None:
+            lane_roi = roi_cache.get(left_line, right_line, frame.shape)
+            roi_dict = lane_roi.roi_dict if lane_roi is not None else {}
+        else:
+            roi_dict, scale = get_lane_roi_dynamic(left_line, right_line, frame.shape)
 
         # 場景過濾：判斷車道是否有效
         scene_valid = is_valid_lane_scene(left_line, right_line, frame.shape)
 
-        # 畫左側切入區（橘色）
-        if "side_left" in roi_dict:
-            overlay = frame_with_colors.copy()
-            cv2.fillPoly(overlay, [roi_dict["side_left"]], (0, 140, 255))  # BGR 橘
-            frame_with_colors = cv2.addWeighted(overlay, 0.4, frame_with_colors, 0.6, 0)
+        if not draw:
+            return frame, roi_dict, scene_valid, left_line, right_line
 
-        # 畫右側切入區（橘色）
-        if "side_right" in roi_dict:
-            overlay = frame_with_colors.copy()
-            cv2.fillPoly(overlay, [roi_dict["side_right"]], (0, 140, 255))  # BGR 橘
-            frame_with_colors = cv2.addWeighted(overlay, 0.4, frame_with_colors, 0.6, 0)
-
-        # 異常 fallback
-        if frame_with_colors is None:
-            print("[❌ process_frame] draw_multicolor_lane 回傳 None，回傳原圖")
-            frame_with_colors = frame.copy()
+        # 主車道紅橙綠 + 左右切入區（橘色），一次合成
+        compositor = lane_compositor if compositor is None else compositor
+        steps, too_close = lane_overlay_steps(frame.shape, left_line, right_line, side_roi=roi_dict)
+        frame_with_colors = compositor.compose(frame, steps, dst=dst)
+        if too_close:
+            draw_too_close(frame_with_colors)
 
         return frame_with_colors, roi_dict, scene_valid, left_line, right_line
 
     except Exception as e:
-        print(f"[❌ process_frame Error] {e}")
+        log.error("lane", "[❌ process_frame Error] {error}", error=str(e))
         return frame.copy(), {}, False, None, None
 
 
+class LaneEngine:
+    """
+    一路影像的車道偵測狀態（偵測器、Kalman 追蹤、左右線平滑歷史、色塊合成器）集中在一個實例
+
+    - 每個 LaneTracker / 每路影像各自一個，多執行緒 / 多行程平行處理時互不干擾
+    - 可 pickle（快取不序列化），reset() 清空跨幀狀態
+    """
+
+    def __init__(self, detector=None, lane_filter=None, history_len=5, compositor=None, roi_cache=None):
+        self.detector = detector if detector is not None else LaneDetector()
+        self.lane_filter = lane_filter
+        self.roi_cache = roi_cache if roi_cache is not None else LaneRoiCache()
+        self.history = (deque(maxlen=history_len), deque(maxlen=history_len))
+        self.compositor = compositor if compositor is not None else OverlayCompositor()
+
+    @classmethod
+    def from_config(cls, config):
+        """config：risk_params（讀 lane_detection / lane_tracking 兩段）"""
+        detector = LaneDetector.from_config(config.get('lane_detection', {}))
+        lane_filter = None
+        lane_tracking = config.get('lane_tracking', {})
+        if lane_tracking.get('enabled', True):
+            from risk_modules.lane_kalman import LaneKalmanTracker
+
+            lane_filter = LaneKalmanTracker.from_config(lane_tracking, detector=detector)
+        roi_cache = LaneRoiCache.from_config(config.get('roi_cache', {}))
+        return cls(detector=detector, lane_filter=lane_filter, roi_cache=roi_cache)
+
+    def reset(self):
+        for history in self.history:
+            history.clear()
+        self.detector.reset()
+        if self.lane_filter is not None:
+            self.lane_filter.reset()
+
+    def process(self, frame, draw=True, dst=None):
+        """與 process_frame 相同的回傳值，使用本實例的狀態"""
+        return process_frame(frame, draw=draw, dst=dst, history=self.history, compositor=self.compositor,
+                             detector=self.detector, lane_filter=self.lane_filter, roi_cache=self.roi_cache)
+
+    def roi(self, left_line, right_line, frame_shape, speed=0, scale_factor=1.0):
+        """快取的 LaneRoi（缺少車道線時回傳 None）"""
+        return self.roi_cache.get(left_line, right_line, frame_shape, speed=speed, scale_factor=scale_factor)
+
+
+# 模組共用的車道引擎（沿用舊版 process_frame / 全域歷史呼叫方式的呼叫端使用）
+default_lane_engine = LaneEngine()
+lane_detector = default_lane_engine.detector
+left_line_history, right_line_history = default_lane_engine.history
+# 色塊合成器（同一組車道幾何只建立一次合成圖層）
+lane_compositor = default_lane_engine.compositor
+
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+import cv2
+
+# 依類別輪替的框線顏色（BGR）
+PALETTE = (
+    (56, 56, 255), (151, 157, 255), (31, 112, 255), (29, 178, 255), (49, 210, 207),
+    (10, 249, 72), (23, 204, 146), (134, 219, 61), (211, 188, 0), (209, 85, 0),
+)
+RISK_COLOR = (0, 0, 255)      # 紅：high / 左右切入區
+WARN_COLOR = (0, 165, 255)    # 橘：mid（只在 minimal 模式標示）
+RISK_LEVELS = ("high", "side_right", "side_left")
+
+
+class AnnotationRenderer:
+    """
+    偵測框 / 風險框繪製（取代 ultralytics 的 results[0].plot()）
+
+    直接使用已取出的 boxes.data（numpy），畫在呼叫端提供的影像上，不另外配置新影像
+    - mode="full"：所有偵測框 + 類別 / 追蹤 ID / 信心分數，再加上風險框與 RISK ID 標籤（除錯 / 展示用）
+    - mode="minimal"：只畫風險框（紅粗框）與 mid 物件（橘細框），不畫文字，給車內小螢幕使用
+    """
+
+    def __init__(self, mode="full", class_names=None, line_width=2, font_scale=0.5):
+        if mode not in ("full", "minimal"):
+            raise ValueError(f"Unknown render mode: {mode}")
+        self.mode = mode
+        self.class_names = class_names
+        self.line_width = line_width
+        self.font_scale = font_scale
+
+    @classmethod
+    def from_config(cls, render_config, class_names=None):
+        return cls(mode=render_config.get('mode', 'full'),
+                   class_names=class_names,
+                   line_width=render_config.get('line_width', 2),
+                   font_scale=render_config.get('font_scale', 0.5))
+
+    @property
+    def minimal(self):
+        return self.mode == "minimal"
+
+    def _label(self, frame, text, x, y, color):
+        """文字加底色，畫在 (x, y) 框的左上角外側"""
+        (w, h), baseline = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, self.font_scale, 1)
+        top = y - h - baseline - 2 if y - h - baseline - 2 >= 0 else y
+        cv2.rectangle(frame, (x, top), (x + w + 2, top + h + baseline + 2), color, -1)
+        cv2.putText(frame, text, (x + 1, top + h + 1), cv2.FONT_HERSHEY_SIMPLEX, self.font_scale,
+                    (255, 255, 255), 1, cv2.LINE_AA)
+
+    def draw_detections(self, frame, boxes):
+        """
+        boxes：results[0].boxes.data 轉成的 numpy 陣列
+        追蹤結果為 [x1, y1, x2, y2, id, conf, cls]，未追蹤到時為 [x1, y1, x2, y2, conf, cls]
+        """
+        if self.minimal or boxes is None or len(boxes) == 0:
+            return frame
+        tracked = boxes.shape[1] >= 7
+        for row in boxes:
+            x1, y1, x2, y2 = (int(v) for v in row[:4])
+            conf, cls = float(row[-2]), int(row[-1])
+            color = PALETTE[cls % len(PALETTE)]
+            name = self.class_names.get(cls, str(cls)) if self.class_names else str(cls)
+            text = f"id:{int(row[4])} {name} {conf:.2f}" if tracked else f"{name} {conf:.2f}"
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, self.line_width)
+            self._label(frame, text, x1, y1, color)
+        return frame
+
+    def draw_risks(self, frame, risky_objects):
+        """risky_objects：(x1, y1, x2, y2, track_id, risk_score, risk_level)"""
+        for (x1, y1, x2, y2, track_id, risk_score, risk_level) in risky_objects:
+            if risk_level in RISK_LEVELS:
+                if self.minimal:
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), RISK_COLOR, self.line_width + 2)
+                else:
+                    cv2.rectangle(frame, (x1, y1), (x2, y2), RISK_COLOR, 2)
+                    cv2.putText(frame, f"RISK ID: {track_id} ({risk_score:.1f})", (x1, y1 - 10),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, RISK_COLOR, 2)
+            elif self.minimal and risk_level == "mid":
+                cv2.rectangle(frame, (x1, y1), (x2, y2), WARN_COLOR, self.line_width)
+        return frame
+
+    def render(self, frame, boxes, risky_objects):
+        """在 frame 上原地畫出偵測框與風險框，回傳 frame"""
+        self.draw_detections(frame, boxes)
+        self.draw_risks(frame, risky_objects)
+        return frame
@@ -0,0 +1,161 @@
+import cv2
+import numpy as np
+from collections import deque
+
+
+def copy_band(dst, src):
+    if dst.shape != src.shape:
+        return src.copy()
+    np.copyto(dst, src)
+    return dst
+
+
+class EgoMotionEstimator:
+    """
+    自車速度估計（光流）
+
+    - 只在畫面下方 ROI 帶狀區域（roi_top_ratio ~ roi_bottom_ratio）計算，並先縮小 downscale 倍
+    - 每一對相鄰幀的光流結果都會快取：history=3 時每幀只需新算一對，另一對沿用上一幀的結果
+    - backend: "farneback"（稠密光流，與舊版相同）或 "lk"（稀疏 Lucas-Kanade 特徵點追蹤，CPU 成本低很多）
+    - 回傳的速度單位維持「處理尺寸下的平均位移像素」，與舊版數值尺度一致
+    """
+
+    def __init__(self, roi_top_ratio=0.6, roi_bottom_ratio=1.0, backend="farneback", downscale=0.5,
+                 history=3, alpha=0.3, max_fail_count=3, lk_max_corners=150, lk_quality=0.01,
+                 lk_min_distance=7, lk_min_features=40):
+        if backend not in ("farneback", "lk"):
+            raise ValueError(f"Unknown optical flow backend: {backend}")
+        if history < 2:
+            raise ValueError(f"optical_flow.history must be >= 2 (got {history})")
+        self.roi_top_ratio = roi_top_ratio
+        self.roi_bottom_ratio = roi_bottom_ratio
+        self.backend = backend
+        self.downscale = downscale
+        self.history = history
+        self.alpha = alpha
+        self.max_fail_count = max_fail_count
+        self.lk_max_corners = lk_max_corners
+        self.lk_quality = lk_quality
+        self.lk_min_distance = lk_min_distance
+        self.lk_min_features = lk_min_features
+        self.reset()
+
+    # risk_params.yaml optical_flow 區段可設定的參數（與建構子參數同名）
+    CONFIG_KEYS = ("roi_top_ratio", "roi_bottom_ratio", "backend", "downscale", "history", "alpha", "max_fail_count",
+                   "lk_max_corners", "lk_quality", "lk_min_distance", "lk_min_features")
+
+    @classmethod
+    def from_config(cls, flow_config):
+        # 只傳入設定檔有寫的參數，其餘使用建構子的預設值（兩邊預設值不會不一致）
+        return cls(**{key: flow_config[key] for key in cls.CONFIG_KEYS if key in flow_config})
+
+    def reset(self):
+        self._bands = deque(maxlen=self.history)  # (幀序號, 縮小後的灰度帶狀圖)
+        self._spare = None                        # 上一次被擠出歷史的帶狀圖，下一幀直接覆寫重用（不在歷史中）
+        self._pair_cache = {}                     # (前幀序號, 後幀序號) -> 平均位移
+        self._features = None                     # LK：上一幀追蹤到的特徵點（縮小座標）
+        self._gray_buf = None                     # 帶狀灰度圖暫存區（重複使用）
+        self._flow_buf = None                     # farneback 輸出暫存區（重複使用）
+        self._frame_no = 0
+        self.prev_smoothed_speed = 0
+        self.fail_count = 0
+
+    def prepare(self, image, dst=None):
+        """
+        裁出 ROI 帶狀區域 → 灰度 → 縮小；image 可為 BGR 或灰度
+        dst 為已被擠出歷史的舊帶狀圖時，直接覆寫重用（穩定後不再配置新影像）
+        """
+        h = image.shape[0]
+        band = image[int(h * self.roi_top_ratio):int(h * self.roi_bottom_ratio)]
+        if band.ndim == 3:
+            if dst is not None:
+                self._gray_buf = cv2.cvtColor(band, cv2.COLOR_BGR2GRAY, dst=self._gray_buf)
+                band = self._gray_buf
+            else:
+                band = cv2.cvtColor(band, cv2.COLOR_BGR2GRAY)
+        if self.downscale != 1.0:
+            return cv2.resize(band, None, dst=dst, fx=self.downscale, fy=self.downscale,
+                              interpolation=cv2.INTER_AREA)
+        return band.copy() if dst is None else copy_band(dst, band)
+
+    def flow_between(self, prev_gray, curr_gray):
+        """計算兩張完整灰度圖之間的平均位移（不使用快取與特徵點延續）"""
+        return self._pair_speed(self.prepare(prev_gray), self.prepare(curr_gray), carry_features=False)
+
+    def _pair_speed(self, prev_band, curr_band, carry_features=True):
+        if self.backend == "lk":
+            mag = self._lk_speed(prev_band, curr_band, carry_features)
+        else:
+            flow_buf = self._flow_buf if carry_features else None
+            flow = cv2.calcOpticalFlowFarneback(prev_band, curr_band, flow_buf, 0.5, 3, 15, 3, 5, 1.2, 0)
+            if carry_features:
+                self._flow_buf = flow
+            mag = float(np.mean(np.linalg.norm(flow, axis=2)))
+        # 換回處理尺寸下的像素位移
+        return mag / self.downscale
+
+    def _lk_speed(self, prev_band, curr_band, carry_features):
+        p0 = self._features if carry_features else None
+        if p0 is None or len(p0) < self.lk_min_features:
+            p0 = cv2.goodFeaturesToTrack(prev_band, maxCorners=self.lk_max_corners, qualityLevel=self.lk_quality,
+                                         minDistance=self.lk_min_distance)
+        if p0 is None or len(p0) == 0:
+            raise ValueError("no features to track")
+
+        p1, status, _ = cv2.calcOpticalFlowPyrLK(prev_band, curr_band, p0, None, winSize=(15, 15), maxLevel=2)
+        good = status.reshape(-1) == 1
+        if not np.any(good):
+            raise ValueError("all features lost")
+
+        if carry_features:
+            # 追蹤成功的點直接當作下一對的起點，特徵點不足時才重新偵測
+            self._features = p1[good].reshape(-1, 1, 2)
+        return float(np.mean(np.linalg.norm((p1 - p0).reshape(-1, 2)[good], axis=1)))
+
+    def update(self, frame):
+        """輸入新的一幀，回傳平滑後的自車速度"""
+        # 寫入上一次被擠出的帶狀圖；歷史中的帶狀圖（包含上一幀）在比對完之前都不能覆寫
+        band = self.prepare(frame, dst=self._spare)
+        self._spare = None
+        if self._bands and self._bands[-1][1].shape != band.shape:
+            # 解析度改變，舊的歷史與快取都不能再用
+            self.reset()
+
+        if len(self._bands) == self._bands.maxlen:
+            self._spare = self._bands[0][1]
+        self._frame_no += 1
+        self._bands.append((self._frame_no, band))
+
+        speeds = []
+        for (prev_no, prev_band), (curr_no, curr_band) in zip(list(self._bands)[:-1], list(self._bands)[1:]):
+            key = (prev_no, curr_no)
+            if key not in self._pair_cache:
+                try:
+                    self._pair_cache[key] = self._pair_speed(prev_band, curr_band)
+                except Exception:
+                    self._pair_cache[key] = None
+                    self._features = None
+            if self._pair_cache[key] is not None:
+                speeds.append(self._pair_cache[key])
+
+        # 只保留仍在歷史視窗內的幀對
+        oldest = self._bands[0][0]
+        for key in [k for k in self._pair_cache if k[0] < oldest]:
+            del self._pair_cache[key]
+
+        if len(self._bands) >= 2:
+            raw_speed = float(np.mean(speeds)) if speeds else self.prev_smoothed_speed
+            self.fail_count = 0 if speeds else self.fail_count + 1
+        else:
+            raw_speed = self.prev_smoothed_speed
+            self.fail_count += 1
+
+        speed = self.alpha * raw_speed + (1 - self.alpha) * self.prev_smoothed_speed
+
+        if speed < 0.05:
+            speed = self.prev_smoothed_speed
+        if self.fail_count >= self.max_fail_count:
+            speed *= 0.5
+
+        self.prev_smoothed_speed = speed
+        return speed
@@ -0,0 +1,171 @@
+import cv2
+import numpy as np
+
+from risk_modules.Land_detection import LaneDetector, make_coordinates
+
+# make_coordinates 的車道線上端（畫面高度比例）；車道線以底端 / 上端兩點的 x 表示
+LINE_TOP_RATIO = 0.6
+
+
+class _BoundaryFilter:
+    """
+    單一車道邊界的等速 Kalman 濾波
+    狀態 [底端 x, 上端 x, 底端 x 速度, 上端 x 速度]（像素 / 次更新），量測為 [底端 x, 上端 x]
+    """
+
+    F = np.array([[1, 0, 1, 0],
+                  [0, 1, 0, 1],
+                  [0, 0, 1, 0],
+                  [0, 0, 0, 1]], dtype=np.float64)
+    H = np.eye(2, 4)
+
+    def __init__(self, measurement, process_var, measurement_var):
+        self.Q = np.diag([0.25, 0.25, 1.0, 1.0]) * process_var
+        self.R = np.eye(2) * measurement_var
+        self.x = np.array([measurement[0], measurement[1], 0.0, 0.0])
+        # 初始速度未知，給較大的不確定度
+        self.P = np.diag([measurement_var, measurement_var, measurement_var, measurement_var])
+        self.missed = 0
+
+    def predict(self):
+        self.x = self.F @ self.x
+        self.P = self.F @ self.P @ self.F.T + self.Q
+
+    def correct(self, measurement):
+        residual = np.asarray(measurement, dtype=np.float64) - self.H @ self.x
+        S = self.H @ self.P @ self.H.T + self.R
+        K = self.P @ self.H.T @ np.linalg.inv(S)
+        self.x = self.x + K @ residual
+        self.P = (np.eye(4) - K @ self.H) @ self.P
+        self.missed = 0
+
+
+class LaneKalmanTracker:
+    """
+    以 Kalman 濾波追蹤左右車道線，取代每幀完整 Canny + Hough 加上 5 幀平均（smooth_line）
+
+    - 每條邊界一個等速 Kalman 狀態，每次更新先預測
+    - 只有在 (1) 尚未鎖定左右線、(2) 距上次完整偵測已達 detect_every 次、
+      (3) 預測線與影像邊緣的殘差超過 residual_threshold 時，才跑一次完整偵測（LaneDetector）並校正
+    - 殘差檢查只取 ROI 內幾列像素：在預測線附近找水平梯度最大的位置，取偏移量的中位數，成本遠低於 Canny + Hough
+    - 某一側連續 max_missed 次完整偵測都沒找到就放掉該側，回傳 None（與舊版沒有偵測到車道線時相同）
+    """
+
+    def __init__(self, detector=None, detect_every=5, residual_threshold=0.03, check_rows=8,
+                 search_margin=0.03, min_gradient=12, process_std=0.001, measurement_std=0.04,
+                 max_missed=3):
+        """
+        以畫面寬度比例表示的參數：residual_threshold、search_margin、process_std、measurement_std
+        - min_gradient：相鄰像素灰度差低於此值的列視為沒有邊緣（虛線的空白段）；超過四分之三的列沒有邊緣也會觸發完整偵測
+        """
+        self.detector = detector if detector is not None else LaneDetector()
+        self.detect_every = detect_every
+        self.residual_threshold = residual_threshold
+        self.check_rows = check_rows
+        self.search_margin = search_margin
+        self.min_gradient = min_gradient
+        self.process_std = process_std
+        self.measurement_std = measurement_std
+        self.max_missed = max_missed
+        self.reset()
+
+    @classmethod
+    def from_config(cls, config, detector=None):
+        return cls(detector=detector,
+                   detect_every=config.get('detect_every', 5),
+                   residual_threshold=config.get('residual_threshold', 0.03),
+                   check_rows=config.get('check_rows', 8),
+                   search_margin=config.get('search_margin', 0.03),
+                   min_gradient=config.get('min_gradient', 12),
+                   process_std=config.get('process_std', 0.001),
+                   measurement_std=config.get('measurement_std', 0.04),
+                   max_missed=config.get('max_missed', 3))
+
+    def reset(self):
+        self.detector.reset()
+        self._filters = [None, None]   # 左、右
+        self._shape = None
+        self._since_detect = 0
+        self.detections = 0            # 完整偵測次數（統計用）
+        self.updates = 0
+
+    def update(self, frame):
+        """處理一幀，回傳 (左線, 右線)，格式與 make_coordinates 相同（沒有車道線時為 None）"""
+        if frame.shape[:2] != self._shape:
+            self.reset()
+            self._shape = frame.shape[:2]
+        self.updates += 1
+
+        for lane_filter in self._filters:
+            if lane_filter is not None:
+                lane_filter.predict()
+
+        run_detection = (None in self._filters or self._since_detect + 1 >= self.detect_every
+                         or self.residual(frame) > self.residual_threshold * frame.shape[1])
+        if run_detection:
+            self._detect(frame)
+        else:
+            self._since_detect += 1
+        return self.lines(frame.shape)
+
+    def _detect(self, frame):
+        width = frame.shape[1]
+        lines = self.detector.detect_lines(frame)
+        left_params, right_params = self.detector.fit(lines)
+        raw_lines = (make_coordinates(frame, left_params), make_coordinates(frame, right_params))
+        self.detector.observe(*raw_lines, width)
+
+        process_var = (self.process_std * width) ** 2
+        measurement_var = (self.measurement_std * width) ** 2
+        for side, raw_line in enumerate(raw_lines):
+            lane_filter = self._filters[side]
+            if raw_line is not None:
+                measurement = (raw_line[0], raw_line[2])
+                if lane_filter is None:
+                    self._filters[side] = _BoundaryFilter(measurement, process_var, measurement_var)
+                else:
+                    lane_filter.correct(measurement)
+            elif lane_filter is not None:
+                lane_filter.missed += 1
+                if lane_filter.missed >= self.max_missed:
+                    self._filters[side] = None
+        self._since_detect = 0
+        self.detections += 1
+
+    def lines(self, frame_shape):
+        """目前的左右線估計（make_coordinates 格式）"""
+        height = frame_shape[0]
+        top = int(height * LINE_TOP_RATIO)
+        return tuple(None if lane_filter is None
+                     else np.array([int(lane_filter.x[0]), height, int(lane_filter.x[1]), top])
+                     for lane_filter in self._filters)
+
+    def residual(self, frame):
+        """
+        預測線與影像邊緣的偏差（像素）：取 ROI 內 check_rows 列，在預測線左右 search_margin 內
+        找水平梯度最大的位置，取各列偏移量的中位數；兩側取較大者，邊緣不足時回傳 inf
+        """
+        if None in self._filters:
+            return np.inf
+        height, width = frame.shape[:2]
+        top = int(height * LINE_TOP_RATIO)
+        rows = np.linspace(top, height - 1, self.check_rows).astype(int)
+        gray = cv2.cvtColor(np.ascontiguousarray(frame[rows]), cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+        margin = max(int(self.search_margin * width), 2)
+        offsets = np.arange(-margin, margin + 1)
+        t = (height - rows) / (height - top)                                        # 底端 0 → 上端 1
+        states = np.array([lane_filter.x[:2] for lane_filter in self._filters])     # (2, 2)
+        centers = states[:, :1] + (states[:, 1:] - states[:, :1]) * t[None]        # (2, R)
+        cols = np.clip(np.rint(centers)[..., None].astype(int) + offsets, 0, width - 1)  # (2, R, 2m+1)
+        samples = gray[np.arange(len(rows))[None, :, None], cols]
+        gradient = np.abs(np.diff(samples, axis=2))                                 # (2, R, 2m)
+        strong = gradient.max(axis=2) >= self.min_gradient
+        shift = np.abs(offsets[np.argmax(gradient, axis=2)] + 0.5)
+
+        worst = 0.0
+        for side in range(2):
+            if strong[side].sum() * 4 < len(rows):
+                return np.inf
+            worst = max(worst, float(np.median(shift[side][strong[side]])))
+        return worst
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+
+class OverlayLayer:
+    """
+    一組區域色塊合成後的結果（只涵蓋所有區域的外接矩形 bbox）
+
+    以預乘 alpha 表示：輸出 = 原像素 × transmit / 255 + premult（兩者皆為 uint8，與影像同為 3 通道）
+    - 疊加（add）：transmit 不變，premult 加上 weight × 顏色（舊版 addWeighted(frame, 1, overlay, 0.4) 的效果）
+    - 混色（blend）：區域內 transmit × (1 - alpha)，premult 依 alpha 混入顏色（舊版 fillPoly + addWeighted 的效果）
+    多個步驟在建立時先合成好，之後每幀只需在 bbox 內做一次乘加
+    """
+
+    def __init__(self, bbox, transmit, premult):
+        self.bbox = bbox
+        self.transmit = transmit
+        self.premult = premult
+        self._buf = np.empty_like(premult)
+
+    def apply(self, image):
+        """直接在 image 上合成（只改動 bbox 範圍）"""
+        x0, y0, x1, y1 = self.bbox
+        view = image[y0:y1, x0:x1]
+        cv2.multiply(view, self.transmit, dst=self._buf, scale=1 / 255)
+        cv2.add(self._buf, self.premult, dst=view)
+        return image
+
+
+class OverlayCompositor:
+    """
+    車道 / 切入區色塊合成器：同一組區域幾何只建立一次合成圖層，之後重複使用
+
+    steps 為依序套用的步驟：
+    - ("add", [(polygon, color), ...], weight)：先依序填色（後畫的蓋掉先畫的），再以 weight 疊加到畫面
+    - ("blend", [(polygon, color), ...], alpha)：每個區域各自以 alpha 混色，依序套用
+    幾何（頂點、顏色、權重、畫面尺寸）相同時直接命中快取，車道沿用上一幀時不需重建
+    """
+
+    def __init__(self, cache_size=8):
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def __getstate__(self):
+        # 圖層快取可隨時重建，不跟著序列化
+        return {"cache_size": self.cache_size, "_cache": OrderedDict()}
+
+    @staticmethod
+    def _key(shape, steps):
+        parts = [tuple(shape[:2])]
+        for kind, zones, weight in steps:
+            parts.append((kind, float(weight)))
+            for polygon, color in zones:
+                parts.append((np.asarray(polygon, dtype=np.int32).tobytes(), tuple(color)))
+        return tuple(parts)
+
+    def layer(self, shape, steps):
+        """取得（或建立）合成圖層；沒有任何區域落在畫面內時回傳 None"""
+        key = self._key(shape, steps)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        layer = self._build(shape, steps)
+        self._cache[key] = layer
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return layer
+
+    def compose(self, frame, steps, dst=None):
+        """
+        把 steps 的色塊合成到 frame 上，回傳結果
+        dst：結果寫入的預配置影像（None 則新配置）；dst 為 frame 本身時直接原地合成
+        """
+        return self.apply(frame, self.layer(frame.shape, steps), dst=dst)
+
+    @staticmethod
+    def apply(frame, layer, dst=None):
+        """把已建立的圖層合成到 frame 上（layer 為 None 時只複製），dst 的用法同 compose"""
+        if dst is None:
+            out = frame.copy()
+        elif dst is frame:
+            out = frame
+        else:
+            np.copyto(dst, frame)
+            out = dst
+        if layer is not None:
+            layer.apply(out)
+        return out
+
+    def clear(self):
+        self._cache.clear()
+
+    @staticmethod
+    def _build(shape, steps):
+        """
+        以 fillPoly 把每個像素被哪些區域覆蓋編成一個 8 位元代碼，
+        先對所有可能的代碼算好合成結果（查表），再用 cv2.LUT 一次展開成整張圖層
+        """
+        height, width = shape[:2]
+        polygons = [np.asarray(polygon, dtype=np.int32).reshape(-1, 2)
+                    for _, zones, _ in steps for polygon, _ in zones]
+        if not polygons:
+            return None
+        points = np.concatenate(polygons)
+        x0, y0 = np.maximum(points.min(axis=0), 0)
+        x1, y1 = np.minimum(points.max(axis=0) + 1, (width, height))
+        if x1 <= x0 or y1 <= y0:
+            return None
+
+        size = (int(y1 - y0), int(x1 - x0))
+        offset = (-int(x0), -int(y0))
+        code = np.zeros(size, dtype=np.uint8)
+        field = np.empty(size, dtype=np.uint8)
+
+        # 代碼配置：add 步驟佔 ceil(log2(區域數 + 1)) 位元（存第幾個區域，後畫的蓋掉先畫的），blend 每個區域 1 位元
+        fields = []
+        bit = 0
+        for kind, zones, weight in steps:
+            if kind == "add":
+                fields.append((kind, zones, weight, bit))
+                bit += max(len(zones), 1).bit_length()
+            elif kind == "blend":
+                fields.append((kind, zones, weight, bit))
+                bit += len(zones)
+            else:
+                raise ValueError(f"Unknown overlay step: {kind}")
+        if bit > 8:
+            raise ValueError(f"Too many overlay zones for one layer ({bit} bits > 8)")
+
+        for kind, zones, _, start in fields:
+            if kind == "add":
+                field.fill(0)
+                for i, (polygon, _) in enumerate(zones):
+                    cv2.fillPoly(field, [np.asarray(polygon, dtype=np.int32)], (i + 1) << start, offset=offset)
+                cv2.bitwise_or(code, field, dst=code)
+            else:
+                for i, (polygon, _) in enumerate(zones):
+                    field.fill(0)
+                    cv2.fillPoly(field, [np.asarray(polygon, dtype=np.int32)], 1 << (start + i), offset=offset)
+                    cv2.bitwise_or(code, field, dst=code)
+
+        # 每個代碼的合成結果（對 0~255 所有代碼一次計算）
+        values = np.arange(256)
+        transmit_lut = np.ones(256)
+        premult_lut = np.zeros((256, 3))
+        for kind, zones, weight, start in fields:
+            if kind == "add":
+                index = (values >> start) & ((1 << max(len(zones), 1).bit_length()) - 1)
+                colors = np.vstack([np.zeros(3)] + [np.asarray(color, dtype=np.float64) for _, color in zones]
+                                   + [np.zeros(3)] * (1 << max(len(zones), 1).bit_length()))
+                premult_lut += weight * colors[index]
+            else:
+                for i, (_, color) in enumerate(zones):
+                    inside = ((values >> (start + i)) & 1).astype(bool)
+                    premult_lut[inside] = (1 - weight) * premult_lut[inside] + weight * np.asarray(color, dtype=np.float64)
+                    transmit_lut[inside] *= (1 - weight)
+
+        transmit_lut = np.clip(np.rint(transmit_lut * 255), 0, 255).astype(np.uint8)
+        premult_lut = np.clip(np.rint(premult_lut), 0, 255).astype(np.uint8)
+        # 單通道 LUT 比 3 通道 LUT 快很多，逐通道查表後再合併
+        transmit = cv2.LUT(code, transmit_lut)
+        transmit = cv2.merge([transmit, transmit, transmit])
+        premult = cv2.merge([cv2.LUT(code, np.ascontiguousarray(premult_lut[:, c])) for c in range(3)])
+        return OverlayLayer((int(x0), int(y0), int(x1), int(y1)), transmit, premult)
@@ -1,20 +1,44 @@
 import numpy as np
 import cv2
-from collections import defaultdict, deque
+from collections import deque
 import math
 import yaml
 import os
 
+from risk_modules.overlay_compositor import OverlayCompositor
+from risk_modules.risk_log import log
+from risk_modules.track_state import ZONE_CODES, TrackStateStore, track_states
+
 current_dir = os.path.dirname(os.path.abspath(__file__))  # risk_analyzer.py 的絕對路徑
 yaml_path = os.path.join(current_dir, 'risk_params.yaml')
 
-with open(yaml_path, 'r', encoding='utf-8') as file:
-    risk_config = yaml.safe_load(file)['risk_params']
+_risk_config = None
+
+
+def load_risk_config(path=yaml_path):
+    """讀取 risk_params.yaml 的 risk_params 區段（每次呼叫都重新讀檔）"""
+    with open(path, 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file)['risk_params']
+
+
+def get_risk_config():
+    """模組共用的風險參數，第一次用到時才讀檔（import 時不讀）"""
+    global _risk_config
+    if _risk_config is None:
+        _risk_config = load_risk_config()
+    return _risk_config
+
+
+def __getattr__(name):
+    # 舊版呼叫端直接讀 risk_analyzer.risk_config
+    if name == 'risk_config':
+        return get_risk_config()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-# 儲存每個物件的停留狀態與歷史
-object_state = defaultdict(lambda: {"last_level": None, "stay_counter": 0})
-object_history = defaultdict(lambda: deque(maxlen=2))  # 新增：紀錄物件歷史中心點
+# 每個物件的停留狀態、靜止幀數與歷史中心點都存在 TrackStateStore（可淘汰過期 ID）
+# object_history 保留字典介面給 compute_speed 使用
+object_history = track_states.history
 
 def get_center(bbox):
     """計算追蹤框中心點"""
@@ -44,15 +68,14 @@ def get_roi_level_bbox(bbox, roi_dict):
     return None
 
 
-# 每個追蹤 ID 對應的移動歷史中心點
-object_history = defaultdict(lambda: deque(maxlen=2))
-
-def compute_speed(track_id, current_center, object_history, fps=30):
+def compute_speed(track_id, current_center, object_history, fps=30, config=None):
     """
     計算物體移動速度（像素/秒），防止追蹤異常導致爆衝
+    config：風險參數（None 則使用模組共用的 get_risk_config()）
     """
-    jump_threshold = risk_config['speed']['jump_threshold']
-    max_speed = risk_config['speed']['max_speed']
+    config = get_risk_config() if config is None else config
+    jump_threshold = config['speed']['jump_threshold']
+    max_speed = config['speed']['max_speed']
 
     history = object_history.get(track_id)
 
@@ -75,35 +98,47 @@ def compute_speed(track_id, current_center, object_history, fps=30):
     return speed, is_jump, smoothed_center, vx
 
 
-# 全域記憶每個物體的靜止幀數
-static_counter = defaultdict(int)
+def reset_risk_state():
+    """清空所有物件的滯留 / 靜止計數（切換影片 / 分段處理時使用，追蹤 ID 會重新從頭編號）"""
+    track_states.reset()
+
 
-def decay_static_score(track_id, score, speed, config):
+def decay_static_score(track_id, score, speed, config, store=None):
+    store = track_states if store is None else store
+    slot = store.slot(track_id)
     if speed < config['decay']['speed_threshold']:
-        static_counter[track_id] += 1
-        if static_counter[track_id] >= config['decay']['decay_frame_threshold']:
+        store.static[slot] += 1
+        if store.static[slot] >= config['decay']['decay_frame_threshold']:
             score *= config['decay']['decay_rate']
     else:
-        static_counter[track_id] = 0  # 一動就歸零
+        store.static[slot] = 0  # 一動就歸零
     
-    print(f"[Decay Triggered] ID={track_id}, static_frame={static_counter[track_id]}, score={score:.2f}")
+    log.debug("risk.decay", "[Decay Triggered] ID={track_id}, static_frame={static_frame}, score={score:.2f}",
+              track_id=track_id, static_frame=int(store.static[slot]), score=float(score))
     return score
 
 
-def analyze_risk(track_id, center, roi_level, speed, is_jump, vx=0):
-    state = object_state[track_id]
+def analyze_risk(track_id, center, roi_level, speed, is_jump, vx=0, store=None, config=None):
+    """
+    store：TrackStateStore（None 則使用模組共用的 track_states）
+    config：風險參數（None 則使用模組共用的 get_risk_config()）
+    """
+    store = track_states if store is None else store
+    risk_config = get_risk_config() if config is None else config
+    slot = store.slot(track_id)
+    level_code = ZONE_CODES[roi_level]
 
-    if roi_level != state["last_level"]:
-        state["stay_counter"] = 1
+    if level_code != store.last_level[slot]:
+        store.stay[slot] = 1
     else:
         if not is_jump:
-            state["stay_counter"] += 1
+            store.stay[slot] += 1
         elif risk_config['id_stability']['decay_on_jump']:
             decay = risk_config['id_stability']['decay_rate']
-            state["stay_counter"] = max(1, state["stay_counter"] - decay)
+            store.stay[slot] = max(1, store.stay[slot] - decay)
 
-    state["last_level"] = roi_level
-    stay = state["stay_counter"]
+    store.last_level[slot] = level_code
+    stay = store.stay[slot]
 
     # 讀參數
     gamma = risk_config['speed']['gamma']
@@ -118,7 +153,7 @@ def analyze_risk(track_id, center, roi_level, speed, is_jump, vx=0):
     score = base + stay_weight * stay + gamma * log_speed + 0.5 * abs(vx)
 
     # 衰退處理（分級前）
-    score = decay_static_score(track_id, score, speed, risk_config)
+    score = decay_static_score(track_id, score, speed, risk_config, store)
 
     # 分級邏輯
     if score > risk_config['score_threshold']['high']:
@@ -128,27 +163,69 @@ def analyze_risk(track_id, center, roi_level, speed, is_jump, vx=0):
     else:
         level = "low"
     
-    print(f"[track_id: {track_id}] ROI={roi_level}, stay={stay}, speed={speed:.2f}, score={score:.2f}, level={level}")
+    log.debug("risk.track", "[track_id: {track_id}] ROI={roi}, stay={stay}, speed={speed:.2f}, score={score:.2f}, level={level}",
+              track_id=track_id, roi=roi_level, stay=float(stay), speed=float(speed), score=float(score), level=level)
 
     return score, level, stay
 
 
-def draw_risk_overlay(frame, risky_objects, roi_dict):
-    """畫出 high 區風險框 + side_right 橘色區塊"""
+class RiskEngine:
+    """
+    一路影像的風險分析狀態（風險參數 + TrackStateStore）集中在一個實例
+
+    - 每個 LaneTracker / 每路影像各自一個，多執行緒 / 多行程平行處理時互不干擾
+    - 只包含參數 dict 與 NumPy 陣列，可直接 pickle；reset() 清空所有追蹤物件
+    """
+
+    def __init__(self, config=None, store=None):
+        self.config = get_risk_config() if config is None else config
+        self.store = store if store is not None else TrackStateStore.from_config(self.config.get('track_state', {}))
+
+    def reset(self):
+        self.store.reset()
+
+    def tick(self, frame=None):
+        return self.store.tick(frame)
+
+    def compute_speed(self, track_id, center, fps=30):
+        """記錄中心點並計算速度，回傳 (speed, is_jump, smoothed_center, vx)"""
+        self.store.history[track_id].append(center)
+        return compute_speed(track_id, center, self.store.history, fps=fps, config=self.config)
+
+    def analyze(self, track_id, center, roi_level, speed, is_jump, vx=0):
+        """回傳 (score, level, stay, slot)"""
+        score, level, stay = analyze_risk(track_id, center, roi_level, speed, is_jump, vx,
+                                          store=self.store, config=self.config)
+        return score, level, stay, self.store.slot(track_id)
+
+    def smooth(self, slots, scores):
+        """整幀一次寫入分數歷史並取平滑分數，再依門檻分級，回傳 (平滑分數, 等級)"""
+        self.store.push_scores(slots, scores)
+        smoothed_scores = self.store.mean_scores(slots)
+        thresholds = self.config['score_threshold']
+        levels = np.where(smoothed_scores > thresholds['high'], "high",
+                          np.where(smoothed_scores > thresholds['mid'], "mid", "low"))
+        return smoothed_scores, levels
 
-    # 畫 side_right 色塊（橘色）
-    if "side_right" in roi_dict:
-        overlay = frame.copy()
-        cv2.fillPoly(overlay, [roi_dict["side_right"]], color=(0, 165, 255))  # 橘色 BGR
-        alpha = 0.4
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
 
-    # 畫 side_left 色塊（橘色）
-    if "side_left" in roi_dict:
-        overlay = frame.copy()
-        cv2.fillPoly(overlay, [roi_dict["side_left"]], color=(0, 165, 255))
-        alpha = 0.4
-        cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+# 切入區色塊合成器（同一組 ROI 幾何只建立一次合成圖層）
+risk_compositor = OverlayCompositor()
+
+def risk_zone_steps(roi_dict):
+    """side_right / side_left 橘色區塊的合成步驟（給 OverlayCompositor）"""
+    sides = [(roi_dict[name], (0, 165, 255)) for name in ("side_right", "side_left") if name in roi_dict]  # 橘色 BGR
+    return [("blend", sides, 0.4)] if sides else []
+
+
+def draw_risk_overlay(frame, risky_objects, roi_dict, draw_zones=True, compositor=None):
+    """
+    畫出 high 區風險框 + side_right / side_left 橘色區塊（draw_zones=False 時只畫風險框）
+    色塊直接合成在 frame 上；已在別處與車道色塊一起合成時傳 draw_zones=False
+    """
+
+    if draw_zones:
+        compositor = risk_compositor if compositor is None else compositor
+        compositor.compose(frame, risk_zone_steps(roi_dict), dst=frame)
 
     for (x1, y1, x2, y2, track_id, risk_score, risk_level) in risky_objects:
         if risk_level in ["high", "side_right", "side_left"]:
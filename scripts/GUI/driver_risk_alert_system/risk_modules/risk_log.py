@@ -0,0 +1,49 @@
+"""
+risk_modules 的紀錄介面（只依賴標準函式庫 logging，risk_modules 可單獨匯入）
+
+呼叫方式與上一層的 telemetry 相同：log.debug("risk.track", "[track_id: {track_id}] ...", track_id=3)
+- 紀錄送到 logging.getLogger("risk_modules")；未啟用的等級在呼叫端直接略過，不建立紀錄
+- 樣板與欄位原樣放在 LogRecord 上（category / fields），訊息只有在被輸出時才格式化
+- 在 GUI / 管線中由 telemetry 掛上 handler 轉成結構化紀錄（取樣、限流、JSONL 都沿用 telemetry 設定）
+"""
+import logging
+
+logger = logging.getLogger("risk_modules")
+
+
+class _Message:
+    """延遲格式化的訊息：str() 時才執行 message.format(**fields)"""
+
+    __slots__ = ("template", "fields")
+
+    def __init__(self, template, fields):
+        self.template = template
+        self.fields = fields
+
+    def __str__(self):
+        try:
+            return self.template.format(**self.fields)
+        except (KeyError, IndexError, ValueError):
+            return self.template
+
+
+class _RiskLog:
+    def emit(self, level, category, message, /, **fields):
+        if logger.isEnabledFor(level):
+            logger.log(level, _Message(message, fields), extra={"category": category, "fields": fields})
+
+    def debug(self, category, message, /, **fields):
+        if logger.isEnabledFor(logging.DEBUG):
+            self.emit(logging.DEBUG, category, message, **fields)
+
+    def info(self, category, message, /, **fields):
+        self.emit(logging.INFO, category, message, **fields)
+
+    def warning(self, category, message, /, **fields):
+        self.emit(logging.WARNING, category, message, **fields)
+
+    def error(self, category, message, /, **fields):
+        self.emit(logging.ERROR, category, message, **fields)
+
+
+log = _RiskLog()
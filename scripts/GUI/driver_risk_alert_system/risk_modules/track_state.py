@@ -0,0 +1,202 @@
+import numpy as np
+
+# ROI 區域名稱 ↔ 整數代碼（-1 代表尚未進入任何區域）
+ZONE_CODES = {"high": 0, "side_right": 1, "side_left": 2, "mid": 3, "low": 4}
+
+
+class TrackStateStore:
+    """
+    所有追蹤物件的跨幀狀態，集中存成固定大小的 NumPy 陣列（struct-of-arrays）
+
+    - 取代原本散落各處、只增不減的 defaultdict（滯留計數、靜止幀數、中心點歷史、分數歷史、提醒紀錄）
+    - 追蹤 ID 對應到一個槽位（slot）；tick(frame) 時淘汰超過 ttl_frames 沒出現的 ID，
+      槽位用完時淘汰最久沒出現的 ID（LRU），長時間行車記憶體維持固定
+    - push_scores / mean_scores 可一次處理整幀所有物件
+    """
+
+    def __init__(self, capacity=256, ttl_frames=90, history_len=5, score_window=10):
+        self.capacity = capacity
+        self.ttl_frames = ttl_frames
+        self.history_len = history_len
+        self.score_window = score_window
+
+        self.active = np.zeros(capacity, dtype=bool)
+        self.last_seen = np.zeros(capacity, dtype=np.int64)
+        # 風險滯留（analyze_risk）
+        self.last_level = np.full(capacity, -1, dtype=np.int8)
+        self.stay = np.zeros(capacity, dtype=np.float64)
+        # 靜止幀數（decay_static_score）
+        self.static = np.zeros(capacity, dtype=np.int32)
+        # 中心點歷史（環狀）
+        self.centers = np.zeros((capacity, history_len, 2), dtype=np.int32)
+        self.center_count = np.zeros(capacity, dtype=np.int32)
+        self.center_head = np.zeros(capacity, dtype=np.int32)
+        # 風險分數歷史（環狀，供平滑）
+        self.scores = np.zeros((capacity, score_window), dtype=np.float64)
+        self.score_count = np.zeros(capacity, dtype=np.int32)
+        self.score_head = np.zeros(capacity, dtype=np.int32)
+        # 語音提醒紀錄（should_warn）
+        self.last_warn = np.zeros(capacity, dtype=np.float64)
+        self.yellow_warned = np.zeros(capacity, dtype=bool)
+
+        self._slots = {}                         # 追蹤 ID → 槽位
+        self._keys = [None] * capacity           # 槽位 → 追蹤 ID
+        self._free = list(range(capacity - 1, -1, -1))
+        self.frame = 0
+        self.history = CenterHistory(self)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(capacity=config.get('capacity', 256),
+                   ttl_frames=config.get('ttl_frames', 90))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def reset(self):
+        """清空所有追蹤物件（切換影片 / 分段處理時使用）"""
+        for slot in list(self._slots.values()):
+            self._release(slot)
+        self.frame = 0
+
+    def reset_warnings(self):
+        self.last_warn[:] = 0.0
+        self.yellow_warned[:] = False
+
+    def tick(self, frame=None):
+        """進入新的一幀：淘汰超過 ttl_frames 沒出現的追蹤 ID，回傳淘汰數量"""
+        self.frame = self.frame + 1 if frame is None else frame
+        stale = np.flatnonzero(self.active & (self.last_seen < self.frame - self.ttl_frames))
+        for slot in stale:
+            self._release(int(slot))
+        return len(stale)
+
+    def slot(self, key):
+        """取得追蹤 ID 的槽位（新 ID 自動配置），並記錄本幀有出現"""
+        slot = self._slots.get(key)
+        if slot is None:
+            if not self._free:
+                # 槽位用完：淘汰最久沒出現的 ID
+                lru = np.where(self.active, self.last_seen, np.iinfo(np.int64).max)
+                self._release(int(np.argmin(lru)))
+            slot = self._free.pop()
+            self._slots[key] = slot
+            self._keys[slot] = key
+            self.active[slot] = True
+        self.last_seen[slot] = self.frame
+        return slot
+
+    def peek(self, key):
+        """查詢槽位但不配置、不更新 last_seen；不存在回傳 None"""
+        return self._slots.get(key)
+
+    def _release(self, slot):
+        del self._slots[self._keys[slot]]
+        self._keys[slot] = None
+        self.active[slot] = False
+        self.last_level[slot] = -1
+        self.stay[slot] = 0
+        self.static[slot] = 0
+        self.center_count[slot] = 0
+        self.center_head[slot] = 0
+        self.scores[slot] = 0.0
+        self.score_count[slot] = 0
+        self.score_head[slot] = 0
+        self.last_warn[slot] = 0.0
+        self.yellow_warned[slot] = False
+        self._free.append(slot)
+
+    # ---- 中心點歷史 ----
+    def push_center(self, slot, center):
+        head = self.center_head[slot]
+        self.centers[slot, head] = center
+        self.center_head[slot] = (head + 1) % self.history_len
+        self.center_count[slot] = min(self.center_count[slot] + 1, self.history_len)
+
+    def last_center(self, slot):
+        if self.center_count[slot] == 0:
+            return None
+        x, y = self.centers[slot, (self.center_head[slot] - 1) % self.history_len]
+        return (int(x), int(y))
+
+    # ---- 風險分數歷史（向量化）----
+    def push_scores(self, slots, scores):
+        slots = np.asarray(slots, dtype=np.intp)
+        heads = self.score_head[slots]
+        self.scores[slots, heads] = scores
+        self.score_head[slots] = (heads + 1) % self.score_window
+        self.score_count[slots] = np.minimum(self.score_count[slots] + 1, self.score_window)
+
+    def mean_scores(self, slots):
+        """各槽位最近 score_window 筆分數的平均（與 deque(maxlen) + np.mean 相同）"""
+        slots = np.asarray(slots, dtype=np.intp)
+        counts = self.score_count[slots]
+        # 環狀緩衝區未滿時，尚未寫入的位置為 0，不影響總和
+        return self.scores[slots].sum(axis=1) / np.maximum(counts, 1)
+
+
+class CenterHistory:
+    """
+    讓 compute_speed 沿用原本 `object_history` 字典介面（get / [] / append）的轉接層，
+    實際資料存在 TrackStateStore 的中心點環狀陣列
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def get(self, key, default=None):
+        slot = self._store.peek(key)
+        if slot is None or self._store.center_count[slot] == 0:
+            return default
+        return _CenterRing(self._store, slot)
+
+    def __getitem__(self, key):
+        return _CenterRing(self._store, self._store.slot(key))
+
+    def __setitem__(self, key, centers):
+        ring = self[key]
+        ring.clear()
+        for center in centers:
+            ring.append(center)
+
+    def __contains__(self, key):
+        return key in self._store
+
+    def clear(self):
+        self._store.center_count[:] = 0
+        self._store.center_head[:] = 0
+
+
+class _CenterRing:
+    __slots__ = ("_store", "_slot")
+
+    def __init__(self, store, slot):
+        self._store = store
+        self._slot = slot
+
+    def __len__(self):
+        return int(self._store.center_count[self._slot])
+
+    def __getitem__(self, i):
+        n = len(self)
+        if not -n <= i < n:
+            raise IndexError("center history index out of range")
+        i %= n
+        store = self._store
+        oldest = (store.center_head[self._slot] - n) % store.history_len
+        x, y = store.centers[self._slot, (oldest + i) % store.history_len]
+        return (int(x), int(y))
+
+    def append(self, center):
+        self._store.push_center(self._slot, center)
+
+    def clear(self):
+        self._store.center_count[self._slot] = 0
+        self._store.center_head[self._slot] = 0
+
+
+# 模組層級的共用狀態（沿用舊版全域 dict 行為的呼叫端使用）；LaneTracker 每個實例各自一份
+track_states = TrackStateStore()
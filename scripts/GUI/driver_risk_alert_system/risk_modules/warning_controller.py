@@ -1,24 +1,46 @@
-from collections import defaultdict
+from risk_modules.track_state import track_states
 
-last_warn_time = defaultdict(float)
-yellow_warned = set()
+# 每個追蹤 ID 的上次提醒時間 / 是否已黃色提醒，存在 TrackStateStore（ID 過期時一併淘汰）
 
-def should_warn(track_id, now, level, score, stay_duration, config):
+def reset_warning_state():
+    """清空提醒紀錄（切換影片 / 分段處理時使用）"""
+    track_states.reset_warnings()
+
+def should_warn(track_id, now, level, score, stay_duration, config, store=None):
+    store = track_states if store is None else store
+    slot = store.slot(track_id)
     score_thresholds = {
         'yellow': config['warning']['yellow_score_threshold'],
         'red': config['warning']['red_score_threshold']
     }
 
     if level == 'yellow':
-        if score >= score_thresholds['yellow'] and track_id not in yellow_warned:
-            yellow_warned.add(track_id)
+        if score >= score_thresholds['yellow'] and not store.yellow_warned[slot]:
+            store.yellow_warned[slot] = True
             return True
         return False
 
     if level == 'red' and score >= score_thresholds['red']:
         interval = max(0.5, 2.0 - stay_duration * 0.1)
-        if now - last_warn_time[track_id] > interval:
-            last_warn_time[track_id] = now
+        if now - store.last_warn[slot] > interval:
+            store.last_warn[slot] = now
             return True
 
     return False
+
+
+class WarningEngine:
+    """
+    一路影像的語音提醒決策（參數 + 提醒紀錄所在的 TrackStateStore）
+    與 RiskEngine 共用同一個 store，追蹤 ID 過期時提醒紀錄一併淘汰
+    """
+
+    def __init__(self, config, store):
+        self.config = config
+        self.store = store
+
+    def reset(self):
+        self.store.reset_warnings()
+
+    def should_warn(self, track_id, now, level, score, stay_duration):
+        return should_warn(track_id, now, level, score, stay_duration, self.config, store=self.store)
@@ -0,0 +1,119 @@
+import numpy as np
+
+# 與 get_roi_level_bbox 相同的判斷優先順序
+ZONE_PRIORITY = ("high", "side_right", "side_left", "mid", "low")
+
+
+def _triangulate(polygons):
+    """
+    把 (L, V, 2) 的區域多邊形拆成三角形（扇形拆分），三角形一定是凸的，分離軸判斷才會精確
+    車道線交叉時 ROI 四邊形可能是凹的，這時改以凹點為扇形中心
+    回傳 (L, V-2, 3, 2) 的三角形與 (L, V-2) 的有號面積（×2）
+    """
+    n = polygons.shape[1]
+    x, y = polygons[..., 0], polygons[..., 1]
+    area = np.sum(x * np.roll(y, -1, axis=1) - y * np.roll(x, -1, axis=1), axis=1)
+    prev_edge = polygons - np.roll(polygons, 1, axis=1)
+    next_edge = np.roll(polygons, -1, axis=1) - polygons
+    turns = prev_edge[..., 0] * next_edge[..., 1] - prev_edge[..., 1] * next_edge[..., 0]
+    reflex = turns * np.sign(area)[:, None] < 0
+    # 凸多邊形從第 0 點拆；恰有一個凹點時從凹點拆；自相交（蝴蝶結形）沒有合理拆法，同樣退回第 0 點
+    k = np.where(reflex.sum(axis=1) == 1, np.argmax(reflex, axis=1), 0)
+    order = (k[:, None] + np.arange(n)) % n                                          # (L, V)
+    fan = np.stack([np.zeros(n - 2, dtype=int), np.arange(1, n - 1), np.arange(2, n)], axis=1)
+    triangles = np.take_along_axis(polygons, order[:, fan.reshape(-1), None], axis=1)
+    triangles = triangles.reshape(len(polygons), n - 2, 3, 2)
+    a, b, c = triangles[..., 0, :], triangles[..., 1, :], triangles[..., 2, :]
+    areas = (b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) - (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0])
+    return triangles, areas
+
+
+class ZoneClassifier:
+    """
+    一次判斷整幀所有追蹤框落在哪個 ROI 區域（取代逐框呼叫 cv2.intersectConvexConvex）
+
+    - 每個區域先拆成三角形，以分離軸定理（SAT）批次判斷：軸為 x / y 軸加上三角形的邊法向量，
+      只要任一軸上投影不重疊（含剛好貼邊）就沒有交集，與「交集面積 > 0」的定義一致
+    - 區域幾何（邊法向量、投影範圍）依 ROI 頂點快取；車道沿用上一幀時 ROI 不變，直接重用
+    - 面積為 0 的退化區域（例如 low 區被畫面上緣壓扁）與面積為 0 的框視為沒有交集
+    """
+
+    def __init__(self, priority=ZONE_PRIORITY):
+        self.priority = tuple(priority)
+        self._geometry_key = None
+        self._geometry = None
+
+    def prepare(self, roi_dict):
+        """區域幾何（依 ROI 頂點快取）；可存起來傳給 classify(geometry=...) 重複使用，沒有有效區域時回傳 None"""
+        levels = [level for level in self.priority if level in roi_dict]
+        key = tuple((level, np.asarray(roi_dict[level]).tobytes()) for level in levels)
+        if key == self._geometry_key:
+            return self._geometry
+
+        geometry = None
+        polygons = [np.asarray(roi_dict[level], dtype=np.float64).reshape(-1, 2) for level in levels]
+        if polygons and len({len(polygon) for polygon in polygons}) == 1 and len(polygons[0]) >= 3:
+            # 各區域頂點數相同（四邊形），一次拆完全部區域；面積為 0 的三角形捨去
+            triangles, areas = _triangulate(np.stack(polygons))
+            keep = areas != 0
+            zone_keep = keep.any(axis=1)
+            names = [level for level, ok in zip(levels, zone_keep) if ok]
+            owners = np.repeat(np.arange(len(names)), keep[zone_keep].sum(axis=1))
+            triangles = triangles[keep]                                              # (T, 3, 2)
+        else:
+            triangles = []
+
+        if len(triangles):
+            edges = np.roll(triangles, -1, axis=1) - triangles
+            normals = np.stack([-edges[..., 1], edges[..., 0]], axis=-1)              # (T, 3, 2)
+            projections = np.einsum('tvd,tkd->tvk', normals, triangles)               # (T, 軸, 頂點)
+            geometry = {
+                "names": names,
+                "owners": owners,
+                "normals": normals,
+                "tri_min": projections.min(axis=2),
+                "tri_max": projections.max(axis=2),
+                "tri_lo": triangles.min(axis=1),                                      # (T, 2) x / y 範圍
+                "tri_hi": triangles.max(axis=1),
+            }
+
+        self._geometry_key = key
+        self._geometry = geometry
+        return geometry
+
+    def classify(self, boxes, roi_dict, geometry=None):
+        """
+        boxes：(N, 4) 的 [x1, y1, x2, y2]
+        geometry：prepare(roi_dict) 的結果（ROI 沿用上一幀時由呼叫端快取，省去比對頂點）
+        回傳長度 N 的 list，每個元素為區域名稱或 None（依 priority 取第一個有交集的區域）
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        geometry = self.prepare(roi_dict) if geometry is None else geometry
+        if geometry is None or len(boxes) == 0:
+            return [None] * len(boxes)
+
+        lo = np.minimum(boxes[:, :2], boxes[:, 2:])                                   # (N, 2)
+        hi = np.maximum(boxes[:, :2], boxes[:, 2:])
+        valid = np.all(hi > lo, axis=1)
+
+        # x / y 軸：外接矩形重疊
+        hits = valid[:, None] & np.all((hi[:, None, :] > geometry["tri_lo"][None]) &
+                                       (geometry["tri_hi"][None] > lo[:, None, :]), axis=2)   # (N, T)
+
+        # 三角形邊法向量：框的投影範圍 = 中心投影 ± 半寬 · |法向量|
+        center = (lo + hi) * 0.5
+        half = (hi - lo) * 0.5
+        normals = geometry["normals"]
+        c = np.einsum('nd,tvd->ntv', center, normals)
+        r = np.einsum('nd,tvd->ntv', half, np.abs(normals))
+        hits &= np.all((c + r > geometry["tri_min"][None]) & (geometry["tri_max"][None] > c - r), axis=2)
+
+        # 三角形 → 區域：同一區域的三角形在 owners 中連續排列
+        names = geometry["names"]
+        owners = geometry["owners"]
+        starts = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        zone_hits = np.logical_or.reduceat(hits, starts, axis=1)                      # (N, L)
+
+        first = np.argmax(zone_hits, axis=1)
+        found = zone_hits[np.arange(len(boxes)), first]
+        return [names[i] if ok else None for i, ok in zip(first, found)]
@@ -0,0 +1,258 @@
+"""
+非同步、分段輪替的標註影片輸出
+
+- write(frame) 只把影像複製進預先配置的槽位並排入有界佇列，編碼（VideoWriter.write）在背景執行緒進行，
+  不再佔用 sink 階段的時間
+- 佇列滿時依 drop_policy 處理：oldest 丟掉最舊的待寫幀、newest 丟掉這一幀、block 等待（離線用，不掉幀）
+- 依影片長度（segment_seconds）或檔案大小（segment_mb）切成多個檔案：lane_20240101-120000_000.mp4、..._001.mp4
+- 可指定編碼（fourcc）與輸出解析度（縮放在背景執行緒做）
+- 指定 source_fps 並在 write() 傳入來源幀號時，依來源時間軸維持固定的輸出幀率：調節器執行期改變 frame_skip 時
+  重複寫入（間隔變大）或略過（間隔變小）幀，影片播放速度不會跟著改變
+- AsyncFrameSink 是佇列 / 槽位 / 背景執行緒的共用部分，事件觸發片段錄影（clip_recorder）也建在它上面
+
+用法：
+    writer = SegmentedVideoWriter.from_config(risk_config['recording'], "recordings/lane.mp4", fps=6, source_fps=30)
+    writer.write(annotated_frame, source_frame=packet.idx)
+    writer.close()   # 寫完佇列中剩下的幀再關檔
+"""
+import os
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from telemetry import telemetry
+
+DROP_POLICIES = ("oldest", "newest", "block")
+
+
+def segment_path(path, suffix):
+    """recordings/lane.mp4 + "20240101-120000_000" → recordings/lane_20240101-120000_000.mp4（並建立資料夾）"""
+    root, ext = os.path.splitext(path)
+    path = f"{root}_{suffix}{ext or '.mp4'}"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    return path
+
+
+class AsyncFrameSink:
+    """
+    背景執行緒處理影像的共用部分：預先配置的影像槽位 + 有界佇列 + 丟幀策略
+    子類別實作 _consume(frame, meta, repeat)（背景執行緒，每幀一次，repeat 為該幀在輸出中佔幾幀）與 _finish()（結束時一次）
+    """
+
+    name = "frame-sink"
+
+    def __init__(self, fps, resolution=None, queue_size=32, drop_policy="oldest", source_fps=None):
+        """
+        - resolution：(寬, 高)；None 代表與輸入幀相同
+        - queue_size：待寫佇列長度（同時也是預先配置的影像槽位數）
+        - source_fps：來源影片幀率；指定時 write() 依 source_frame 換算每幀要寫幾次（None 代表每幀寫一次）
+        """
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unsupported drop policy: {drop_policy}")
+        self.fps = max(float(fps), 1.0)
+        self.source_fps = float(source_fps) if source_fps else None
+        self.resolution = tuple(resolution) if resolution else None
+        self.queue_size = max(int(queue_size), 1)
+        self.drop_policy = drop_policy
+
+        self.written = 0
+        self.dropped = 0
+        self.duplicated = 0   # 來源間隔大於輸出間隔時重複寫入的幀數
+        self.skipped = 0      # 來源間隔小於輸出間隔時略過的幀數
+        self._origin = None   # 第一幀的來源幀號
+        self._due = 0         # 到目前為止輸出應有的幀數
+        self._pending = deque()
+        self._free = []       # 可重複使用的影像槽位（佇列長度 + 1 個，多的一個給背景執行緒正在處理的幀）
+        self._slots = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._resized = None
+        self._thread = threading.Thread(target=self._worker, name=self.name, daemon=True)
+        self._thread.start()
+
+    # ---- 呼叫端（sink 階段）----
+    def write(self, frame, meta=None, source_frame=None):
+        """
+        排入一幀（複製一份，呼叫端的緩衝區可立即重複使用）；meta 原樣交給 _consume；被丟棄時回傳 False
+        source_frame：來源影片中的幀號，搭配 source_fps 決定這一幀在輸出中重複幾次（0 次則略過）
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            repeat = self._repeat(source_frame)
+            if not repeat:
+                self.skipped += 1
+                return True
+            slot = self._acquire()
+            if slot is None:
+                self.dropped += 1
+                return False
+            buffer = slot[0]
+            if buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+                buffer = np.empty_like(frame)
+            np.copyto(buffer, frame)
+            self._pending.append((buffer, meta, repeat))
+            self._cond.notify_all()
+            return True
+
+    def _repeat(self, source_frame):
+        """依來源時間軸換算：到 source_frame 為止輸出應有幾幀，扣掉已排入的就是這一幀要寫的次數"""
+        if self.source_fps is None or source_frame is None:
+            return 1
+        if self._origin is None:
+            self._origin = source_frame
+        due = int((source_frame - self._origin) * self.fps / self.source_fps + 1e-6) + 1
+        repeat = max(due - self._due, 0)
+        if repeat:
+            self._due = due
+            self.duplicated += repeat - 1
+        return repeat
+
+    def _acquire(self):
+        """取一個空槽位；沒有空槽位時依 drop_policy 處理（在 self._cond 內呼叫）"""
+        if self._free:
+            return self._free.pop()
+        if self._slots <= self.queue_size:
+            self._slots += 1
+            return np.empty(0, dtype=np.uint8), None
+        if self.drop_policy == "newest":
+            return None
+        if self.drop_policy == "oldest":
+            if self._pending:
+                self.dropped += 1
+                return self._pending.popleft()
+            return None
+        while not self._free and not self._closed:
+            self._cond.wait(0.1)
+        return self._free.pop() if self._free else None
+
+    def close(self):
+        """停止接收新幀，等背景執行緒處理完佇列中剩下的幀後收尾"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "duplicated": self.duplicated,
+                "skipped": self.skipped, "pending": len(self._pending)}
+
+    # ---- 背景執行緒 ----
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait(0.5)
+                if not self._pending:
+                    break
+                slot = self._pending.popleft()
+            try:
+                self._consume(self._resize(slot[0]), slot[1], slot[2])
+            except (cv2.error, OSError) as e:
+                telemetry.error("recording", "[❌ Recording error] {error}", error=str(e), sink=self.name)
+            with self._cond:
+                self._free.append(slot)
+                self._cond.notify_all()
+        try:
+            self._finish()
+        except (cv2.error, OSError) as e:
+            telemetry.error("recording", "[❌ Recording error] {error}", error=str(e), sink=self.name)
+
+    def _resize(self, frame):
+        if not self.resolution or (frame.shape[1], frame.shape[0]) == self.resolution:
+            return frame
+        if self._resized is None or self._resized.shape[:2] != self.resolution[::-1]:
+            self._resized = np.empty((self.resolution[1], self.resolution[0]) + frame.shape[2:], dtype=frame.dtype)
+        return cv2.resize(frame, self.resolution, dst=self._resized, interpolation=cv2.INTER_AREA)
+
+    def _consume(self, frame, meta, repeat):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+
+class SegmentedVideoWriter(AsyncFrameSink):
+    """連續錄影：每一幀都寫入，依長度 / 大小分段"""
+
+    name = "video-writer"
+
+    def __init__(self, path, fps, codec="mp4v", resolution=None, segment_seconds=300, segment_mb=None,
+                 queue_size=32, drop_policy="oldest", source_fps=None):
+        """
+        - path：輸出路徑樣板，實際檔名為 <主檔名>_<開檔時間>_<段號><副檔名>
+        - segment_seconds / segment_mb：影片長度（秒，以輸出幀數 / fps 計）或檔案大小超過時換下一個檔；None 代表不限
+        """
+        self.path = path
+        self.fourcc = cv2.VideoWriter_fourcc(*codec)
+        self.segment_frames = int(segment_seconds * max(float(fps), 1.0)) if segment_seconds else None
+        self.segment_bytes = int(segment_mb * 1024 * 1024) if segment_mb else None
+        self.segments = []    # 已開啟過的檔案路徑
+        self._writer = None
+        self._failed = False   # 開檔失敗（編碼器不支援 / 無法寫入）後不再重試，之後的幀直接略過
+        self._segment_frames = 0
+        super().__init__(fps, resolution=resolution, queue_size=queue_size, drop_policy=drop_policy,
+                         source_fps=source_fps)
+
+    @classmethod
+    def from_config(cls, config, path, fps, source_fps=None):
+        return cls(path, fps,
+                   codec=config.get('codec', 'mp4v'),
+                   resolution=config.get('resolution'),
+                   segment_seconds=config.get('segment_seconds', 300),
+                   segment_mb=config.get('segment_mb'),
+                   queue_size=config.get('queue_size', 32),
+                   drop_policy=config.get('drop_policy', 'oldest'),
+                   source_fps=source_fps)
+
+    def write(self, frame, record=None, events=(), source_frame=None):
+        # 與 EventClipRecorder 相同的介面；連續錄影不需要風險紀錄與事件
+        return super().write(frame, source_frame=source_frame)
+
+    def close(self):
+        super().close()
+        telemetry.info("recording", "[🎞️ Recording] {written} frames, {dropped} dropped, {segments} segment(s)",
+                       written=self.written, dropped=self.dropped, segments=len(self.segments), path=self.path)
+
+    def stats(self):
+        return dict(super().stats(), segments=list(self.segments))
+
+    def _consume(self, frame, meta, repeat):
+        for _ in range(repeat):
+            if self._failed:
+                return
+            if self._writer is None or self._segment_full():
+                self._open(frame)
+            self._writer.write(frame)
+            self._segment_frames += 1
+            self.written += 1
+
+    def _segment_full(self):
+        if self.segment_frames and self._segment_frames >= self.segment_frames:
+            return True
+        # 檔案大小約每秒檢查一次（避免每幀 stat）
+        if self.segment_bytes and self._segment_frames % int(self.fps) == 0:
+            return os.path.getsize(self.segments[-1]) >= self.segment_bytes
+        return False
+
+    def _open(self, frame):
+        self._finish()
+        path = segment_path(self.path, f"{time.strftime('%Y%m%d-%H%M%S')}_{len(self.segments):03d}")
+        self._writer = cv2.VideoWriter(path, self.fourcc, self.fps, (frame.shape[1], frame.shape[0]))
+        if not self._writer.isOpened():
+            self._writer = None
+            self._failed = True
+            raise OSError(f"Cannot open video writer: {path}")
+        self._segment_frames = 0
+        self.segments.append(path)
+        telemetry.info("recording", "[🎞️ Recording] segment {path}", path=path)
+
+    def _finish(self):
+        if self._writer is not None:
+            self._writer.release()
+            self._writer = None
@@ -1,10 +1,20 @@
 import cv2
 import mediapipe as mp
 import numpy as np
+import threading
 import time
-import tkinter as tk
 import os # 新增
 from speech_alert_system import generate_and_play_audio # 新增
+from stage_timer import StageTimer
+from telemetry import telemetry
+from display_service import display
+# EAR / MAR 計算放在不依賴 mediapipe 的 face_metrics（效能測試也直接使用）
+from fatigue_detection.face_metrics import euclidean_distance, eye_aspect_ratio, mouth_aspect_ratio
+
+# 各階段耗時（decode、resize、facemesh、ear_mar、display）p50 / p95 / p99 匯出位置
+TIMING_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+TIMING_EXPORT_INTERVAL = 10   # 秒
+SHOW_TIMING = False           # 是否在畫面上顯示各階段耗時
 
 mp_face_mesh = mp.solutions.face_mesh
 
@@ -15,20 +25,13 @@ mp_face_mesh = mp.solutions.face_mesh
 # 移除 generate_and_play_audio_drowsiness 函式，改用 speech_alert_system 中的函式
 
 
-def euclidean_distance(a, b):
-    return np.linalg.norm(np.array(a) - np.array(b))
-
-def eye_aspect_ratio(eye_landmarks):
-    A = euclidean_distance(eye_landmarks[1], eye_landmarks[5])
-    B = euclidean_distance(eye_landmarks[2], eye_landmarks[4])
-    C = euclidean_distance(eye_landmarks[0], eye_landmarks[3])
-    return (A + B) / (2.0 * C)
+def _export_timing(stage_timer, timing_paths):
+    """匯出各階段耗時；寫檔失敗（磁碟滿 / 權限）只記錄錯誤，不中斷偵測"""
+    try:
+        stage_timer.export(**timing_paths)
+    except OSError as e:
+        telemetry.error("timing", "[❌ Timing export error] {error}", error=str(e), stream="drowsiness")
 
-def mouth_aspect_ratio(mouth_landmarks):
-    A = euclidean_distance(mouth_landmarks[13], mouth_landmarks[19])  # 上下中心
-    B = euclidean_distance(mouth_landmarks[14], mouth_landmarks[18])  # 上下兩側
-    C = euclidean_distance(mouth_landmarks[12], mouth_landmarks[16])  # 左右嘴角
-    return (A + B) / (2.0 * C)
 
 def start_drowsiness_detection(shared_alert):
     # global _last_drowsiness_alert_time # 不再需要，因為由 speech_alert_system 管理
@@ -56,6 +59,14 @@ def start_drowsiness_detection(shared_alert):
     YAWN_ALERT_COMPLETED = False  # 是否完成三次哈欠警示的標示
 
     cap = cv2.VideoCapture(0)
+    # 視窗由顯示服務的執行緒更新，按 q 時由它設定 quit_event
+    window_name = "Drowsiness and Yawning Detection"
+    quit_event = threading.Event()
+    key_handler = display.on_key(lambda key: key == ord('q') and quit_event.set())
+    stage_timer = StageTimer()
+    timing_exported_at = time.monotonic()
+    timing_paths = dict(csv_path=os.path.join(TIMING_DIR, "drowsiness_timing.csv"),
+                        prom_path=os.path.join(TIMING_DIR, "drowsiness_timing.prom"))
 
     with mp_face_mesh.FaceMesh(
         max_num_faces=1,
@@ -68,46 +79,51 @@ def start_drowsiness_detection(shared_alert):
         calibration_done = False
         calibration_start = time.time()
 
-        while cap.isOpened():
-            ret, frame = cap.read()
+        while cap.isOpened() and not quit_event.is_set():
+            with stage_timer.stage("decode"):
+                ret, frame = cap.read()
             if not ret:
                 break
 
-            frame = cv2.resize(frame, (640, 480))
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            with stage_timer.stage("resize"):
+                frame = cv2.resize(frame, (640, 480))
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-            results = face_mesh.process(rgb_frame)
+            with stage_timer.stage("facemesh"):
+                results = face_mesh.process(rgb_frame)
 
             if results.multi_face_landmarks:
                 face_landmarks = results.multi_face_landmarks[0]
 
-                h, w, _ = frame.shape
-                landmarks = [(int(lm.x * w), int(lm.y * h)) for lm in face_landmarks.landmark]
+                # 關鍵點座標 + EAR / MAR
+                with stage_timer.stage("ear_mar"):
+                    h, w, _ = frame.shape
+                    landmarks = [(int(lm.x * w), int(lm.y * h)) for lm in face_landmarks.landmark]
 
-                left_eye_indices = [33, 160, 158, 133, 153, 144]
-                right_eye_indices = [362, 385, 387, 263, 373, 380]
+                    left_eye_indices = [33, 160, 158, 133, 153, 144]
+                    right_eye_indices = [362, 385, 387, 263, 373, 380]
 
-                mouth_indices = [78, 81, 13, 311, 308, 402, 14, 87, 95, 88, 
-                                 178, 317, 82, 81, 80, 191, 88, 178, 87, 14]
+                    mouth_indices = [78, 81, 13, 311, 308, 402, 14, 87, 95, 88, 
+                                     178, 317, 82, 81, 80, 191, 88, 178, 87, 14]
 
-                left_eye = [landmarks[i] for i in left_eye_indices]
-                right_eye = [landmarks[i] for i in right_eye_indices]
-                mouth = [landmarks[i] for i in mouth_indices]
+                    left_eye = [landmarks[i] for i in left_eye_indices]
+                    right_eye = [landmarks[i] for i in right_eye_indices]
+                    mouth = [landmarks[i] for i in mouth_indices]
 
-                # 依據 MAR 計算邏輯，選擇對應點
-                mouth_mar_landmarks = {
-                    12: mouth[5],   # left corner
-                    13: mouth[2],   # upper center
-                    14: mouth[6],   # upper side
-                    16: mouth[4],   # right corner
-                    18: mouth[17],  # lower side
-                    19: mouth[19]   # lower center
-                }
+                    # 依據 MAR 計算邏輯，選擇對應點
+                    mouth_mar_landmarks = {
+                        12: mouth[5],   # left corner
+                        13: mouth[2],   # upper center
+                        14: mouth[6],   # upper side
+                        16: mouth[4],   # right corner
+                        18: mouth[17],  # lower side
+                        19: mouth[19]   # lower center
+                    }
 
-                leftEAR = eye_aspect_ratio(left_eye)
-                rightEAR = eye_aspect_ratio(right_eye)
-                ear = (leftEAR + rightEAR) / 2.0
-                mar = mouth_aspect_ratio(mouth_mar_landmarks)
+                    leftEAR = eye_aspect_ratio(left_eye)
+                    rightEAR = eye_aspect_ratio(right_eye)
+                    ear = (leftEAR + rightEAR) / 2.0
+                    mar = mouth_aspect_ratio(mouth_mar_landmarks)
 
                 if not calibration_done:
                     calibration_ears.append(ear)
@@ -120,7 +136,8 @@ def start_drowsiness_detection(shared_alert):
                         baseline_ear = np.mean(calibration_ears)
                         EAR_THRESHOLD = baseline_ear * 0.75
                         calibration_done = True
-                        print(f"[INFO] EAR calibration complete. Baseline EAR: {baseline_ear:.3f}, Threshold: {EAR_THRESHOLD:.3f}")
+                        telemetry.info("drowsiness", "[INFO] EAR calibration complete. Baseline EAR: {baseline:.3f}, Threshold: {threshold:.3f}",
+                                       baseline=float(baseline_ear), threshold=float(EAR_THRESHOLD))
                 else:
                     cv2.polylines(frame, [np.array(left_eye)], True, (0, 255, 0), 1)
                     cv2.polylines(frame, [np.array(right_eye)], True, (0, 255, 0), 1)
@@ -176,27 +193,20 @@ def start_drowsiness_detection(shared_alert):
                     cv2.putText(frame, f"Yawns: {YAWN_COUNT}", (10, 140),
                                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 0), 2)
 
-            # 顯示畫面與視窗控制
-            window_name = "Drowsiness and Yawning Detection"
-            cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-
-            root = tk.Tk()
-            root.withdraw()
-            screen_width = root.winfo_screenwidth()
-            screen_height = root.winfo_screenheight()
-            root.destroy()
+            if SHOW_TIMING:
+                stage_timer.draw(frame, origin=(10, 180), color=(255, 255, 255))
 
-            target_width = screen_width // 2
-            target_height = screen_height // 2
-            x_offset = screen_width - target_width
-            y_offset = 0
+            # 視窗大小 / 位置由 screen_layout 決定（螢幕尺寸只查一次），這裡只送出最新一幀
+            with stage_timer.stage("display"):
+                display.show(window_name, frame)
 
-            cv2.resizeWindow(window_name, target_width, target_height)
-            cv2.moveWindow(window_name, x_offset, y_offset)
-            cv2.imshow(window_name, frame)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+            if time.monotonic() - timing_exported_at >= TIMING_EXPORT_INTERVAL:
+                _export_timing(stage_timer, timing_paths)
+                timing_exported_at = time.monotonic()
 
+    _export_timing(stage_timer, timing_paths)
+    telemetry.info("timing", "[⏱️ Stages] {summary}", summary=stage_timer.format(), stages=stage_timer.summary(),
+                   stream="drowsiness")
     cap.release()
-    cv2.destroyAllWindows()
\ No newline at end of file
+    display.remove_key_handler(key_handler)
+    display.close_window(window_name)
\ No newline at end of file
@@ -0,0 +1,21 @@
+"""
+臉部關鍵點指標：眼睛長寬比（EAR）與嘴巴長寬比（MAR）
+只依賴 NumPy，不需要 mediapipe / 攝影機，可單獨匯入做效能測試
+"""
+import numpy as np
+
+
+def euclidean_distance(a, b):
+    return np.linalg.norm(np.array(a) - np.array(b))
+
+def eye_aspect_ratio(eye_landmarks):
+    A = euclidean_distance(eye_landmarks[1], eye_landmarks[5])
+    B = euclidean_distance(eye_landmarks[2], eye_landmarks[4])
+    C = euclidean_distance(eye_landmarks[0], eye_landmarks[3])
+    return (A + B) / (2.0 * C)
+
+def mouth_aspect_ratio(mouth_landmarks):
+    A = euclidean_distance(mouth_landmarks[13], mouth_landmarks[19])  # 上下中心
+    B = euclidean_distance(mouth_landmarks[14], mouth_landmarks[18])  # 上下兩側
+    C = euclidean_distance(mouth_landmarks[12], mouth_landmarks[16])  # 左右嘴角
+    return (A + B) / (2.0 * C)
@@ -7,6 +7,7 @@ import time
 from fatigue_detection.drowsiness_detection_mediapipe import start_drowsiness_detection
 #from driver_risk_alert_system.track_with_analytics import LaneTracker
 from driver_risk_alert_system.lane_tracker_module import LaneTracker
+from screen_layout import set_screen_size
 
 class DriverSafetyGUI:
     def __init__(self, root):
@@ -38,6 +39,8 @@ class DriverSafetyGUI:
 
     def run_system(self):
         shared_alert = [False]
+        # 螢幕尺寸在 Tk 主執行緒查一次，疲勞 / 車道畫面的版面由顯示服務依此擺放
+        set_screen_size(self.root.winfo_screenwidth(), self.root.winfo_screenheight())
 
         t1 = threading.Thread(target=start_drowsiness_detection, args=(shared_alert,), daemon=True)
         t2 = threading.Thread(target=LaneTracker(shared_alert).start, daemon=True)
@@ -0,0 +1,144 @@
+"""
+螢幕版面：車道追蹤與疲勞偵測畫面的位置只算一次
+
+- 螢幕尺寸只查詢一次：GUI 由 Tk 主執行緒呼叫 set_screen_size()，否則第一次需要時以暫時的 Tk root 查一次後快取
+- mode: canvas：各畫面依 tiles（螢幕比例）等比縮放後合成到同一張畫布，只開一個視窗
+- mode: windows：各畫面各自一個視窗，建立時依 tiles 放好位置與大小一次
+- 合成與視窗操作都在 display_service 的顯示執行緒進行，處理迴圈不做任何視窗管理
+"""
+import threading
+
+import cv2
+import numpy as np
+
+LAYOUT_MODES = ("canvas", "windows")
+DEFAULT_SCREEN = (1280, 720)
+# 視窗名稱 → (x, y, 寬, 高)，皆為螢幕寬高的比例：車道畫面在左上、疲勞偵測在右上（與原本疲勞視窗的位置相同）
+DEFAULT_TILES = {
+    "Tracked Video": (0.0, 0.0, 0.5, 0.5),
+    "Drowsiness and Yawning Detection": (0.5, 0.0, 0.5, 0.5),
+}
+
+_screen_lock = threading.Lock()
+_screen_size = None
+
+
+def set_screen_size(width, height):
+    """由擁有 Tk 主迴圈的執行緒提供螢幕尺寸（例如 root.winfo_screenwidth()），之後不再查詢"""
+    global _screen_size
+    with _screen_lock:
+        _screen_size = (int(width), int(height))
+
+
+def screen_size():
+    """螢幕尺寸 (寬, 高)：沒有設定過時以暫時的 Tk root 查一次（無顯示器時用 DEFAULT_SCREEN）"""
+    global _screen_size
+    with _screen_lock:
+        if _screen_size is None:
+            try:
+                import tkinter as tk
+                root = tk.Tk()
+                root.withdraw()
+                _screen_size = (root.winfo_screenwidth(), root.winfo_screenheight())
+                root.destroy()
+            except Exception:
+                _screen_size = DEFAULT_SCREEN
+        return _screen_size
+
+
+class ScreenLayout:
+    def __init__(self, mode="canvas", window_name="Driver Mind AI", tiles=None, screen=None):
+        """
+        - tiles：{視窗名稱: (x, y, 寬, 高)}，螢幕比例；不在 tiles 中的視窗照常各自顯示
+        - screen：(寬, 高)；None 代表使用 screen_size()
+        """
+        if mode not in LAYOUT_MODES:
+            raise ValueError(f"Unsupported layout mode: {mode}")
+        self.mode = mode
+        self.window_name = window_name
+        self.tiles = {name: tuple(rect) for name, rect in (tiles or DEFAULT_TILES).items()}
+        self._screen = tuple(screen) if screen else None
+        self._rects = None
+        self._fits = {}       # (視窗名稱, 來源寬高) → 等比縮放後在畫布上的 (x, y, w, h)
+        self._scratch = {}
+        self.canvas = None
+        self.canvas_origin = (0, 0)
+        self._active = ()
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(mode=config.get('mode', 'canvas'),
+                   window_name=config.get('window_name', 'Driver Mind AI'),
+                   tiles=config.get('tiles'))
+
+    def rects(self):
+        """各視窗在螢幕上的像素位置 (x, y, w, h)（第一次呼叫時才查詢螢幕尺寸）"""
+        if self._rects is None:
+            width, height = self._screen or screen_size()
+            self._rects = {name: (int(x * width), int(y * height), int(w * width), int(h * height))
+                           for name, (x, y, w, h) in self.tiles.items()}
+        return self._rects
+
+    def placement(self, name):
+        """windows 模式下視窗的 ((寬, 高), (x, y))；不在版面中的視窗回傳 None"""
+        rect = self.rects().get(name)
+        if rect is None:
+            return None
+        x, y, w, h = rect
+        return (w, h), (x, y)
+
+    def composes(self, name):
+        return self.mode == "canvas" and name in self.tiles
+
+    # ---- canvas 模式（顯示執行緒）----
+    def arrange(self, active):
+        """
+        依目前有畫面的視窗決定畫布範圍（這些視窗外接矩形）；組合改變時重建畫布，
+        回傳畫布視窗的 ((寬, 高), (x, y))，沒有改變時回傳 None
+        """
+        active = tuple(name for name in self.tiles if name in active)
+        if active == self._active:
+            return None
+        self._active = active
+        if not active:
+            self.canvas = None
+            return None
+        rects = [self.rects()[name] for name in active]
+        x0 = min(x for x, _, _, _ in rects)
+        y0 = min(y for _, y, _, _ in rects)
+        x1 = max(x + w for x, _, w, _ in rects)
+        y1 = max(y + h for _, y, _, h in rects)
+        self.canvas = np.zeros((y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        self.canvas_origin = (x0, y0)
+        self._fits.clear()
+        return (x1 - x0, y1 - y0), (x0, y0)
+
+    def compose(self, name, frame):
+        """把 frame 等比縮放貼到畫布上該視窗的位置（其餘畫面保留上一次的內容）"""
+        if self.canvas is None or name not in self._active:
+            return
+        key = (name, frame.shape[:2])
+        fit = self._fits.get(key)
+        if fit is None:
+            fit = self._fits[key] = self._fit(name, frame.shape)
+            x, y, w, h = self._tile_on_canvas(name)
+            self.canvas[y:y + h, x:x + w] = 0
+        x, y, w, h = fit
+        if frame.ndim == 2:
+            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+        scratch = self._scratch.get(name)
+        if scratch is None or scratch.shape[:2] != (h, w):
+            scratch = self._scratch[name] = np.empty((h, w, 3), dtype=np.uint8)
+        cv2.resize(frame, (w, h), dst=scratch, interpolation=cv2.INTER_AREA)
+        self.canvas[y:y + h, x:x + w] = scratch
+
+    def _tile_on_canvas(self, name):
+        x, y, w, h = self.rects()[name]
+        return x - self.canvas_origin[0], y - self.canvas_origin[1], w, h
+
+    def _fit(self, name, shape):
+        """保持長寬比縮放到該視窗區塊內並置中"""
+        x, y, w, h = self._tile_on_canvas(name)
+        scale = min(w / shape[1], h / shape[0])
+        fw, fh = max(int(shape[1] * scale), 1), max(int(shape[0] * scale), 1)
+        return x + (w - fw) // 2, y + (h - fh) // 2, fw, fh
@@ -8,6 +8,8 @@ import gc
 import sys 
 import traceback # 確保導入 traceback
 
+from telemetry import telemetry
+
 # --- 語音系統配置區 ---
 # 定義語音檔案的儲存資料夾名稱
 AUDIO_CACHE_DIR = "audio_cache"
@@ -52,14 +54,16 @@ def _audio_player_worker():
         try:
             try:
                 filepath, alert_type, cooldown_seconds_for_this_playback = _audio_queue.get(timeout=1)
-                print(f"[Audio Worker Debug] Fetched request: {alert_type}, file: {filepath}")
+                telemetry.debug("audio", "[Audio Worker Debug] Fetched request: {alert_type}, file: {filepath}",
+                                alert_type=alert_type, filepath=filepath)
             except queue.Empty:
                 continue 
 
             with _play_state_lock:
                 current_time = time.time()
                 if current_time - _last_played_alert_finished_time[alert_type] < cooldown_seconds_for_this_playback:
-                    print(f"[Audio Worker] Alert type '{alert_type}' is in cooldown. Skipping playback from queue.")
+                    telemetry.debug("audio", "[Audio Worker] Alert type '{alert_type}' is in cooldown. Skipping playback from queue.",
+                                    alert_type=alert_type)
                     _audio_queue.task_done()
                     continue
 
@@ -67,24 +71,26 @@ def _audio_player_worker():
                     time.sleep(0.01)
 
                 _is_playing_any_audio = True 
-                print(f"[Audio Worker] Attempting to play: {filepath} (Type: {alert_type})")
+                telemetry.debug("audio", "[Audio Worker] Attempting to play: {filepath} (Type: {alert_type})",
+                                alert_type=alert_type, filepath=filepath)
 
             try:
                 wave_obj = sa.WaveObject.from_wave_file(filepath)
-                print(f"[Audio Worker Debug] WaveObject loaded for {alert_type}.")
+                telemetry.debug("audio", "[Audio Worker Debug] WaveObject loaded for {alert_type}.", alert_type=alert_type)
                 play_obj = wave_obj.play()
-                print(f"[Audio Worker Debug] Playback started for {alert_type}.")
+                telemetry.debug("audio", "[Audio Worker Debug] Playback started for {alert_type}.", alert_type=alert_type)
                 play_obj.wait_done() 
-                print(f"[Audio Worker] Finished playing: {alert_type}")
+                telemetry.info("audio", "[Audio Worker] Finished playing: {alert_type}", alert_type=alert_type)
 
             except sa.SimpleaudioError as sa_e:
-                print(f"[Audio Worker Error] Simpleaudio playback error for {filepath}: {sa_e}")
-                traceback.print_exc(file=sys.stdout)
+                telemetry.error("audio", "[Audio Worker Error] Simpleaudio playback error for {filepath}: {error}",
+                                filepath=filepath, error=str(sa_e), traceback=traceback.format_exc())
             except FileNotFoundError:
-                print(f"[Audio Worker Error] Audio file not found during playback: {filepath}")
+                telemetry.error("audio", "[Audio Worker Error] Audio file not found during playback: {filepath}",
+                                filepath=filepath)
             except Exception as playback_e:
-                print(f"[Audio Worker Error] Unexpected error during audio playback of {filepath}: {playback_e}")
-                traceback.print_exc(file=sys.stdout)
+                telemetry.error("audio", "[Audio Worker Error] Unexpected error during audio playback of {filepath}: {error}",
+                                filepath=filepath, error=str(playback_e), traceback=traceback.format_exc())
             finally:
                 with _play_state_lock:
                     _last_played_alert_finished_time[alert_type] = time.time() 
@@ -99,8 +105,8 @@ def _audio_player_worker():
                 _audio_queue.task_done() 
 
         except Exception as e:
-            print(f"[Audio Worker Fatal Error] Unhandled exception in player worker, restarting loop: {e}")
-            traceback.print_exc(file=sys.stdout)
+            telemetry.error("audio", "[Audio Worker Fatal Error] Unhandled exception in player worker, restarting loop: {error}",
+                            error=str(e), traceback=traceback.format_exc())
             with _play_state_lock:
                 _is_playing_any_audio = False
             pass
@@ -121,36 +127,40 @@ def generate_and_play_audio(text, alert_type, cooldown_seconds=5, lang='zh-tw'):
     if _player_thread is None:
         _player_thread = threading.Thread(target=_audio_player_worker, daemon=True)
         _player_thread.start()
-        print("[Speech Alert System] Audio player worker thread started.") # 首次啟動提示
+        telemetry.info("audio", "[Speech Alert System] Audio player worker thread started.") # 首次啟動提示
 
     filepath = os.path.join(AUDIO_BASE_PATH, PRESET_AUDIO_MAP.get(alert_type))
 
     if not os.path.exists(filepath):
-        print(f"Error: Preset audio file not found at '{filepath}'. Please ensure it exists.")
+        telemetry.error("audio", "Error: Preset audio file not found at '{filepath}'. Please ensure it exists.",
+                        filepath=filepath)
         return False
 
     with _play_state_lock: 
         current_time = time.time()
 
         if current_time - _last_played_alert_finished_time[alert_type] < cooldown_seconds:
-            print(f"[{alert_type}] is in cooldown. Skipping request.")
+            telemetry.debug("audio", "[{alert_type}] is in cooldown. Skipping request.", alert_type=alert_type)
             return False
 
         if _audio_queue.full():
-            print(f"[Queue Full] Audio queue is full. Skipping request for '{alert_type}'.")
+            telemetry.info("audio", "[Queue Full] Audio queue is full. Skipping request for '{alert_type}'.",
+                           alert_type=alert_type)
             return False
 
         if _is_playing_any_audio and alert_type != "risk_high_alert":
-            print(f"[Audio Busy] Another audio is currently playing. Skipping request for '{alert_type}'.")
+            telemetry.debug("audio", "[Audio Busy] Another audio is currently playing. Skipping request for '{alert_type}'.",
+                            alert_type=alert_type)
             return False
 
     _audio_queue.put((filepath, alert_type, cooldown_seconds))
-    print(f"[Request Added] Audio request for '{alert_type}' added to queue.")
+    telemetry.info("audio", "[Request Added] Audio request for '{alert_type}' added to queue.", alert_type=alert_type)
     return True
 
 # --- 模組測試區 (僅在此檔案直接運行時執行) ---
 if __name__ == "__main__":
     print("This is speech_alert_system.py. Run this file directly for testing.")
+    telemetry.configure(echo_level="DEBUG")  # 測試時把所有語音紀錄印到終端機
 
     # ... (測試代碼與上次相同，保持不變) ...
     print("\n--- Testing 'risk_high_alert' (should repeat after finish, no overlap) ---")
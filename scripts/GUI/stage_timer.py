@@ -0,0 +1,232 @@
+"""
+各處理階段的耗時量測（perf_counter_ns），保留最近 window 筆做 p50 / p95 / p99，可匯出 CSV / Prometheus 文字檔或畫在畫面上
+
+用法：
+    timer = StageTimer()
+    with timer.stage("decode"):
+        ok, frame = cap.read()
+    detect = timer.wrap("detect", detect)        # 包裝函式（例如管線階段）
+    timer.export(csv_path="logs/stage_timing.csv", prom_path="logs/stage_timing.prom")
+
+量測本身只有兩次 perf_counter_ns 與一次陣列寫入；百分位數只在匯出 / 顯示時才計算
+"""
+import csv
+import functools
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+class _Series:
+    """單一階段最近 window 筆耗時（奈秒，環狀陣列）與累計值"""
+
+    __slots__ = ("samples", "index", "total_ns", "max_ns")
+
+    def __init__(self, window):
+        self.samples = np.zeros(window, dtype=np.int64)
+        self.index = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, ns):
+        self.samples[self.index % len(self.samples)] = ns
+        self.index += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def recent(self):
+        return self.samples[:min(self.index, len(self.samples))]
+
+
+class _Span:
+    """with timer.stage(name): 的量測區塊（每個階段名稱共用一個物件，同一階段不可同時在多個執行緒中量測）"""
+
+    __slots__ = ("_series", "_start")
+
+    def __init__(self, series):
+        self._series = series
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._series.record(time.perf_counter_ns() - self._start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class StageTimer:
+    """
+    - window：每個階段保留最近幾筆耗時計算百分位數
+    - enabled=False 時所有量測都是空操作
+    """
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self, window=512, enabled=True):
+        self.window = window
+        self.enabled = enabled
+        self._series = {}
+        self._spans = {}
+        self._summary = None
+        self._summary_time = 0.0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(window=config.get('window', 512), enabled=config.get('enabled', True))
+
+    def _get(self, name):
+        series = self._series.get(name)
+        if series is None:
+            series = self._series.setdefault(name, _Series(self.window))
+        return series
+
+    # ---- 量測 ----
+    def stage(self, name):
+        """回傳量測 name 階段的 context manager"""
+        if not self.enabled:
+            return _NULL_SPAN
+        span = self._spans.get(name)
+        if span is None:
+            span = self._spans.setdefault(name, _Span(self._get(name)))
+        return span
+
+    def record(self, name, ns):
+        """直接記錄一筆耗時（奈秒）"""
+        if self.enabled:
+            self._get(name).record(ns)
+
+    def wrap(self, name, fn):
+        """包裝函式，每次呼叫記錄一筆 name 階段耗時"""
+        if not self.enabled:
+            return fn
+        series = self._get(name)
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                series.record(time.perf_counter_ns() - start)
+        return timed
+
+    def timed(self, name):
+        """裝飾器版本的 wrap"""
+        return lambda fn: self.wrap(name, fn)
+
+    def reset(self):
+        self._series.clear()
+        self._spans.clear()
+        self._summary = None
+
+    # ---- 統計 / 匯出 ----
+    def summary(self):
+        """各階段統計（毫秒）：count、mean（全部）、p50 / p95 / p99（最近 window 筆）、max"""
+        rows = []
+        for name, series in list(self._series.items()):
+            recent = series.recent()
+            if series.index == 0:
+                continue
+            p50, p95, p99 = np.percentile(recent, self.QUANTILES) / 1e6
+            rows.append({
+                "stage": name,
+                "count": series.index,
+                "mean_ms": series.total_ns / series.index / 1e6,
+                "p50_ms": float(p50),
+                "p95_ms": float(p95),
+                "p99_ms": float(p99),
+                "max_ms": series.max_ns / 1e6,
+            })
+        return rows
+
+    def _cached_summary(self, max_age):
+        now = time.monotonic()
+        if self._summary is None or now - self._summary_time >= max_age:
+            self._summary = self.summary()
+            self._summary_time = now
+        return self._summary
+
+    def to_csv(self, path):
+        """把目前的統計附加到 CSV（每次一組帶時間戳的列，長時間行車可看出趨勢）"""
+        rows = self.summary()
+        if not rows:
+            return
+        _ensure_dir(path)
+        new_file = not os.path.exists(path)
+        timestamp = round(time.time(), 3)
+        with open(path, "a", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=["timestamp"] + list(rows[0].keys()))
+            if new_file:
+                writer.writeheader()
+            for row in rows:
+                writer.writerow({"timestamp": timestamp, **{k: round(v, 4) if isinstance(v, float) else v
+                                                            for k, v in row.items()}})
+
+    def to_prometheus(self, path, metric="driver_mind_stage_latency_seconds", labels=None):
+        """Prometheus 文字格式（summary），先寫暫存檔再取代，供 node_exporter textfile collector 讀取"""
+        rows = self.summary()
+        if not rows:
+            return
+        extra = "".join(f',{key}="{value}"' for key, value in (labels or {}).items())
+        lines = [f"# HELP {metric} Rolling per-stage processing latency.", f"# TYPE {metric} summary"]
+        for row in rows:
+            stage = f'stage="{row["stage"]}"{extra}'
+            for q in self.QUANTILES:
+                lines.append(f'{metric}{{{stage},quantile="{q / 100:g}"}} {row[f"p{q}_ms"] / 1e3:.6f}')
+            lines.append(f"{metric}_sum{{{stage}}} {row['mean_ms'] * row['count'] / 1e3:.6f}")
+            lines.append(f"{metric}_count{{{stage}}} {row['count']}")
+        _ensure_dir(path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def export(self, csv_path=None, prom_path=None, labels=None):
+        """
+        路徑中的 {pid} 會換成行程編號、{stream} 換成 labels 的 stream（沒有時為 main），
+        多行程 / 同一行程多路串流時各寫各的檔，不會互相覆寫
+        """
+        fields = {"pid": os.getpid(), "stream": (labels or {}).get("stream", "main")}
+        if csv_path:
+            self.to_csv(csv_path.format(**fields))
+        if prom_path:
+            self.to_prometheus(prom_path.format(**fields), labels=labels)
+
+    def format(self):
+        return " | ".join(f"{r['stage']} p50={r['p50_ms']:.2f} p95={r['p95_ms']:.2f} p99={r['p99_ms']:.2f}ms"
+                          for r in self.summary())
+
+    def draw(self, frame, origin=(15, 210), stages=None, color=(0, 0, 0), max_age=0.5):
+        """在畫面上列出各階段 p50 / p95（統計每 max_age 秒更新一次，不是每幀重算）"""
+        x, y = origin
+        for row in self._cached_summary(max_age):
+            if stages is not None and row["stage"] not in stages:
+                continue
+            cv2.putText(frame, f"{row['stage']}: {row['p50_ms']:.1f}/{row['p95_ms']:.1f}ms", (x, y),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.45, color, 1, cv2.LINE_AA)
+            y += 18
+        return frame
+
+
+def _ensure_dir(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
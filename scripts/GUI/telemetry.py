@@ -0,0 +1,286 @@
+"""
+非同步結構化紀錄（取代熱路徑上的 print）
+
+- 呼叫端只做等級判斷、取樣 / 限流與一次 deque.append，格式化與寫檔都在背景執行緒
+- 環狀緩衝區（capacity 筆）滿了丟最舊的紀錄，主流程不會被慢速終端機 / 磁碟卡住
+- 每筆紀錄寫成一行 JSON 到 path（依大小輪替），達 echo_level 的紀錄另外印到終端機
+- 訊息以樣板 + 欄位傳入（message.format(**fields) 在背景執行緒才做）
+- risk_modules 只用標準 logging（logger "risk_modules"），這裡掛上 handler 把它的紀錄轉進同一個緩衝區
+
+用法：
+    from telemetry import telemetry
+    telemetry.debug("risk.track", "[track_id: {track_id}] score={score:.2f}", track_id=3, score=4.2)
+    telemetry.configure(path="logs/telemetry.jsonl", level="DEBUG", sample={"risk.track": 10})
+"""
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+_LEVELS = {name: level for level, name in LEVEL_NAMES.items()}
+_OFF = ERROR + 10
+_KEEP = object()   # configure() 未傳入的欄位
+
+
+def _level(value):
+    """等級可寫成名稱（"DEBUG"）或數字；None 代表關閉"""
+    if value is None:
+        return _OFF
+    if isinstance(value, str):
+        return _LEVELS[value.upper()]
+    return int(value)
+
+
+def _json_default(value):
+    # NumPy 純量 / 陣列等非標準型別
+    if hasattr(value, "item") and getattr(value, "ndim", 1) == 0:
+        return value.item()
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+class _RateLimit:
+    """每個類別一個 token bucket：每秒補 rate 筆，最多累積 rate 筆"""
+
+    __slots__ = ("rate", "tokens", "stamp")
+
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.stamp = time.monotonic()
+
+    def allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class _RotatingJsonl:
+    """依大小輪替的 JSONL 檔（telemetry.jsonl → telemetry.jsonl.1 → ...）"""
+
+    def __init__(self, path, max_bytes, backup_count):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, lines):
+        self._file.write("".join(lines))
+        self._file.flush()
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def close(self):
+        self._file.close()
+
+
+class _LoggingBridge(logging.Handler):
+    """標準 logging 紀錄 → telemetry（risk_modules.risk_log 會附上 category / fields 與未格式化的樣板）"""
+
+    def __init__(self, sink):
+        super().__init__(level=logging.NOTSET)
+        self.sink = sink
+
+    def emit(self, record):
+        category = getattr(record, "category", record.name)
+        fields = getattr(record, "fields", None)
+        template = getattr(record.msg, "template", None)
+        if template is None:
+            self.sink.emit(record.levelno, category, record.getMessage())
+        else:
+            self.sink.emit(record.levelno, category, template, **(fields or {}))
+
+
+class Telemetry:
+    """
+    - level：寫入 JSONL 的最低等級（沒有設定 path 時不寫檔）
+    - echo_level：印到終端機的最低等級（None 表示不印）
+    - sample：{類別: N}，每 N 筆只保留 1 筆（例如每幀每個物件都會發出的紀錄）
+    - rate_limit：{類別: 每秒上限}
+    被取樣 / 限流 / 環狀緩衝區擠掉的筆數記在 stats()
+    """
+
+    def __init__(self, path=None, level=INFO, echo_level=WARNING, capacity=4096, sample=None, rate_limit=None,
+                 max_bytes=10 * 1024 * 1024, backup_count=5, flush_interval=0.5):
+        self._lock = threading.Lock()
+        self._buffer = deque(maxlen=capacity)
+        self._wake = threading.Event()
+        self._thread = None
+        self._writer = None
+        self._counts = {}
+        self._dropped = {"sampled": 0, "rate_limited": 0, "overflow": 0}
+        self.path = None
+        self.configure(path=path, level=level, echo_level=echo_level, capacity=capacity, sample=sample,
+                       rate_limit=rate_limit, max_bytes=max_bytes, backup_count=backup_count,
+                       flush_interval=flush_interval)
+
+    def configure(self, path=_KEEP, level=_KEEP, echo_level=_KEEP, capacity=_KEEP, sample=_KEEP, rate_limit=_KEEP,
+                  max_bytes=_KEEP, backup_count=_KEEP, flush_interval=_KEEP):
+        """
+        重新設定（可重複呼叫，只更新有傳入的欄位，其餘沿用目前設定）
+        path 中的 {pid} 會換成行程編號，多行程批次處理時各寫各的檔
+        """
+        self.flush()
+        with self._lock:
+            if level is not _KEEP:
+                self.level = _level(level)
+            if echo_level is not _KEEP:
+                self.echo_level = _level(echo_level)
+            if sample is not _KEEP:
+                self.sample = dict(sample or {})
+            if rate_limit is not _KEEP:
+                self._limits = {category: _RateLimit(rate) for category, rate in (rate_limit or {}).items()}
+            if max_bytes is not _KEEP:
+                self.max_bytes = max_bytes
+            if backup_count is not _KEEP:
+                self.backup_count = backup_count
+            if flush_interval is not _KEEP:
+                self.flush_interval = flush_interval
+            if capacity is not _KEEP and capacity != self._buffer.maxlen:
+                self._buffer = deque(self._buffer, maxlen=capacity)
+            if path is not _KEEP:
+                path = path.format(pid=os.getpid()) if path else None
+                if path != self.path:
+                    if self._writer is not None:
+                        self._writer.close()
+                        self._writer = None
+                    self.path = path
+            # 低於此等級的紀錄在呼叫端直接略過
+            self._threshold = min(self.level if self.path else _OFF, self.echo_level)
+        self._bridge_logging()
+
+    def _bridge_logging(self):
+        """risk_modules 的 logger 交給本紀錄器處理（等級與 telemetry 門檻一致，不再往 root logger 傳）"""
+        logger = logging.getLogger("risk_modules")
+        if not any(isinstance(handler, _LoggingBridge) and handler.sink is self for handler in logger.handlers):
+            logger.addHandler(_LoggingBridge(self))
+        logger.propagate = False
+        logger.setLevel(self._threshold)
+
+    # ---- 呼叫端（熱路徑）----
+    def enabled(self, level):
+        return level >= self._threshold
+
+    def emit(self, level, category, message=None, /, **fields):
+        if level < self._threshold:
+            return
+        every = self.sample.get(category)
+        if every and every > 1:
+            count = self._counts.get(category, 0)
+            self._counts[category] = count + 1
+            if count % every:
+                self._dropped["sampled"] += 1
+                return
+        limit = self._limits.get(category)
+        if limit is not None and not limit.allow():
+            self._dropped["rate_limited"] += 1
+            return
+
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            self._dropped["overflow"] += 1
+        buffer.append((time.time(), level, category, message, fields))
+        if self._thread is None:
+            self._start()
+        if level >= ERROR:
+            self._wake.set()
+
+    def debug(self, category, message=None, /, **fields):
+        if DEBUG >= self._threshold:
+            self.emit(DEBUG, category, message, **fields)
+
+    def info(self, category, message=None, /, **fields):
+        if INFO >= self._threshold:
+            self.emit(INFO, category, message, **fields)
+
+    def warning(self, category, message=None, /, **fields):
+        if WARNING >= self._threshold:
+            self.emit(WARNING, category, message, **fields)
+
+    def error(self, category, message=None, /, **fields):
+        if ERROR >= self._threshold:
+            self.emit(ERROR, category, message, **fields)
+
+    def stats(self):
+        return dict(self._dropped, pending=len(self._buffer))
+
+    # ---- 背景執行緒 ----
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name="telemetry", daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._drain()
+
+    def _drain(self):
+        with self._lock:
+            lines = []
+            while self._buffer:
+                ts, level, category, message, fields = self._buffer.popleft()
+                try:
+                    text = message.format(**fields) if message is not None else None
+                except (KeyError, IndexError, ValueError):
+                    text = message
+                if level >= self.echo_level:
+                    print(text if text is not None else f"[{category}] {fields}")
+                if self.path and level >= self.level:
+                    record = {"ts": round(ts, 6), "level": LEVEL_NAMES.get(level, level), "cat": category}
+                    if text is not None:
+                        record["msg"] = text
+                    record.update(fields)
+                    lines.append(json.dumps(record, ensure_ascii=False, default=_json_default) + "\n")
+            if lines:
+                try:
+                    if self._writer is None:
+                        self._writer = _RotatingJsonl(self.path, self.max_bytes, self.backup_count)
+                    self._writer.write(lines)
+                except OSError as e:
+                    print(f"[❌ Telemetry] cannot write {self.path}: {e}", file=sys.stderr)
+
+    def flush(self):
+        """把緩衝區內的紀錄立即寫出（在呼叫端執行緒）"""
+        if getattr(self, "_buffer", None) is not None and self._buffer:
+            self._drain()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+
+# 行程共用的紀錄器
+telemetry = Telemetry()
+atexit.register(telemetry.close)
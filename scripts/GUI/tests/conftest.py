@@ -0,0 +1,10 @@
+"""
+測試共用設定：與各程式直接執行時相同的匯入路徑（scripts/GUI 與 driver_risk_alert_system）
+"""
+import os
+import sys
+
+GUI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (GUI_DIR, os.path.join(GUI_DIR, "driver_risk_alert_system")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,59 @@
+import numpy as np
+
+from display_service import DisplayService, _Mailbox
+
+
+def _frame(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+def test_take_returns_latest_and_drops_unread_frames():
+    mailbox = _Mailbox()
+    assert mailbox.take() is None
+    for value in (1, 2, 3):
+        mailbox.put(_frame(value))
+    frame = mailbox.take()
+    assert frame[0, 0, 0] == 3
+    mailbox.release()
+    assert mailbox.take() is None              # 沒有新幀
+    assert (mailbox.posted, mailbox.shown) == (3, 1)
+
+
+def test_put_copies_caller_buffer():
+    mailbox = _Mailbox()
+    frame = _frame(5)
+    mailbox.put(frame)
+    frame[:] = 9                               # 呼叫端立即重複使用自己的緩衝區
+    assert mailbox.take()[0, 0, 0] == 5
+
+
+def test_writer_never_overwrites_frame_being_shown():
+    mailbox = _Mailbox()
+    mailbox.put(_frame(1))
+    shown = mailbox.take()
+    # 顯示執行緒還在用 shown 時，寫入端連續送幀只能輪流使用另外兩格
+    for value in range(2, 8):
+        mailbox.put(_frame(value))
+        assert shown[0, 0, 0] == 1
+    mailbox.release()
+    latest = mailbox.take()
+    assert latest[0, 0, 0] == 7
+    assert latest is not shown
+    mailbox.release()
+
+
+def test_buffers_are_reused_for_same_shape():
+    mailbox = _Mailbox()
+    seen = set()
+    for value in range(12):
+        mailbox.put(_frame(value))
+        seen.add(id(mailbox.take()))
+        mailbox.release()
+    assert len(seen) <= 3
+
+
+def test_show_is_ignored_when_disabled():
+    service = DisplayService(enabled=False)
+    service.show("Tracked Video", _frame(1))
+    assert service.stats() == {}
+    assert service._thread is None
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from risk_modules.ego_motion import EgoMotionEstimator
+
+
+def _textured(shift, height=240, width=320):
+    """有紋理的畫面，整張往右平移 shift 像素（模擬自車移動時的路面）"""
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 255, (height // 8, (width + 64) // 8), dtype=np.uint8)
+    base = np.kron(base, np.ones((8, 8), dtype=np.uint8))
+    image = base[:, 32 - shift:32 - shift + width]
+    return np.ascontiguousarray(np.repeat(image[:, :, None], 3, axis=2))
+
+
+@pytest.mark.parametrize("history", [2, 3])
+@pytest.mark.parametrize("downscale", [1.0, 0.5])
+def test_speed_stays_positive_after_history_fills(history, downscale):
+    # 歷史滿了之後重用的緩衝區不能是上一幀，否則光流比對兩張相同影像、速度掉到 0
+    estimator = EgoMotionEstimator(roi_top_ratio=0.0, history=history, downscale=downscale)
+    pair_speeds = []
+    for i in range(8):
+        estimator.update(_textured(2 * i))
+        latest = max(estimator._pair_cache, default=None)
+        if latest is not None:
+            pair_speeds.append(estimator._pair_cache[latest])
+    # update() 在速度過低時沿用上一次的值，所以直接檢查每一對新算出的位移
+    assert len(pair_speeds) == 7
+    assert min(pair_speeds) > 1.0
+
+
+def test_history_below_two_is_rejected():
+    with pytest.raises(ValueError):
+        EgoMotionEstimator(history=1)
+
+
+def test_pair_cache_only_keeps_pairs_in_window():
+    estimator = EgoMotionEstimator(roi_top_ratio=0.0, history=3)
+    for i in range(6):
+        estimator.update(_textured(i))
+    assert sorted(estimator._pair_cache) == [(4, 5), (5, 6)]
+
+
+def test_from_config_uses_constructor_defaults_for_missing_keys():
+    estimator = EgoMotionEstimator.from_config({"roi_top_ratio": 0.5})
+    default = EgoMotionEstimator()
+    assert estimator.roi_top_ratio == 0.5
+    assert estimator.downscale == default.downscale == 0.5
+    assert estimator.alpha == default.alpha
+
+
+def test_from_config_reads_every_knob():
+    config = {"backend": "lk", "downscale": 1.0, "alpha": 0.5, "max_fail_count": 5, "lk_quality": 0.05,
+              "lk_min_distance": 3, "lk_max_corners": 80, "lk_min_features": 20}
+    estimator = EgoMotionEstimator.from_config(config)
+    assert {key: getattr(estimator, key) for key in config} == config
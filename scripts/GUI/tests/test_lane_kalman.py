@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+
+from risk_modules.lane_kalman import LINE_TOP_RATIO, LaneKalmanTracker
+
+HEIGHT, WIDTH = 360, 640
+TOP = int(HEIGHT * LINE_TOP_RATIO)
+
+
+class _StubDetector:
+    """直接回傳指定的左右線參數（slope, intercept），記錄完整偵測次數"""
+
+    def __init__(self):
+        self.params = (None, None)
+        self.calls = 0
+
+    def reset(self):
+        pass
+
+    def detect_lines(self, frame):
+        self.calls += 1
+        return None
+
+    def fit(self, lines):
+        return self.params
+
+    def observe(self, left_line, right_line, width):
+        pass
+
+
+def _params(bottom_x, top_x):
+    slope = (HEIGHT - TOP) / (bottom_x - top_x)
+    return slope, HEIGHT - slope * bottom_x
+
+
+def _road(left, right):
+    """深色路面上畫兩條白線，left / right 為 (底端 x, 上端 x)"""
+    frame = np.full((HEIGHT, WIDTH, 3), 40, dtype=np.uint8)
+    for bottom_x, top_x in (left, right):
+        cv2.line(frame, (bottom_x, HEIGHT - 1), (top_x, TOP), (255, 255, 255), 3)
+    return frame
+
+
+LEFT, RIGHT = (150, 280), (500, 370)
+
+
+def _tracker(**kwargs):
+    detector = _StubDetector()
+    detector.params = (_params(*LEFT), _params(*RIGHT))
+    return LaneKalmanTracker(detector=detector, **kwargs), detector
+
+
+def test_first_update_locks_onto_detection():
+    tracker, detector = _tracker()
+    left, right = tracker.update(_road(LEFT, RIGHT))
+    assert detector.calls == 1
+    assert abs(left[0] - LEFT[0]) <= 1 and abs(left[2] - LEFT[1]) <= 1
+    assert abs(right[0] - RIGHT[0]) <= 1 and abs(right[2] - RIGHT[1]) <= 1
+    assert left[1] == HEIGHT and left[3] == TOP
+
+
+def test_stable_lanes_only_detect_every_n_updates():
+    tracker, detector = _tracker(detect_every=5)
+    frame = _road(LEFT, RIGHT)
+    for _ in range(10):
+        tracker.update(frame)
+    # 第 1 次（尚未鎖定）與第 6 次（達 detect_every）才完整偵測，其餘只預測
+    assert tracker.updates == 10
+    assert detector.calls == tracker.detections == 2
+    assert tracker.residual(frame) < tracker.residual_threshold * WIDTH
+
+
+def test_residual_gate_triggers_early_detection():
+    tracker, detector = _tracker(detect_every=100, residual_threshold=0.01)
+    tracker.update(_road(LEFT, RIGHT))
+    tracker.update(_road(LEFT, RIGHT))
+    assert detector.calls == 1
+
+    # 車道線往右偏 12 像素（超過 0.01 × 640）：殘差檢查應立即觸發完整偵測並校正
+    shifted_left, shifted_right = (LEFT[0] + 12, LEFT[1] + 12), (RIGHT[0] + 12, RIGHT[1] + 12)
+    shifted = _road(shifted_left, shifted_right)
+    assert tracker.residual(shifted) > 0.01 * WIDTH
+    detector.params = (_params(*shifted_left), _params(*shifted_right))
+    left, _ = tracker.update(shifted)
+    assert detector.calls == 2
+    assert LEFT[0] < left[0] <= shifted_left[0]
+
+
+def test_missing_side_is_dropped_after_max_missed():
+    tracker, detector = _tracker(detect_every=1, max_missed=3)
+    tracker.update(_road(LEFT, RIGHT))
+    detector.params = (_params(*LEFT), None)
+    for _ in range(2):
+        assert tracker.update(_road(LEFT, RIGHT))[1] is not None
+    assert tracker.update(_road(LEFT, RIGHT))[1] is None
+
+
+def test_frame_size_change_resets_state():
+    tracker, detector = _tracker(detect_every=100)
+    tracker.update(_road(LEFT, RIGHT))
+    tracker.update(np.full((HEIGHT // 2, WIDTH // 2, 3), 40, dtype=np.uint8))
+    assert tracker.updates == 1
+    assert detector.calls == 2
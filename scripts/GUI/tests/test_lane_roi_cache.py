@@ -0,0 +1,41 @@
+from risk_modules.Land_detection import LaneRoiCache
+
+FRAME = (360, 640, 3)
+LEFT = (120, 360, 280, 220)
+RIGHT = (520, 360, 360, 220)
+
+
+def _shifted(line, dx):
+    return (line[0] + dx, line[1], line[2] + dx, line[3])
+
+
+def test_jitter_within_quantum_hits_cache():
+    cache = LaneRoiCache(size=4, quantum=4)
+    first = cache.get(LEFT, RIGHT, FRAME)
+    second = cache.get(_shifted(LEFT, 1), _shifted(RIGHT, -1), FRAME)
+    assert second is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_missing_line_returns_none():
+    assert LaneRoiCache().get(None, RIGHT, FRAME) is None
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LaneRoiCache(size=2, quantum=4)
+    a = cache.get(LEFT, RIGHT, FRAME)
+    b = cache.get(_shifted(LEFT, 8), RIGHT, FRAME)
+    assert cache.get(LEFT, RIGHT, FRAME) is a          # a 變成最近使用
+    cache.get(_shifted(LEFT, 16), RIGHT, FRAME)        # 擠掉 b
+    assert cache.get(LEFT, RIGHT, FRAME) is a
+    assert cache.get(_shifted(LEFT, 8), RIGHT, FRAME) is not b
+    assert len(cache._cache) == 2
+
+
+def test_artifact_caches_none_results():
+    roi = LaneRoiCache().get(LEFT, RIGHT, FRAME)
+    calls = []
+    build = lambda: calls.append(1)       # 回傳 None（例如畫面外的裁切範圍）
+    assert roi.artifact("crop", build) is None
+    assert roi.artifact("crop", build) is None
+    assert len(calls) == 1
@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "benchmarks"))
+
+from synthetic import StubDetector, SyntheticDashcam  # noqa: E402
+from lane_tracker_module import LaneTracker  # noqa: E402
+
+FRAMES = 60
+
+
+class _CropAwareDetector(StubDetector):
+    """只回傳中心落在裁切範圍內的框，並記下每次推論收到的範圍（裁切範圍不同 → 結果不同）"""
+
+    def __init__(self, scene, latency_ms=0.0):
+        super().__init__(scene, latency_ms=latency_ms)
+        self.regions = []
+
+    def reset(self, frame_rate=None):
+        super().reset(frame_rate)
+        self.regions = []
+
+    def track_frame(self, frame, imgsz, region=None):
+        self.regions.append(None if region is None else tuple(int(v) for v in region))
+        boxes = super().track_frame(frame, imgsz, region)
+        if region is None:
+            return boxes
+        x1, y1, x2, y2 = region
+        cx = (boxes[:, 0] + boxes[:, 2]) / 2
+        cy = (boxes[:, 1] + boxes[:, 3]) / 2
+        return boxes[(cx >= x1) & (cx < x2) & (cy >= y1) & (cy < y2)]
+
+
+@pytest.fixture(scope="module")
+def clip(tmp_path_factory):
+    scene = SyntheticDashcam(seed=3)
+    path = str(tmp_path_factory.mktemp("clip") / "road.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 30, (scene.width, scene.height))
+    if not writer.isOpened():
+        pytest.skip("VideoWriter unavailable")
+    for t in range(FRAMES):
+        writer.write(scene.frame(t))
+    writer.release()
+    return path
+
+
+def _run(path, lane_delay_ms):
+    detector = _CropAwareDetector(SyntheticDashcam(seed=3))
+    tracker = LaneTracker([False], video_path=path, headless=True, enable_audio=False, output_path=None,
+                          model=detector)
+    tracker.detector = detector             # 不降頻，每一幀都推論
+    tracker.roi_crop_config = dict(tracker.roi_crop_config, enabled=True)
+    analyze = tracker._analyze_lane
+
+    def lane_stage(packet):
+        # lane 階段變慢時，detect 階段若讀共用屬性就會拿到較舊（或較新）的範圍；
+        # 每一幀給不同的範圍，才看得出 detect 用的是哪一幀算出的結果
+        time.sleep(lane_delay_ms / 1000.0)
+        result = analyze(packet)
+        tracker.detect_region = (0, 0, 640, 200 + packet.idx)
+        return result
+    tracker._analyze_lane = lane_stage
+    records = []
+    tracker.start(on_record=records.append)
+    return records, detector.regions
+
+
+def test_headless_roi_crop_is_reproducible(clip):
+    records, regions = _run(clip, lane_delay_ms=0)
+    slow_records, slow_regions = _run(clip, lane_delay_ms=15)
+    assert records
+    # 第 N 幀的偵測一定使用第 N-1 幀 lane 階段的範圍
+    frames = [record["frame"] for record in records]
+    assert regions == [None] + [(0, 0, 640, 200 + frame) for frame in frames[:-1]]
+    assert slow_regions == regions
+    assert slow_records == records
@@ -0,0 +1,27 @@
+import os
+
+from stage_timer import StageTimer
+
+
+def _timer():
+    timer = StageTimer()
+    with timer.stage("detect"):
+        pass
+    return timer
+
+
+def test_export_paths_are_unique_per_stream(tmp_path):
+    # 同一行程的多路 LaneTracker 各自匯出，不能互相覆寫同一個 .prom
+    prom = str(tmp_path / "stage_timing-{pid}-{stream}.prom")
+    _timer().export(prom_path=prom, labels={"stream": "front"})
+    _timer().export(prom_path=prom, labels={"stream": "left"})
+    pid = os.getpid()
+    front = tmp_path / f"stage_timing-{pid}-front.prom"
+    left = tmp_path / f"stage_timing-{pid}-left.prom"
+    assert 'stream="front"' in front.read_text()
+    assert 'stream="left"' in left.read_text()
+
+
+def test_export_without_stream_label_uses_main(tmp_path):
+    _timer().export(csv_path=str(tmp_path / "timing-{stream}.csv"))
+    assert (tmp_path / "timing-main.csv").exists()
@@ -0,0 +1,19 @@
+from telemetry import INFO, WARNING, DEBUG, Telemetry
+
+
+def test_configure_only_updates_given_fields():
+    # 第二個 LaneTracker 用 yaml 重新設定時，不能把先前設定的其他欄位重設回預設值
+    sink = Telemetry(echo_level=None)
+    sink.configure(echo_level="DEBUG", sample={"risk.track": 10})
+    sink.configure(level="INFO")
+    assert sink.echo_level == DEBUG
+    assert sink.sample == {"risk.track": 10}
+    assert sink.level == INFO
+    assert sink.enabled(DEBUG)
+
+
+def test_configure_defaults_from_constructor():
+    sink = Telemetry()
+    assert sink.level == INFO
+    assert sink.echo_level == WARNING
+    assert not sink.enabled(INFO)
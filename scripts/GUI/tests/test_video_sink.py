@@ -0,0 +1,54 @@
+import cv2
+import numpy as np
+
+from video_sink import SegmentedVideoWriter
+
+
+def _frame(value, shape=(72, 128, 3)):
+    return np.full(shape, value, dtype=np.uint8)
+
+
+def _frame_count(path):
+    cap = cv2.VideoCapture(path)
+    try:
+        return int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+
+def test_slots_are_reused(tmp_path):
+    # block 不掉幀：槽位最多 queue_size + 1 個，之後都重複使用
+    writer = SegmentedVideoWriter(str(tmp_path / "lane.mp4"), fps=10, segment_seconds=None, queue_size=2,
+                                  drop_policy="block")
+    for i in range(40):
+        writer.write(_frame(i))
+    writer.close()
+    assert writer.written == 40
+    assert writer.dropped == 0
+    assert writer._slots <= writer.queue_size + 1
+
+
+def test_rotates_by_segment_length(tmp_path):
+    writer = SegmentedVideoWriter(str(tmp_path / "lane.mp4"), fps=10, segment_seconds=1, queue_size=4,
+                                  drop_policy="block")
+    for i in range(25):
+        writer.write(_frame(i))
+    writer.close()
+    assert len(writer.segments) == 3
+    assert len(set(writer.segments)) == 3
+    assert [_frame_count(path) for path in writer.segments] == [10, 10, 5]
+
+
+def test_output_rate_follows_source_timeline(tmp_path):
+    # 來源 30fps、輸出 10fps：frame_skip 3 → 每幀寫一次；6 → 寫兩次；1 → 三幀只寫一幀
+    writer = SegmentedVideoWriter(str(tmp_path / "lane.mp4"), fps=10, segment_seconds=None, queue_size=8,
+                                  drop_policy="block", source_fps=30)
+    source_frames = [3, 6, 9] + [15, 21, 27] + list(range(28, 37))
+    for idx in source_frames:
+        writer.write(_frame(idx), source_frame=idx)
+    writer.close()
+    # 輸出幀數 = (36 - 3) 個來源幀 / 3 + 第一幀
+    assert writer.written == 12
+    assert writer.duplicated == 3
+    assert writer.skipped == len(source_frames) + writer.duplicated - writer.written
+    assert _frame_count(writer.segments[0]) == 12